@@ -0,0 +1,211 @@
+"""End-to-end benchmark of our own per-turn overhead, fully offline.
+
+Drives multi-turn conversations through the real `Agent` + `instructions` + `MemoryHooks`
++ `TrimmingSession` + `save_memory_note`, with `ScriptedModel` standing in for the API
+(it also scripts the `save_memory_note` tool calls). Reports per-turn wall time,
+allocations and prompt size for growing histories and global memory sizes.
+
+Run from the repo root:
+    python -m benchmarks.bench_agent_pipeline                  # compare against the baseline
+    python -m benchmarks.bench_agent_pipeline --save-baseline  # record a new baseline (median of several passes)
+    python -m benchmarks.bench_agent_pipeline --metrics        # same, with instrumentation on
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List
+
+## Nothing talks to the network here, but run_turn's shared RunConfig builds the OpenAI client on first use
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from agents import Agent
+
+from benchmarks.fake_model import ScriptedModel
+from context_management import TrimmingSession
+from memory_distillation import save_memory_note
+from memory_hooks import MemoryHooks
+from memory_state import TravelState, user_state
+from metrics import PrometheusTextExporter, configure_metrics, metrics
+from travel_agent import instructions, run_turn
+
+BASELINE = Path(__file__).with_name("baselines") / "agent_pipeline.json"
+HISTORY_TURNS = [4, 32, 128]  ## TrimmingSession max_turns == turns driven, so history keeps growing
+GLOBAL_NOTES = [10, 1_000, 10_000]
+TIMING_REPEATS = 3  ## wall-time metrics keep the best of these runs, to damp scheduler noise
+## a baseline is the per-metric median of this many full passes: a typical run, not the luckiest one
+BASELINE_PASSES = 5
+## flag metrics this much worse than the baseline (time and peak memory are noisy, wall time the
+## most: it moves with the machine and its load; prompt sizes are deterministic)
+TIME_TOLERANCE = 1.0
+NOISY_TOLERANCE = 0.5
+SIZE_TOLERANCE = 0.1
+
+SCRIPT = [
+    "Book me a flight to paris next month.",
+    "Do you know my preferences??",
+    "Remember that i am vegetarian.",
+    "This time, I like to have a window seat. i really want to sleep",
+    "Find me a central hotel close to the museums.",
+    "From now on, I want a gym in every hotel.",
+    "Does my travel insurance cover rental cars?",
+    "Compare the two cheapest options side by side.",
+]
+
+
+def _state(global_notes: int) -> TravelState:
+    state = TravelState.from_dict(user_state.to_dict())
+    topics = ["seat", "hotel", "baggage", "dietary", "insurance", "flight", "budget", "room"]
+    state.global_memory["notes"] = [
+        {
+            "text": f"Note {i}: usually prefers option {i % 13} for {topics[i % len(topics)]} bookings.",
+            "last_update_date": f"20{20 + i % 6}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "keywords": [topics[i % len(topics)]],
+        }
+        for i in range(global_notes)
+    ]
+    return state
+
+
+async def _conversation(turns: int, global_notes: int, trace: bool) -> Dict[str, float]:
+    model = ScriptedModel()
+    agent = Agent(
+        name="Travel Concierge",
+        model=model,
+        instructions=instructions,
+        hooks=MemoryHooks(),
+        tools=[save_memory_note],
+    )
+    state = _state(global_notes)
+    session = TrimmingSession("bench", state, max_turns=turns)
+
+    wall: List[float] = []
+    allocated: List[int] = []
+    for i in range(turns):
+        text = SCRIPT[i % len(SCRIPT)]
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        await run_turn(agent, text, state, session)
+        wall.append(time.perf_counter() - t0)
+        if trace:
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+
+    ## the first turn also builds the memory indexes; report it separately from steady state
+    ## (a single sample, so it is shown but not checked against the baseline)
+    warm = wall[1:] or wall
+    p95 = sorted(warm)[max(0, int(len(warm) * 0.95) - 1)]
+    last = model.calls[-1]
+    return {
+        "first_turn_ms": wall[0] * 1e3,
+        "turn_ms_mean": statistics.fmean(warm) * 1e3,
+        "turn_ms_median": statistics.median(warm) * 1e3,
+        "turn_ms_p95": p95 * 1e3,
+        "turn_peak_kb_mean": statistics.fmean(allocated[1:] or allocated) / 1024 if allocated else 0.0,
+        "system_prompt_chars": statistics.fmean(c.system_chars for c in model.calls),
+        "final_input_items": float(last.input_items),
+        "final_input_chars": float(last.input_chars),
+        "model_calls_per_turn": len(model.calls) / turns,
+    }
+
+
+async def _scenario(turns: int, global_notes: int) -> Dict[str, float]:
+    ## timing passes without tracemalloc (it slows allocation-heavy code), then an allocation pass
+    runs = [await _conversation(turns, global_notes, trace=False) for _ in range(TIMING_REPEATS)]
+    result = min(runs, key=lambda r: r["turn_ms_median"])
+    result["first_turn_ms"] = min(r["first_turn_ms"] for r in runs)
+    tracemalloc.start()
+    try:
+        traced = await _conversation(turns, global_notes, trace=True)
+    finally:
+        tracemalloc.stop()
+    result["turn_peak_kb_mean"] = traced["turn_peak_kb_mean"]
+    return result
+
+
+def _compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> List[str]:
+    regressions = []
+    for name, metrics in results.items():
+        for metric, tolerance in (
+            ("turn_ms_median", TIME_TOLERANCE),
+            ("turn_peak_kb_mean", NOISY_TOLERANCE),
+            ("system_prompt_chars", SIZE_TOLERANCE),
+            ("final_input_chars", SIZE_TOLERANCE),
+        ):
+            old = baseline.get(name, {}).get(metric)
+            if old and metrics[metric] > old * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {old:.1f} -> {metrics[metric]:.1f}")
+    return regressions
+
+
+def _print_header() -> None:
+    print(
+        f"{'scenario':<22} {'1st ms':>8} {'ms/turn':>8} {'median':>8} {'p95':>8} {'peak KB':>9} "
+        f"{'sys chars':>10} {'items':>6} {'in chars':>9}"
+    )
+
+
+async def _pass() -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for turns in HISTORY_TURNS:
+        for global_notes in GLOBAL_NOTES:
+            name = f"turns={turns},notes={global_notes}"
+            r = results[name] = await _scenario(turns, global_notes)
+            print(
+                f"{name:<22} {r['first_turn_ms']:>8.2f} {r['turn_ms_mean']:>8.2f} {r['turn_ms_median']:>8.2f} "
+                f"{r['turn_ms_p95']:>8.2f} {r['turn_peak_kb_mean']:>9.1f} "
+                f"{r['system_prompt_chars']:>10.0f} {r['final_input_items']:>6.0f} {r['final_input_chars']:>9.0f}"
+            )
+    return results
+
+
+def _median_of(passes: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {metric: statistics.median(p[name][metric] for p in passes) for metric in metrics}
+        for name, metrics in passes[0].items()
+    }
+
+
+async def main(save_baseline: bool = False, with_metrics: bool = False) -> int:
+    configure_metrics(with_metrics)
+    _print_header()
+    results = await _pass()
+    if save_baseline:
+        passes = [results]
+        for n in range(2, BASELINE_PASSES + 1):
+            print(f"-- pass {n}/{BASELINE_PASSES}")
+            passes.append(await _pass())
+        results = _median_of(passes)
+
+    if with_metrics:
+        print(PrometheusTextExporter().render(metrics), end="")
+
+    if save_baseline:
+        BASELINE.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved to {BASELINE}")
+        return 0
+    if not BASELINE.exists():
+        print("no baseline yet; run with --save-baseline")
+        return 0
+    regressions = _compare(results, json.loads(BASELINE.read_text()))
+    for line in regressions:
+        print("REGRESSION", line)
+    if not regressions:
+        print("no regressions against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--metrics", action="store_true", help="enable instrumentation, to measure its overhead")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.save_baseline, args.metrics)))
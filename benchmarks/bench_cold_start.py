@@ -0,0 +1,100 @@
+"""Benchmark: cold start and first-request latency of the OpenAI clients.
+
+- import time of the app modules, each in a fresh interpreter (best of a few runs)
+- an agent call followed by a consolidation call against a local keep-alive endpoint
+  (`FakeResponsesServer`), with one shared client vs a separate client per caller: latency of
+  each call and how many TCP connections the server saw
+- a call after an idle gap longer than the client default keep-alive (5 s), with the default
+  pool settings vs `openai_clients`' (reconnect or reuse)
+
+Run from the repo root:
+    python -m benchmarks.bench_cold_start
+"""
+from __future__ import annotations
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+import openai_clients
+from benchmarks.fake_openai import FakeResponsesServer
+
+IMPORT_RUNS = 5
+MODULES = ["agents", "openai_clients", "consolidate_memory", "travel_agent"]
+CALL_RUNS = 20
+IDLE_GAP_S = 6.0
+
+
+def _import_ms(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1e3)"
+    runs = []
+    for _ in range(IMPORT_RUNS):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=os.environ)
+        runs.append(float(out.stdout.strip().splitlines()[-1]))
+    return min(runs)
+
+
+async def _call(client: AsyncOpenAI) -> float:
+    t0 = time.perf_counter()
+    await client.responses.create(model="fake", input="hi")
+    return (time.perf_counter() - t0) * 1e3
+
+
+def _client(server: FakeResponsesServer, pooled: bool) -> AsyncOpenAI:
+    http_client = DefaultAsyncHttpxClient(**openai_clients._http_options()) if pooled else None
+    return AsyncOpenAI(base_url=server.base_url, http_client=http_client)
+
+
+async def _agent_then_consolidation(server: FakeResponsesServer, shared: bool) -> None:
+    first: List[float] = []
+    second: List[float] = []
+    connections = 0
+    for _ in range(CALL_RUNS):
+        server.reset_counts()
+        agent = _client(server, pooled=True)
+        consolidation = agent if shared else _client(server, pooled=True)
+        first.append(await _call(agent))
+        second.append(await _call(consolidation))
+        connections += server.connections
+        await agent.close()
+        if consolidation is not agent:
+            await consolidation.close()
+    label = "shared client" if shared else "two clients"
+    print(f"  {label:<14} agent call {statistics.median(first):6.2f} ms  consolidation call "
+          f"{statistics.median(second):6.2f} ms  connections/pair {connections / CALL_RUNS:.1f}")
+
+
+async def _after_idle(server: FakeResponsesServer, pooled: bool) -> None:
+    client = _client(server, pooled)
+    await _call(client)
+    await asyncio.sleep(IDLE_GAP_S)
+    server.reset_counts()
+    ms = await _call(client)
+    await client.close()
+    label = "shared pool (60 s)" if pooled else "default pool (5 s)"
+    print(f"  {label:<18} call after {IDLE_GAP_S:.0f} s idle {ms:6.2f} ms  new connections {server.connections}")
+
+
+async def main() -> None:
+    print("import (fresh interpreter, best of %d)" % IMPORT_RUNS)
+    for module in MODULES:
+        print(f"  {module:<20} {_import_ms(module):7.1f} ms")
+
+    with FakeResponsesServer() as server:
+        print("agent call then consolidation call (median of %d cold pairs)" % CALL_RUNS)
+        await _agent_then_consolidation(server, shared=False)
+        await _agent_then_consolidation(server, shared=True)
+        print("keep-alive across an idle user")
+        await _after_idle(server, pooled=False)
+        await _after_idle(server, pooled=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""Benchmark: consolidation load under a traffic spike, per-turn consolidation vs ConsolidationScheduler.
+
+Simulated users each save a note on most turns; a fake consolidation sleeps for a fixed model latency.
+Per-turn consolidation runs one job per turn with notes; the scheduler batches them per user (note
+threshold + session end) and caps how many run at once. Reports jobs, peak queue depth, lag and wall time.
+
+Run from the repo root:
+    python -m benchmarks.bench_consolidation_scheduler
+"""
+from __future__ import annotations
+import asyncio
+import copy
+import random
+import time
+from typing import List
+
+from consolidation_scheduler import ConsolidationScheduler
+from memory_state import TravelState, user_state
+from metrics import Histogram, LATENCY_BUCKETS_MS
+
+USERS = [100, 1_000]
+TURNS = 12
+NOTE_PROBABILITY = 0.6
+MODEL_LATENCY_S = 0.02
+WORKERS = 8
+MAX_QUEUE = 256
+
+
+def _users(n: int) -> List[TravelState]:
+    states = []
+    for _ in range(n):
+        state = copy.copy(user_state)
+        state.session_memory = {"notes": []}
+        states.append(state)
+    return states
+
+
+async def _fake_consolidate(state: TravelState) -> None:
+    await asyncio.sleep(MODEL_LATENCY_S)
+    state.session_memory = {"notes": []}
+
+
+def _turn(state: TravelState, rnd: random.Random) -> bool:
+    if rnd.random() >= NOTE_PROBABILITY:
+        return False
+    state.session_memory = {"notes": [*state.session_memory["notes"], {"text": "note"}]}
+    return True
+
+
+async def _per_turn(n: int) -> None:
+    rnd = random.Random(0)
+    states = _users(n)
+    limit = asyncio.Semaphore(WORKERS)
+    lag = Histogram(LATENCY_BUCKETS_MS)
+    jobs = 0
+
+    async def job(state: TravelState, enqueued: float) -> None:
+        async with limit:
+            lag.observe((time.perf_counter() - enqueued) * 1e3)
+            await _fake_consolidate(state)
+
+    t0 = time.perf_counter()
+    tasks = []
+    for _ in range(TURNS):
+        for state in states:
+            if _turn(state, rnd):
+                jobs += 1
+                tasks.append(asyncio.create_task(job(state, time.perf_counter())))
+        await asyncio.sleep(0)
+    peak = sum(not t.done() for t in tasks)  ## unbounded: every pending job is held at once
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - t0
+    print(f"users={n:>5}  per-turn   jobs {jobs:6d}  peak pending {peak:6d}  "
+          f"lag p50 {lag.quantile(0.5):7.0f} ms  p95 {lag.quantile(0.95):7.0f} ms  wall {wall:6.2f} s")
+
+
+async def _scheduled(n: int) -> None:
+    rnd = random.Random(0)
+    states = _users(n)
+    scheduler = ConsolidationScheduler(_fake_consolidate, workers=WORKERS, max_queue=MAX_QUEUE, debounce_seconds=0.0)
+    lag = Histogram(LATENCY_BUCKETS_MS)
+    scheduler.start(poll_interval=0.01)
+    peak = 0
+    t0 = time.perf_counter()
+    for _ in range(TURNS):
+        for i, state in enumerate(states):
+            _turn(state, rnd)
+            scheduler.notify_activity(f"u{i}", state)
+        peak = max(peak, scheduler.queue_depth)
+        lag.observe(scheduler.oldest_lag() * 1e3)
+        await asyncio.sleep(0)
+    for i in range(n):
+        await scheduler.end_session(f"u{i}")
+        peak = max(peak, scheduler.queue_depth)
+    await scheduler.stop()
+    wall = time.perf_counter() - t0
+    left = sum(len(s.session_memory["notes"]) for s in states)
+    stats = scheduler.stats
+    print(f"users={n:>5}  scheduler  jobs {stats.completed:6d}  peak queue   {peak:6d}  "
+          f"oldest lag p95 {lag.quantile(0.95):5.0f} ms  deferred {stats.rejected:5d}  wall {wall:6.2f} s  notes left {left}")
+
+
+def main() -> None:
+    for n in USERS:
+        asyncio.run(_per_turn(n))
+        asyncio.run(_scheduled(n))
+
+
+if __name__ == "__main__":
+    main()
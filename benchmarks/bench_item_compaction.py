@@ -0,0 +1,99 @@
+"""Benchmark: TrimmingSession with and without tool-output compaction (ItemCompactor).
+
+Many conversations run interleaved; every turn calls a search tool whose output is a few KB
+of JSON, and a third of the searches repeat a popular one (identical payload). Reports, per
+turn, what a session sends back to the model (JSON bytes and estimated tokens of
+`get_items`), the Python heap held by the sessions plus the shared payload store (bounded
+at STORE_MB), and the cost of `add_items`.
+
+Run from the repo root:
+    python -m benchmarks.bench_item_compaction
+"""
+from __future__ import annotations
+import asyncio
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+from typing import List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from agents.items import TResponseInputItem
+from context_management import TrimmingSession, estimate_bytes, estimate_tokens
+from item_compaction import ItemCompactor, PayloadStore
+from memory_state import TravelState
+
+SESSIONS = 50
+TURNS = 40  ## per session
+MAX_TURNS = [4, 16]
+STORE_MB = 2
+HOTELS_PER_SEARCH = 25
+
+
+def _search_output(rnd: random.Random, query: int) -> str:
+    qrnd = random.Random(query)
+    return json.dumps([
+        {"name": f"Hotel {query}-{h}", "stars": qrnd.randint(2, 5), "price": qrnd.randint(80, 400),
+         "address": f"{qrnd.randint(1, 200)} Rue de la Paix, Paris", "amenities": ["wifi", "gym", "breakfast"],
+         "description": "Quiet rooms near the metro, recently renovated, with a rooftop bar. " * 2}
+        for h in range(HOTELS_PER_SEARCH)
+    ])
+
+
+def _turn(n: int, i: int, rnd: random.Random) -> List[TResponseInputItem]:
+    ## a third repeat a popular search (shared across sessions), the rest are this session's own
+    query = rnd.randrange(i // 3 + 1) if rnd.random() < 1 / 3 else 10_000 + n * TURNS + i
+    return [
+        {"role": "user", "content": f"Find me another hotel option ({i})."},
+        {"type": "function_call", "call_id": f"call_{i}", "name": "search_hotels", "arguments": json.dumps({"q": query})},
+        {"type": "function_call_output", "call_id": f"call_{i}", "output": _search_output(rnd, query)},
+        {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": "Here are a few options."}]},
+    ]
+
+
+async def _drive(max_turns: int, compact: bool) -> Tuple[List[TrimmingSession], PayloadStore, int, int, float]:
+    rnd = random.Random(0)
+    store = PayloadStore(max_bytes=STORE_MB * 2**20)
+    compactor = ItemCompactor(store=store) if compact else None
+    sessions = [TrimmingSession(f"s{n}", TravelState(), max_turns=max_turns, compactor=compactor) for n in range(SESSIONS)]
+    sent_bytes = sent_tokens = 0
+    add_s = 0.0
+    for i in range(TURNS):
+        for n, session in enumerate(sessions):
+            items = _turn(n, i, rnd)  ## fresh objects, as the SDK hands them over
+            history = await session.get_items()
+            sent_bytes += sum(estimate_bytes(item) for item in history)
+            sent_tokens += sum(estimate_tokens(item) for item in history)
+            t0 = time.perf_counter()
+            await session.add_items(items)
+            add_s += time.perf_counter() - t0
+    return sessions, store, sent_bytes, sent_tokens, add_s
+
+
+async def _run(max_turns: int, compact: bool) -> None:
+    _, _, sent_bytes, sent_tokens, add_s = await _drive(max_turns, compact)  ## timed without tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    sessions, store, *_ = await _drive(max_turns, compact)
+    gc.collect()
+    heap = tracemalloc.get_traced_memory()[0]  ## sessions + payload store
+    tracemalloc.stop()
+    del sessions
+    turns = TURNS * SESSIONS
+    label = "compacted" if compact else "raw"
+    extra = f"  store {len(store)} payloads, {store.stats.deduped} deduped, {store.stats.evicted} dropped" if compact else ""
+    print(f"max_turns={max_turns:<3} {label:<10} sent/turn {sent_bytes / turns / 1024:6.1f} KB "
+          f"{sent_tokens / turns:7.0f} tok  heap {heap / 2**20:6.2f} MB  add_items {add_s / turns * 1e6:6.1f} us{extra}")
+
+
+async def main() -> None:
+    for max_turns in MAX_TURNS:
+        for compact in (False, True):
+            await _run(max_turns, compact)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
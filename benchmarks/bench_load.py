@@ -0,0 +1,199 @@
+"""Load test: N concurrent simulated customers through the full concierge loop, offline.
+
+Starts `benchmarks.fake_openai` in its own process and points the app's shared OpenAI clients
+at it (OPENAI_BASE_URL). Every customer then runs a multi-turn travel conversation through
+`travel_agent.run_turn` (or `stream_turn` with `--stream`): Runner.run, MemoryHooks, the session
+registry and save_memory_note, with scripted tool calls. Each session is ended, so the
+consolidation scheduler folds the notes into global memory through the same endpoint.
+
+Reports throughput, turn latency percentiles (plus time to first token when streaming),
+event-loop lag, peak RSS and what the endpoint served. `--json FILE` saves the report and
+`--baseline FILE` prints the change against a saved one, to check a scaling change.
+
+Run from the repo root:
+    python -m benchmarks.bench_load --customers 200 --turns 4 --latency 0.3 --tokens-per-s 80
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+SCRIPT = [
+    "Book me a flight to Paris next month.",
+    "Remember that I am vegetarian.",
+    "Do you know my preferences?",
+    "This time, I'd like a window seat. I really want to sleep.",
+    "From now on, find me hotels with a gym.",
+    "Great, hold the first option for me.",
+]
+LAG_INTERVAL_S = 0.01
+
+
+def _start_endpoint(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    cmd = [sys.executable, "-m", "benchmarks.fake_openai", "--latency", str(args.latency)]
+    if args.tokens_per_s:
+        cmd += ["--tokens-per-s", str(args.tokens_per_s)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith("listening "):
+        proc.kill()
+        raise RuntimeError(f"fake endpoint did not start: {line!r}")
+    return proc, line.split()[1]
+
+
+def _endpoint_stats(base_url: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(base_url + "/stats") as response:
+        return json.loads(response.read())
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  ## KiB on Linux
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _loop_lag(samples: List[float]) -> None:
+    """How late a short sleep wakes up: time the loop spent busy with something else."""
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL_S)
+        samples.append(max(0.0, time.perf_counter() - t0 - LAG_INTERVAL_S) * 1e3)
+
+
+async def _customer(i: int, args: argparse.Namespace, agent: Any, results: Dict[str, Any]) -> None:
+    import travel_agent
+
+    rnd = random.Random(i)
+    await asyncio.sleep(rnd.uniform(0, args.ramp))
+    customer_id = f"load_{i:05d}"
+    state = await travel_agent.get_states().get(customer_id)
+    for t in range(args.turns):
+        text = SCRIPT[(i + t) % len(SCRIPT)]
+        session = travel_agent.get_session(customer_id, state)
+        t0 = time.perf_counter()
+        try:
+            if args.stream:
+                turn = await travel_agent.stream_turn(agent, text, state, session, on_delta=lambda delta: None)
+                if turn.ttft_ms is not None:
+                    results["ttft_ms"].append(turn.ttft_ms)
+            else:
+                await travel_agent.run_turn(agent, text, state, session)
+        except Exception as error:
+            results["errors"].append(repr(error))
+            continue
+        results["turn_ms"].append((time.perf_counter() - t0) * 1e3)
+        if args.think:
+            await asyncio.sleep(rnd.expovariate(1 / args.think))
+    await travel_agent.get_scheduler().end_session(customer_id)
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    import travel_agent
+
+    rss_before = _peak_rss_mb()
+    states, sessions, scheduler = travel_agent.get_states(), travel_agent.get_sessions(), travel_agent.get_scheduler()
+    scheduler.start()
+    sessions.start()
+    agent = travel_agent.build_agent()
+    results: Dict[str, Any] = {"turn_ms": [], "ttft_ms": [], "errors": []}
+    lag: List[float] = []
+    lag_task = asyncio.get_running_loop().create_task(_loop_lag(lag))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_customer(i, args, agent, results) for i in range(args.customers)))
+    turns_s = time.perf_counter() - t0
+    await scheduler.drain()
+    drain_s = time.perf_counter() - t0 - turns_s
+
+    lag_task.cancel()
+    await scheduler.stop()
+    await sessions.close()
+    await states.flush()
+    await travel_agent.aclose_clients()
+
+    turn_ms = results["turn_ms"]
+    report = {
+        "customers": args.customers,
+        "turns": len(turn_ms),
+        "errors": len(results["errors"]),
+        "wall_s": round(turns_s, 3),
+        "turns_per_s": round(len(turn_ms) / turns_s, 2),
+        "turn_p50_ms": round(_pct(turn_ms, 0.50), 1),
+        "turn_p95_ms": round(_pct(turn_ms, 0.95), 1),
+        "turn_p99_ms": round(_pct(turn_ms, 0.99), 1),
+        "turn_max_ms": round(max(turn_ms, default=float("nan")), 1),
+        "loop_lag_p50_ms": round(_pct(lag, 0.50), 2),
+        "loop_lag_p99_ms": round(_pct(lag, 0.99), 2),
+        "loop_lag_max_ms": round(max(lag, default=float("nan")), 2),
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "consolidation_drain_s": round(drain_s, 3),
+        "consolidations_ok": scheduler.stats.completed,
+        "consolidations_failed": scheduler.stats.failed,
+    }
+    if args.stream:
+        report["ttft_p50_ms"] = round(_pct(results["ttft_ms"], 0.50), 1)
+        report["ttft_p99_ms"] = round(_pct(results["ttft_ms"], 0.99), 1)
+    if results["errors"]:
+        report["first_error"] = results["errors"][0]
+    return report
+
+
+def _print(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    for key, value in report.items():
+        line = f"{key:<24} {value}"
+        base = (baseline or {}).get(key)
+        if isinstance(value, (int, float)) and isinstance(base, (int, float)) and base:
+            line += f"   (baseline {base}, {(value - base) / base * 100:+.1f}%)"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test of the concierge loop.")
+    parser.add_argument("--customers", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=4, help="turns per customer")
+    parser.add_argument("--latency", type=float, default=0.2, help="endpoint seconds to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=100.0, help="endpoint output rate (0: instant)")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds between a customer's turns")
+    parser.add_argument("--ramp", type=float, default=1.0, help="customers start spread over this many seconds")
+    parser.add_argument("--stream", action="store_true", help="use stream_turn (reports time to first token)")
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--baseline", help="a report saved with --json, to compare against")
+    args = parser.parse_args()
+
+    proc, base_url = _start_endpoint(args)
+    try:
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+        os.environ.pop("STATE_DIR", None)  ## in-memory states: measure the loop, not the disk
+        report = asyncio.run(_run(args))
+        report["endpoint"] = _endpoint_stats(base_url)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    _print(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark: capped global memory (NoteUsage) over many simulated consolidations.
+
+Each round adds a few new notes, injects a handful of "popular" notes into the prompt and
+commits through `_commit_consolidation`. Reports global memory size with and without a cap,
+the cost of a commit and of recording injections, and whether the popular notes survived.
+
+Run from the repo root:
+    python -m benchmarks.bench_memory_budget
+"""
+from __future__ import annotations
+import os
+import random
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from consolidate_memory import _commit_consolidation
+from memory_budget import MemoryBudget, NoteUsage
+from memory_state import TravelState
+
+ROUNDS = 2_000
+NEW_PER_ROUND = 5
+CAPS = [None, 2_000, 500]
+
+
+def _run(cap: int | None) -> None:
+    rnd = random.Random(0)
+    state = TravelState()
+    state.global_usage = NoteUsage(MemoryBudget(cap=cap if cap is not None else 10**9))
+    popular = [{"text": f"Popular preference {i}.", "last_update_date": "2020-01-01", "keywords": ["seat"]} for i in range(10)]
+    state.global_memory["notes"] = list(popular)
+    start = date(2021, 1, 1)
+    commit_s = record_s = 0.0
+    for r in range(ROUNDS):
+        today = start + timedelta(days=r // 4)
+        new = [
+            {"text": f"One-off note {r}-{j} {rnd.random():.6f}", "last_update_date": today.isoformat(), "keywords": ["misc"]}
+            for j in range(NEW_PER_ROUND)
+        ]
+        ## what MemoryHooks does each turn: the injected notes (here: the popular ones) gain value
+        current = state.global_memory["notes"]
+        injected = [n for n in current if n.get("text", "").startswith("Popular")][:6]
+        t0 = time.perf_counter()
+        state.global_usage.record(injected, "injected", today=today)
+        record_s += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        _commit_consolidation(state, [*current, *new], [])
+        commit_s += time.perf_counter() - t0
+
+    notes = state.global_memory["notes"]
+    kept = sum(1 for n in notes if n.get("text", "").startswith("Popular"))
+    label = "uncapped" if cap is None else f"cap={cap}"
+    print(
+        f"{label:>10}  notes {len(notes):6d}  commit {commit_s / ROUNDS * 1e3:6.2f} ms  "
+        f"record {record_s / ROUNDS * 1e6:6.1f} us  popular kept {kept}/{len(popular)}"
+    )
+
+
+def main() -> None:
+    for cap in CAPS:
+        _run(cap)
+
+
+if __name__ == "__main__":
+    main()
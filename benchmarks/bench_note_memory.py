@@ -0,0 +1,55 @@
+"""Memory benchmark (tracemalloc): plain note dicts vs the compact NoteList store.
+
+Run from the repo root:
+    python -m benchmarks.bench_note_memory
+"""
+from __future__ import annotations
+import gc
+import random
+import tracemalloc
+from datetime import date, timedelta
+
+from note_store import NoteList
+
+SIZES = [10_000, 100_000]
+_KEYWORDS = ["seat", "flight", "baggage", "hotel", "room", "dietary", "budget", "neighborhood", "pricing", "loyalty"]
+
+
+def _raw_notes(n: int) -> list[dict]:
+    rnd = random.Random(n)
+    start = date(2022, 1, 1)
+    return [
+        {
+            "text": f"Prefers option {i % 50} for {rnd.choice(_KEYWORDS)} bookings.",
+            "last_update_date": (start + timedelta(days=rnd.randrange(1500))).isoformat(),
+            "keywords": rnd.sample(_KEYWORDS, rnd.randint(1, 3)),
+        }
+        for i in range(n)
+    ]
+
+
+def _measure(build) -> tuple[int, object]:
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, obj
+
+
+def main() -> None:
+    print(f"{'notes':>8} {'dicts (MB)':>11} {'compact (MB)':>13} {'bytes/note':>16} {'saving':>7}")
+    for n in SIZES:
+        dict_bytes, raw = _measure(lambda: _raw_notes(n))
+        ## build from fresh dicts so texts are allocated inside the traced region for both sides
+        compact_bytes, store = _measure(lambda: NoteList(_raw_notes(n)))
+        assert len(store) == len(raw) and store[0] == raw[0]
+        print(
+            f"{n:>8} {dict_bytes / 2**20:>11.1f} {compact_bytes / 2**20:>13.1f} "
+            f"{dict_bytes // n:>7} -> {compact_bytes // n:<6} {1 - compact_bytes / dict_bytes:>7.0%}"
+        )
+        del raw, store
+
+
+if __name__ == "__main__":
+    main()
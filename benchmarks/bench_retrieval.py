@@ -0,0 +1,78 @@
+"""Benchmark: query-relevant NoteRetriever.top_k vs the date-sorted render_global_memories_md path.
+
+Run from the repo root:
+    python -m benchmarks.bench_retrieval
+"""
+from __future__ import annotations
+import random
+import time
+from datetime import date, timedelta
+
+from memory_retrieval import NoteRetriever
+
+SIZES = [1_000, 10_000, 100_000]
+QUERIES = 200
+K = 6
+
+_TOPICS = {
+    "seat": ["aisle", "window", "exit", "row", "front", "seat"],
+    "baggage": ["carry", "checked", "bag", "luggage", "weight"],
+    "hotel": ["floor", "quiet", "king", "suite", "breakfast", "gym", "pool"],
+    "dietary": ["vegetarian", "vegan", "gluten", "kosher", "meal"],
+    "flight": ["redeye", "layover", "nonstop", "morning", "evening", "lounge"],
+    "budget": ["cheap", "premium", "points", "refundable", "price"],
+}
+_FILLER = ["prefers", "avoids", "usually", "likes", "wants", "needs", "when", "for", "long", "short", "trips"]
+
+
+def _notes(n: int, rnd: random.Random) -> list[dict]:
+    start = date(2020, 1, 1)
+    topics = list(_TOPICS)
+    notes = []
+    for i in range(n):
+        topic = rnd.choice(topics)
+        words = rnd.sample(_TOPICS[topic], 3) + rnd.sample(_FILLER, 3)
+        rnd.shuffle(words)
+        notes.append({
+            "text": " ".join(words) + f" variant{i % 997}.",
+            "last_update_date": (start + timedelta(days=rnd.randrange(2000))).isoformat(),
+            "keywords": [topic],
+        })
+    return notes
+
+
+def _sort_top(notes: list[dict]) -> list[dict]:
+    ## the pre-retrieval path in render_global_memories_md
+    return sorted(notes, key=lambda n: n.get("last_update_date", ""), reverse=True)[:K]
+
+
+def main() -> None:
+    rnd = random.Random(0)
+    queries = [" ".join(rnd.sample(sum(_TOPICS.values(), []), 4)) for _ in range(QUERIES)]
+    today = date(2026, 1, 1)
+
+    print(f"{'notes':>8} {'build (ms)':>11} {'sort path (us)':>15} {'top_k (us)':>11} {'speedup':>8}")
+    for n in SIZES:
+        notes = _notes(n, rnd)
+
+        retriever = NoteRetriever()
+        t0 = time.perf_counter()
+        retriever.sync(notes)
+        build_ms = (time.perf_counter() - t0) * 1e3
+
+        reps = max(3, QUERIES // (n // 1_000))
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            _sort_top(notes)
+        sort_us = (time.perf_counter() - t0) / reps * 1e6
+
+        t0 = time.perf_counter()
+        for q in queries:
+            retriever.top_k(notes, q, k=K, today=today)
+        top_us = (time.perf_counter() - t0) / len(queries) * 1e6
+
+        print(f"{n:>8} {build_ms:>11.1f} {sort_us:>15.1f} {top_us:>11.1f} {sort_us / top_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark: many concurrent conversations in a SessionRegistry vs a plain dict of TrimmingSessions.
+
+Simulates a long-running server: turns arrive for users drawn from a skewed (Zipf-like)
+distribution, so a few users are busy and most go quiet. Each turn reads the session and
+appends a user message plus a tool-heavy reply. Reports Python heap held by the sessions at
+the end (tracemalloc), turn latency, and the registry's live / spilled / restored counts.
+
+Run from the repo root:
+    python -m benchmarks.bench_session_registry
+"""
+from __future__ import annotations
+import asyncio
+import gc
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from agents.items import TResponseInputItem
+from context_management import TrimmingSession
+from memory_state import TravelState
+from session_registry import SessionRegistry
+
+USERS = 5_000
+TURNS = 30_000
+MAX_TURNS = 4
+CEILINGS_MB = [8, 32]
+
+
+def _turn(i: int) -> List[TResponseInputItem]:
+    return [
+        {"role": "user", "content": f"Question {i}: find me a hotel near the venue."},
+        {"type": "function_call_output", "call_id": f"c{i}", "output": "hotel " * 150},
+        {"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": "Here are three options. " * 12}]},
+    ]
+
+
+def _users() -> List[int]:
+    rnd = random.Random(0)
+    weights = [1 / (rank + 1) for rank in range(USERS)]
+    return rnd.choices(range(USERS), weights=weights, k=TURNS)
+
+
+async def _drive(get) -> List[float]:
+    states: Dict[int, TravelState] = {}
+    latencies = []
+    for i, user in enumerate(_users()):
+        state = states.setdefault(user, TravelState())
+        t0 = time.perf_counter()
+        session = get(f"user_{user}", state)
+        await session.get_items()
+        await session.add_items(_turn(i))
+        latencies.append((time.perf_counter() - t0) * 1e6)
+        if i % 64 == 0:
+            await asyncio.sleep(0)  ## let background spills run
+    return latencies
+
+
+def _report(label: str, latencies: List[float], heap: int, extra: str = "") -> None:
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{label:<18} heap {heap / 2**20:7.1f} MB  turn p50 {statistics.median(latencies):6.1f} us  "
+          f"p99 {p99:7.1f} us  {extra}")
+
+
+async def main() -> None:
+    tracemalloc.start()
+    plain: Dict[str, TrimmingSession] = {}
+
+    def get_plain(session_id: str, state: TravelState) -> TrimmingSession:
+        session = plain.get(session_id)
+        if session is None:
+            session = plain[session_id] = TrimmingSession(session_id, state, max_turns=MAX_TURNS)
+        return session
+
+    base = tracemalloc.get_traced_memory()[0]
+    latencies = await _drive(get_plain)
+    _report("dict (unbounded)", latencies, tracemalloc.get_traced_memory()[0] - base, f"sessions {len(plain)}")
+    plain.clear()
+    gc.collect()
+
+    for ceiling in CEILINGS_MB:
+        with tempfile.TemporaryDirectory() as spill_dir:
+            base = tracemalloc.get_traced_memory()[0]
+            registry = SessionRegistry(max_bytes=ceiling * 2**20, spill_dir=spill_dir, max_turns=MAX_TURNS)
+            latencies = await _drive(registry.get)
+            await asyncio.sleep(0.1)
+            heap = tracemalloc.get_traced_memory()[0] - base
+            counts = registry.counts()
+            _report(
+                f"registry {ceiling} MB", latencies, heap,
+                f"live {counts['live']} spilled {counts['spilled']} restored {counts['restored']} "
+                f"(estimate {counts['bytes'] / 2**20:.1f} MB)",
+            )
+            await registry.close()
+            del registry
+            gc.collect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""Benchmark for SQLiteTrimmingSession: sustained append throughput and get_items latency.
+
+Run from the repo root:
+    python -m benchmarks.bench_sqlite_session
+"""
+from __future__ import annotations
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from memory_state import TravelState
+from sqlite_session import SQLiteSessionStore, SQLiteTrimmingSession
+
+N_SESSIONS = 5_000
+TURNS_PER_SESSION = 6
+ITEMS_PER_TURN = 4
+GET_CALLS = 20_000
+CACHE_SIZE = 512
+
+
+def _turn(i: int) -> list[dict]:
+    items = [{"role": "user", "content": f"question {i}"}]
+    items += [{"role": "assistant", "content": "y" * 120} for _ in range(ITEMS_PER_TURN - 1)]
+    return items
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSessionStore(Path(tmp) / "sessions.db", cache_size=CACHE_SIZE)
+        sessions = [
+            SQLiteTrimmingSession(f"s{i}", TravelState(), store, max_turns=3) for i in range(N_SESSIONS)
+        ]
+
+        t0 = time.perf_counter()
+        for turn in range(TURNS_PER_SESSION):
+            for s in sessions:
+                await s.add_items(_turn(turn))
+        elapsed = time.perf_counter() - t0
+        items = N_SESSIONS * TURNS_PER_SESSION * ITEMS_PER_TURN
+        print(f"append: {items} items in {elapsed:.2f}s -> {items / elapsed:,.0f} items/s "
+              f"({N_SESSIONS * TURNS_PER_SESSION / elapsed:,.0f} add_items calls/s)")
+
+        # Skewed access: most reads go to a hot set that fits in the cache.
+        rnd = random.Random(0)
+        hot = sessions[: CACHE_SIZE // 2]
+        lat = []
+        for _ in range(GET_CALLS):
+            s = rnd.choice(hot) if rnd.random() < 0.9 else rnd.choice(sessions)
+            t = time.perf_counter()
+            await s.get_items()
+            lat.append((time.perf_counter() - t) * 1e6)
+
+        lat.sort()
+        p50 = lat[len(lat) // 2]
+        p99 = lat[int(len(lat) * 0.99)]
+        hits, misses = store.cache_hits, store.cache_misses
+        print(f"get_items over {N_SESSIONS} sessions: p50={p50:.1f}us p99={p99:.1f}us "
+              f"mean={statistics.fmean(lat):.1f}us cache hit rate={hits / max(1, hits + misses):.1%}")
+        store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+"""Benchmark: journal + snapshot persistence (JournalStateBackend) vs one JSON file per customer.
+
+For a process holding many users: every user saves once, then adds a session note per round
+(saved in write-behind sized batches). Reports the cost and bytes of the per-note saves,
+startup (opening the store) and restoring every user, before and after compaction, plus the
+longest save while a compaction runs. First checks that a restore matches the live state
+when one batch both refreshes a session note in place and appends another.
+
+Run from the repo root:
+    python -m benchmarks.bench_state_journal
+"""
+from __future__ import annotations
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from memory_state import TravelState, user_state
+from state_concurrency import commit_session_note, upsert_session_note
+from state_journal import JournalStateBackend
+from state_repository import JsonFileStateBackend, StateBackend
+
+USERS = [1_000, 10_000]
+ROUNDS = 5
+BATCH = 64  ## WriteBehindBuffer's default max_batch
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+async def _save_all(backend: StateBackend, states: List[Tuple[str, TravelState]]) -> None:
+    for i in range(0, len(states), BATCH):
+        await backend.save_many(states[i : i + BATCH])
+
+
+async def _restore_all(backend: StateBackend, ids: List[str]) -> float:
+    t0 = time.perf_counter()
+    for customer_id in ids:
+        assert await backend.load(customer_id) is not None
+    return time.perf_counter() - t0
+
+
+async def _check_round_trip(root: Path) -> None:
+    backend = JournalStateBackend(root / "round_trip", fsync=False)
+    state = TravelState.from_dict(user_state.to_dict())
+    for text in ("Prefers aisle seats.", "Is vegetarian.", "Avoids red-eye flights."):
+        upsert_session_note(state, {"text": text, "last_update_date": "2025-01-01", "keywords": ["a"]})
+    await backend.save("crm_rt", state)
+    ## one write-behind flush holding both a refreshed middle note and a new one
+    upsert_session_note(state, {"text": "Is vegetarian.", "last_update_date": "2025-06-01", "keywords": ["dietary"]})
+    upsert_session_note(state, {"text": "Has a dog.", "last_update_date": "2025-06-01", "keywords": ["pets"]})
+    await backend.save_many([("crm_rt", state)])
+    backend.close()
+    restored = await JournalStateBackend(root / "round_trip", fsync=False).load("crm_rt")
+    assert restored is not None and restored.to_dict() == state.to_dict(), "restore differs from the live state"
+
+
+async def _saves_during_compaction(backend: JournalStateBackend, states: List[Tuple[str, TravelState]]) -> float:
+    """Longest single save (ms) while `backend.compact()` runs on a worker thread."""
+    compaction = asyncio.ensure_future(asyncio.to_thread(backend.compact))
+    longest = 0.0
+    i = 0
+    while not compaction.done():
+        customer_id, state = states[i % len(states)]
+        commit_session_note(state, {"text": f"Note {i}.", "last_update_date": "2025-07-01", "keywords": ["misc"]})
+        t0 = time.perf_counter()
+        await backend.save(customer_id, state)
+        longest = max(longest, time.perf_counter() - t0)
+        i += 1
+    await compaction
+    return longest * 1e3
+
+
+async def _run(n: int, root: Path) -> None:
+    seed = user_state.to_dict()
+    ids = [f"crm_{i:06d}" for i in range(n)]
+    results = {}
+    for name, make in (
+        ("json files", lambda d: JsonFileStateBackend(d)),
+        ("journal", lambda d: JournalStateBackend(d, max_journal_bytes=1 << 40)),
+    ):
+        directory = root / f"{name.replace(' ', '_')}_{n}"
+        backend = make(directory)
+        states = [(cid, TravelState.from_dict(seed)) for cid in ids]
+        await _save_all(backend, states)
+        before = _dir_bytes(directory)
+
+        t0 = time.perf_counter()
+        for r in range(ROUNDS):
+            for _, state in states:
+                commit_session_note(state, {"text": f"Round {r} note.", "last_update_date": "2025-06-01", "keywords": ["misc"]})
+            await _save_all(backend, states)
+        note_us = (time.perf_counter() - t0) / (ROUNDS * n) * 1e6
+        note_bytes = (_dir_bytes(directory) - before) / (ROUNDS * n)
+        if isinstance(backend, JournalStateBackend):
+            backend.close()
+
+        t0 = time.perf_counter()
+        reopened = make(directory)
+        startup = time.perf_counter() - t0
+        restore = await _restore_all(reopened, ids)
+        line = (f"users={n:>6}  {name:<10}  save/note {note_us:7.1f} us {note_bytes:8.0f} B  "
+                f"startup {startup * 1e3:8.1f} ms  restore {restore / n * 1e6:6.1f} us/user")
+        if isinstance(reopened, JournalStateBackend):
+            size = _dir_bytes(directory)
+            t0 = time.perf_counter()
+            stall_ms = await _saves_during_compaction(reopened, states)
+            compact_s = time.perf_counter() - t0
+            reopened.close()
+            t0 = time.perf_counter()
+            compacted = make(directory)
+            startup_c = time.perf_counter() - t0
+            restore_c = await _restore_all(compacted, ids)
+            compacted.close()
+            line += (f"\n{'':>12}  compacted   {compact_s * 1e3:7.0f} ms, {size / 2**20:.1f} -> {_dir_bytes(directory) / 2**20:.1f} MB  "
+                     f"startup {startup_c * 1e3:8.1f} ms  restore {restore_c / n * 1e6:6.1f} us/user  "
+                     f"longest save meanwhile {stall_ms:.1f} ms")
+        results[name] = line
+    print("\n".join(results.values()))
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        await _check_round_trip(Path(tmp))
+        print("round trip (in-place refresh + append in one flush): ok")
+        for n in USERS:
+            await _run(n, Path(tmp))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""Load benchmark for StateRepository: tens of thousands of simulated users with skewed access.
+
+Run from the repo root:
+    python -m benchmarks.bench_state_repository
+"""
+from __future__ import annotations
+import asyncio
+import random
+import time
+import tracemalloc
+from typing import Optional
+
+from memory_state import TravelState
+from state_concurrency import upsert_session_note
+from state_repository import StateBackend, StateRepository, WriteBehindBuffer
+
+USERS = 50_000
+REQUESTS = 200_000
+CONCURRENCY = 500  ## gets issued together per batch (exercises load coalescing)
+CAPACITIES = [1_000, 5_000, 20_000]
+LOAD_LATENCY = 0.001  ## simulated backend round trip (seconds), for loads, saves and batched saves alike
+
+
+class SyntheticBackend(StateBackend):
+    """Fabricates a small state per user and only counts writes, so memory reflects the cache alone."""
+
+    def __init__(self) -> None:
+        self.saves = 0
+
+    async def load(self, customer_id: str) -> Optional[TravelState]:
+        await asyncio.sleep(LOAD_LATENCY)
+        n = int(customer_id[1:])
+        return TravelState(
+            profile={"global_customer_id": customer_id, "seat_preference": "aisle" if n % 2 else "window"},
+            global_memory={"notes": [
+                {"text": f"Prefers option {n % 7} for hotels.", "last_update_date": "2025-01-01", "keywords": ["hotel"]},
+                {"text": "Usually avoids red-eye flights.", "last_update_date": "2024-05-03", "keywords": ["flight"]},
+            ]},
+        )
+
+    async def save(self, customer_id: str, state: TravelState) -> None:
+        await asyncio.sleep(LOAD_LATENCY)
+        self.saves += 1
+
+    async def save_many(self, items) -> None:
+        await asyncio.sleep(LOAD_LATENCY)
+        self.saves += len(items)
+
+
+async def _run(capacity: int, write_behind: bool) -> None:
+    rnd = random.Random(capacity)
+    ## Zipf-like popularity: a small head of heavy users, a long tail of occasional ones
+    weights = [1.0 / (rank + 1) ** 1.1 for rank in range(USERS)]
+    ids = [f"u{i}" for i in range(USERS)]
+    stream = rnd.choices(ids, weights=weights, k=REQUESTS)
+
+    backend = SyntheticBackend()
+    buffer = WriteBehindBuffer(backend) if write_behind else None
+    repo = StateRepository(backend, capacity=capacity, write_behind=buffer)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for start in range(0, REQUESTS, CONCURRENCY):
+        batch = stream[start:start + CONCURRENCY]
+        states = await asyncio.gather(*(repo.get(cid) for cid in batch))
+        ## a third of the requests write memory
+        ## (commits mark the state dirty themselves)
+        for i, state in enumerate(states[::3]):
+            upsert_session_note(state, {"text": f"note {start + i}", "last_update_date": "2025-06-01", "keywords": []})
+    elapsed = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    await repo.flush()
+    flush_s = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    s = repo.stats
+    saves = backend.saves
+    if buffer is not None:
+        await buffer.close()
+    print(
+        f"{'write-behind' if write_behind else 'write-back  '} capacity={capacity:>6}  hit rate={s.hit_rate:6.1%}  loads={s.loads:>6} coalesced={s.coalesced_loads:>6} "
+        f"evictions={s.evictions:>6} saves={saves:>6} (final flush {flush_s * 1e3:6.1f}ms)  "
+        f"mem={current / 2**20:6.1f}MB (peak {peak / 2**20:6.1f}MB, {current / max(1, len(repo)) / 1024:.1f}KB/user)  "
+        f"{REQUESTS / elapsed:,.0f} gets/s"
+    )
+
+
+async def main() -> None:
+    print(f"{USERS} users, {REQUESTS} requests, {CONCURRENCY} concurrent per batch")
+    for capacity in CAPACITIES:
+        for write_behind in (False, True):
+            await _run(capacity, write_behind)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""Benchmark: time to first token, blocking `run_turn` vs streamed `stream_turn`, fully offline.
+
+`ScriptedModel` streams its reply word by word with a fixed per-word delay, standing in for
+model decode time. A blocking turn shows nothing until the whole reply is in, so its time to
+first token is its total time; a streamed turn shows the first word after one delay plus our
+own per-turn overhead (hooks, prompt build, session reads and writes, memory tool calls).
+
+Run from the repo root:
+    python -m benchmarks.bench_streaming
+"""
+from __future__ import annotations
+import asyncio
+import os
+import statistics
+from typing import List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from agents import Agent
+
+from benchmarks.bench_agent_pipeline import SCRIPT, _state
+from benchmarks.fake_model import ScriptedModel
+from context_management import TrimmingSession
+from memory_distillation import save_memory_note
+from memory_hooks import MemoryHooks
+from travel_agent import instructions, run_turn, stream_turn
+
+GLOBAL_NOTES = [10, 1_000]
+TOKEN_DELAY_S = 0.005
+REPLY = " ".join(["Here are three options; I recommend the first one."] * 6)  ## ~50 words
+
+
+def _agent(model: ScriptedModel) -> Agent:
+    return Agent(name="Travel Concierge", model=model, instructions=instructions, hooks=MemoryHooks(), tools=[save_memory_note])
+
+
+async def _blocking(global_notes: int) -> List[float]:
+    model = ScriptedModel(reply=REPLY)
+    agent, state = _agent(model), _state(global_notes)
+    session = TrimmingSession("bench", state, max_turns=len(SCRIPT))
+    totals = []
+    loop = asyncio.get_running_loop()
+    for text in SCRIPT:
+        t0 = loop.time()
+        await run_turn(agent, text, state, session)
+        totals.append((loop.time() - t0) * 1e3)
+    return totals
+
+
+async def _streamed(global_notes: int) -> Tuple[List[float], List[float]]:
+    model = ScriptedModel(reply=REPLY, token_delay=TOKEN_DELAY_S)
+    agent, state = _agent(model), _state(global_notes)
+    session = TrimmingSession("bench", state, max_turns=len(SCRIPT))
+    ttft, totals = [], []
+    for text in SCRIPT:
+        turn = await stream_turn(agent, text, state, session, on_delta=lambda delta: None)
+        ttft.append(turn.ttft_ms or 0.0)
+        totals.append(turn.total_ms)
+    assert len(state.session_memory["notes"]) >= 2, "memory tool calls were not applied"
+    return ttft, totals
+
+
+async def main() -> None:
+    print(f"{'global notes':>12} {'blocking ttft':>14} {'stream ttft':>12} {'stream total':>13} {'tool-turn ttft':>15}")
+    for notes in GLOBAL_NOTES:
+        ## the blocking reply arrives in one piece, after the same per-word decode time
+        blocking = [t + TOKEN_DELAY_S * 1e3 * len(REPLY.split()) for t in await _blocking(notes)]
+        ttft, totals = await _streamed(notes)
+        tool_turns = [t for text, t in zip(SCRIPT, ttft) if text.lower().startswith(("remember", "this time", "from now on"))]
+        print(
+            f"{notes:>12} {statistics.median(blocking):11.1f} ms {statistics.median(ttft):9.1f} ms "
+            f"{statistics.median(totals):10.1f} ms {statistics.median(tool_turns):12.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
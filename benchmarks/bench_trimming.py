@@ -0,0 +1,67 @@
+"""Microbenchmark for TrimmingSession add/get cost as history grows.
+
+Run from the repo root:
+    python -m benchmarks.bench_trimming
+"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import List
+
+from agents.items import TResponseInputItem
+from context_management import TrimmingSession
+from memory_state import TravelState
+from session_summary import ExtractiveSummarizer
+
+ITEMS_PER_TURN = 10  ## 1 user message + tool-heavy tail
+HISTORY_SIZES = [100, 1_000, 10_000]
+CALLS = 2_000
+SUMMARY_LATENCY = 0.2  ## simulated model round trip of the compaction summarizer (seconds)
+
+
+class SlowSummarizer(ExtractiveSummarizer):
+    async def __call__(self, previous, evicted):
+        await asyncio.sleep(SUMMARY_LATENCY)
+        return await super().__call__(previous, evicted)
+
+
+def _turn(i: int) -> List[TResponseInputItem]:
+    items: List[TResponseInputItem] = [{"role": "user", "content": f"question {i}"}]
+    for j in range(ITEMS_PER_TURN - 1):
+        items.append({"type": "function_call_output", "call_id": f"c{i}_{j}", "output": "x" * 64})
+    return items
+
+
+async def _bench(history_items: int, compaction: bool = False) -> tuple[float, float]:
+    turns = history_items // ITEMS_PER_TURN
+    summarizer = SlowSummarizer() if compaction else None
+    session = TrimmingSession("bench", TravelState(), max_turns=turns, summarizer=summarizer)
+    for i in range(turns):
+        await session.add_items(_turn(i))
+
+    # Each add evicts one whole turn, so the history size stays at `history_items`.
+    t0 = time.perf_counter()
+    for i in range(CALLS):
+        await session.add_items(_turn(turns + i))
+    add_us = (time.perf_counter() - t0) / CALLS * 1e6
+
+    t0 = time.perf_counter()
+    for _ in range(CALLS):
+        await session.get_items(limit=ITEMS_PER_TURN)
+    get_us = (time.perf_counter() - t0) / CALLS * 1e6
+    if compaction:
+        await session.wait_for_summary()
+    return add_us, get_us
+
+
+async def main() -> None:
+    print(f"{'history items':>14} {'add_items (us)':>15} {'get_items(limit) (us)':>22} {'add w/ compaction (us)':>23}")
+    for size in HISTORY_SIZES:
+        add_us, get_us = await _bench(size)
+        ## the summarizer takes SUMMARY_LATENCY per batch, but trimming must not wait for it
+        compact_add_us, _ = await _bench(size, compaction=True)
+        print(f"{size:>14} {add_us:>15.2f} {get_us:>22.2f} {compact_add_us:>23.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
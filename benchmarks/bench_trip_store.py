@@ -0,0 +1,121 @@
+"""Benchmark: TripStore ingest, indexed queries and summary rendering vs scanning the raw trip list.
+
+Run from the repo root:
+    python -m benchmarks.bench_trip_store
+"""
+from __future__ import annotations
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+
+from trip_store import TripStore, render_trip_summary_md
+
+SIZES = [10_000, 50_000]
+QUERIES = 200
+
+_CITIES = [("Paris", "France"), ("Rome", "Italy"), ("Tokyo", "Japan"), ("London", "UK"), ("Austin", "USA"),
+           ("Berlin", "Germany"), ("Lisbon", "Portugal"), ("Denver", "USA"), ("Seoul", "South Korea"), ("Cairo", "Egypt")]
+_AIRLINES = ["United", "Delta", "Lufthansa", "ANA", "TAP", "British Airways"]
+_BRANDS = ["Hilton", "Marriott", "Hyatt", "IHG", "Accor", "Independent"]
+_HOODS = ["city_center", "airport", "old_town", "business_district", "beach"]
+
+
+def _trips(n: int, rnd: random.Random) -> List[Dict[str, Any]]:
+    start = date(2015, 1, 1)
+    trips = []
+    for _ in range(n):
+        city, country = rnd.choice(_CITIES)
+        check_in = start + timedelta(days=rnd.randrange(4_000))
+        nights = rnd.choice([1, 2, 3, 4, 5, 7, 10, 14])
+        trips.append({
+            "from_city": "San Francisco", "from_country": "USA",
+            "to_city": city, "to_country": country,
+            "check_in_date": check_in.isoformat(),
+            "check_out_date": (check_in + timedelta(days=nights)).isoformat(),
+            "trip_purpose": rnd.choice(["leisure", "business", "family"]),
+            "party_size": rnd.randint(1, 4),
+            "flight": {
+                "airline": rnd.choice(_AIRLINES),
+                "cabin_class": rnd.choice(["economy", "economy_plus", "business"]),
+                "seat_selected": rnd.choice(["aisle", "aisle", "window", "middle"]),
+                "layovers": rnd.randint(0, 2),
+                "baggage": {"checked_bags": 0 if nights < 7 and rnd.random() < 0.8 else rnd.randint(0, 2), "carry_ons": 1},
+                "special_requests": ["vegetarian_meal"] if rnd.random() < 0.3 else [],
+            },
+            "hotel": {"brand": rnd.choice(_BRANDS), "neighborhood": rnd.choice(_HOODS), "high_floor": rnd.random() < 0.5},
+        })
+    return trips
+
+
+def _scan(trips: List[Dict[str, Any]], destination: str, brand: str, start: str, end: str) -> List[Dict[str, Any]]:
+    ## what a caller has to do without the store
+    out = [
+        t for t in trips
+        if destination in (t["to_city"], t["to_country"])
+        and brand in (t["hotel"]["brand"], t["flight"]["airline"])
+        and start <= t["check_in_date"] <= end
+    ]
+    return sorted(out, key=lambda t: t["check_in_date"], reverse=True)
+
+
+def _time_us(fn: Callable[[], Any], repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main() -> None:
+    rnd = random.Random(0)
+    for n in SIZES:
+        trips = _trips(n, rnd)
+        store = TripStore()
+        t0 = time.perf_counter()
+        store.sync(trips)
+        ingest_s = time.perf_counter() - t0
+
+        ## second ingest under tracemalloc, for the store's own footprint
+        tracemalloc.start()
+        footprint = TripStore()
+        footprint.sync(trips)
+        index_mb = tracemalloc.get_traced_memory()[0] / 2**20
+        tracemalloc.stop()
+        del footprint
+
+        ## one new booking on the same list: O(1) aggregate update + index insert
+        new_trip = _trips(1, rnd)[0]
+        t0 = time.perf_counter()
+        trips.append(new_trip)
+        store.sync(trips)
+        append_us = (time.perf_counter() - t0) * 1e6
+
+        queries = []
+        for _ in range(QUERIES):
+            city, _ = rnd.choice(_CITIES)
+            first = date(2015, 1, 1) + timedelta(days=rnd.randrange(3_000))
+            queries.append((city, rnd.choice(_BRANDS), first.isoformat(), (first + timedelta(days=365)).isoformat()))
+        for q in queries[:20]:
+            got = store.query(destination=q[0], brand=q[1], start=q[2], end=q[3])
+            want = _scan(trips, *q)
+            ## same trips, same date order (ties on one check-in date may come out in either order)
+            assert sorted(map(id, got)) == sorted(map(id, want))
+            assert [t["check_in_date"] for t in got] == [t["check_in_date"] for t in want]
+
+        it = iter(queries * 10)
+        scan_us = _time_us(lambda: _scan(trips, *next(it)), QUERIES)
+        it = iter(queries * 10)
+        query_us = _time_us(lambda: (lambda q: store.query(destination=q[0], brand=q[1], start=q[2], end=q[3]))(next(it)), QUERIES)
+        dest_us = _time_us(lambda: store.query(destination="Paris", limit=10), QUERIES)
+        render_us = _time_us(lambda: render_trip_summary_md(store), QUERIES)
+
+        print(
+            f"trips={n:>6}  ingest {ingest_s * 1e3:7.1f} ms ({ingest_s / n * 1e6:.1f} us/trip, {index_mb:.1f} MB)  "
+            f"append {append_us:6.1f} us  scan {scan_us:8.1f} us  query {query_us:7.1f} us "
+            f"({scan_us / query_us:5.1f}x)  latest-10 {dest_us:6.1f} us  summary {render_us:6.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
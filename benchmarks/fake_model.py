@@ -0,0 +1,153 @@
+"""Deterministic, offline stand-in for the OpenAI model, for driving the real agent pipeline.
+
+Replies are scripted from the latest user message:
+- messages matching a `NoteRule` pattern get a `save_memory_note` tool call first, then a
+  canned reply once the tool output comes back
+- everything else gets a canned reply straight away
+
+Every call records what the SDK sent (system prompt size, input items) in `calls`.
+Streamed calls send replies word by word as text deltas, `token_delay` seconds apart.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+from agents import Model, ModelResponse
+from agents.items import TResponseInputItem, TResponseStreamEvent
+from agents.usage import Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+)
+
+
+@dataclass(frozen=True)
+class NoteRule:
+    pattern: str
+    text: str
+    keywords: Sequence[str]
+
+
+DEFAULT_RULES = (
+    NoteRule(r"\bremember\b.*\bvegetarian\b", "Is vegetarian.", ("dietary",)),
+    NoteRule(r"\bthis time\b.*\bwindow\b", "This trip only: wants a window seat to sleep.", ("seat", "flight")),
+    NoteRule(r"\bfrom now on\b", "Prefers hotels with a gym.", ("hotel",)),
+)
+
+
+@dataclass
+class ModelCall:
+    system_chars: int
+    input_items: int
+    input_chars: int
+    tool_call: bool
+
+
+@dataclass
+class ScriptedModel(Model):
+    rules: Sequence[NoteRule] = DEFAULT_RULES
+    reply: str = "Here are three options; I recommend the first one."
+    calls: List[ModelCall] = field(default_factory=list)
+    token_delay: float = 0.0  ## seconds between streamed words
+    _counter: int = 0
+
+    def _next_id(self, prefix: str) -> str:
+        self._counter += 1
+        return f"{prefix}_{self._counter}"
+
+    def _message(self, text: str) -> ResponseOutputMessage:
+        return ResponseOutputMessage(
+            id=self._next_id("msg"),
+            type="message",
+            role="assistant",
+            status="completed",
+            content=[ResponseOutputText(type="output_text", text=text, annotations=[])],
+        )
+
+    def _tool_call(self, rule: NoteRule) -> ResponseFunctionToolCall:
+        return ResponseFunctionToolCall(
+            id=self._next_id("fc"),
+            call_id=self._next_id("call"),
+            type="function_call",
+            name="save_memory_note",
+            arguments=json.dumps({"text": rule.text, "keywords": list(rule.keywords)}),
+        )
+
+    def _respond(self, system_instructions: Optional[str], input: str | list[TResponseInputItem]) -> list:
+        items = [{"role": "user", "content": input}] if isinstance(input, str) else input
+        last = items[-1] if items else {}
+        user_text = ""
+        for item in reversed(items):
+            if isinstance(item, dict) and item.get("role") == "user" and isinstance(item.get("content"), str):
+                user_text = item["content"]
+                break
+
+        rule = None
+        if not (isinstance(last, dict) and last.get("type") == "function_call_output"):
+            rule = next((r for r in self.rules if re.search(r.pattern, user_text, re.IGNORECASE)), None)
+
+        self.calls.append(ModelCall(
+            system_chars=len(system_instructions or ""),
+            input_items=len(items),
+            input_chars=sum(len(str(i)) for i in items),
+            tool_call=rule is not None,
+        ))
+        return [self._tool_call(rule)] if rule is not None else [self._message(self.reply)]
+
+    async def get_response(
+        self,
+        system_instructions: Optional[str],
+        input: str | list[TResponseInputItem],
+        model_settings: Any,
+        tools: Any,
+        output_schema: Any,
+        handoffs: Any,
+        tracing: Any,
+        *,
+        previous_response_id: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        prompt: Any = None,
+    ) -> ModelResponse:
+        output = self._respond(system_instructions, input)
+        return ModelResponse(output=output, usage=Usage(requests=1), response_id=None)
+
+    async def stream_response(
+        self,
+        system_instructions: Optional[str],
+        input: str | list[TResponseInputItem],
+        model_settings: Any,
+        tools: Any,
+        output_schema: Any,
+        handoffs: Any,
+        tracing: Any,
+        *,
+        previous_response_id: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        prompt: Any = None,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        output = self._respond(system_instructions, input)
+        seq = 0
+        for item in output:
+            if not isinstance(item, ResponseOutputMessage):
+                continue
+            words = item.content[0].text.split(" ")
+            for i, word in enumerate(words):
+                if self.token_delay:
+                    await asyncio.sleep(self.token_delay)
+                yield ResponseTextDeltaEvent(
+                    type="response.output_text.delta", item_id=item.id, output_index=0, content_index=0,
+                    delta=word if i == 0 else " " + word, logprobs=[], sequence_number=seq,
+                )
+                seq += 1
+        response = Response(
+            id=self._next_id("resp"), created_at=0, model="scripted", object="response", output=output,
+            parallel_tool_calls=False, tool_choice="auto", tools=[],
+        )
+        yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=seq)
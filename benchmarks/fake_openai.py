@@ -0,0 +1,278 @@
+"""Local stand-in for the OpenAI Responses endpoint, for benchmarks that exercise the real HTTP clients.
+
+`FakeResponsesServer` answers `POST /v1/responses` the way the app's callers expect:
+
+- agent runs (requests with tools): a `save_memory_note` call when the latest user message
+  matches one of the scripted `NoteRule`s (see `fake_model`), else a canned text reply
+- consolidation (the `consolidated_notes` JSON schema): the input notes, merged by text
+- anything else (session summaries): a short text
+
+Each response waits `latency_s` (time to first token) plus one `1 / tokens_per_s` per output
+token; `"stream": true` requests get server-sent events (created, text deltas, completed).
+The server speaks HTTP/1.1 keep-alive, counts requests per kind and TCP connections, and
+serves the counters as JSON at `GET /v1/stats`.
+
+Run it in its own process (so its threads don't compete with the code under test):
+    python -m benchmarks.fake_openai --latency 0.3 --tokens-per-s 80
+It prints `listening <base_url>` once ready.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from benchmarks.fake_model import DEFAULT_RULES, NoteRule
+
+AGENT_REPLY = "Here are three options that fit your dates; I recommend the first one, a direct flight."
+SUMMARY_REPLY = "- Planning a trip; options shortlisted, nothing booked yet."
+_NOTES_BLOCK = re.compile(r"<(GLOBAL|SESSION)_JSON>\s*(.*?)\s*</\1_JSON>", re.DOTALL)
+
+
+def _response(response_id: str, output: List[Dict[str, Any]], status: str = "completed") -> Dict[str, Any]:
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": 0,
+        "model": "fake",
+        "status": status,
+        "output": output,
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": 0, "output_tokens": 0, "total_tokens": 0,
+            "input_tokens_details": {"cached_tokens": 0}, "output_tokens_details": {"reasoning_tokens": 0},
+        },
+    }
+
+
+def _message(item_id: str, text: str) -> Dict[str, Any]:
+    return {
+        "type": "message",
+        "id": item_id,
+        "role": "assistant",
+        "status": "completed",
+        "content": [{"type": "output_text", "text": text, "annotations": []}],
+    }
+
+
+def response_body(text: str, response_id: str = "resp_fake") -> bytes:
+    return json.dumps(_response(response_id, [_message("msg_fake", text)])).encode()
+
+
+def _user_text(items: Any) -> str:
+    if isinstance(items, str):
+        return items
+    for item in reversed(items or []):
+        if isinstance(item, dict) and item.get("role") == "user":
+            content = item.get("content")
+            if isinstance(content, str):
+                return content
+            return " ".join(part.get("text", "") for part in content or [] if isinstance(part, dict))
+    return ""
+
+
+def _merged_notes(prompt: str) -> List[Dict[str, Any]]:
+    merged: Dict[str, Dict[str, Any]] = {}
+    for _, block in _NOTES_BLOCK.findall(prompt):
+        try:
+            notes = json.loads(block)
+        except ValueError:
+            continue
+        for note in notes if isinstance(notes, list) else []:
+            if isinstance(note, dict) and note.get("text"):
+                merged[note["text"].strip().lower()] = {
+                    "text": note["text"],
+                    "last_update_date": note.get("last_update_date") or "2025-01-01",
+                    "keywords": list(note.get("keywords") or []),
+                }
+    return list(merged.values())
+
+
+class FakeResponsesServer:
+    """Threaded HTTP server on 127.0.0.1 (`port` 0: a free one); use as a context manager."""
+
+    def __init__(
+        self,
+        latency_s: float = 0.0,
+        tokens_per_s: Optional[float] = None,
+        rules: Sequence[NoteRule] = DEFAULT_RULES,
+        reply: Callable[[dict], str] = lambda request: SUMMARY_REPLY,
+        agent_reply: str = AGENT_REPLY,
+        port: int = 0,
+    ) -> None:
+        self.latency_s = latency_s
+        self.tokens_per_s = tokens_per_s
+        self.rules = rules
+        self.reply = reply
+        self.agent_reply = agent_reply
+        self.requests = 0
+        self.connections = 0
+        self.kinds: Counter[str] = Counter()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  ## keep-alive
+            disable_nagle_algorithm = True  ## headers and body go out as separate writes
+
+            def setup(self) -> None:
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self) -> None:
+                if self.path.rstrip("/").endswith("/stats"):
+                    self._send(200, "application/json", json.dumps(server.stats()).encode())
+                else:
+                    self._send(404, "application/json", b"{}")
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    request = json.loads(body or b"{}")
+                except ValueError:
+                    request = {}
+                kind, output = server.respond(request)
+                with server._lock:
+                    server.requests += 1
+                    server.kinds[kind] += 1
+                response_id = f"resp_{next(server._ids)}"
+                if request.get("stream"):
+                    self._stream(response_id, output)
+                    return
+                server._wait(server.latency_s + server._token_time(output))
+                self._send(200, "application/json", json.dumps(_response(response_id, output)).encode())
+
+            def _send(self, status: int, content_type: str, payload: bytes) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, response_id: str, output: List[Dict[str, Any]]) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                seq = itertools.count()
+                server._wait(server.latency_s)
+                self._event({"type": "response.created", "sequence_number": next(seq),
+                             "response": _response(response_id, [], status="in_progress")})
+                for index, item in enumerate(output):
+                    if item["type"] != "message":
+                        server._wait(server._token_time([item]))
+                        continue
+                    for word in re.findall(r"\S+\s*", item["content"][0]["text"]):
+                        self._event({"type": "response.output_text.delta", "sequence_number": next(seq),
+                                     "item_id": item["id"], "output_index": index, "content_index": 0,
+                                     "delta": word, "logprobs": []})
+                        server._wait(server._token_time(None, 1))
+                self._event({"type": "response.completed", "sequence_number": next(seq),
+                             "response": _response(response_id, output)})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _event(self, event: Dict[str, Any]) -> None:
+                data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.request_queue_size = 1024
+        self._thread: Optional[threading.Thread] = None
+
+    # --- scripted behaviour ---
+
+    def respond(self, request: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+        """(request kind, output items) for one Responses request."""
+        n = next(self._ids)
+        fmt = (request.get("text") or {}).get("format") or {}
+        if fmt.get("name") == "consolidated_notes":
+            return "consolidation", [_message(f"msg_{n}", json.dumps({"notes": _merged_notes(_user_text(request.get("input")))}))]
+        if not request.get("tools"):
+            return "other", [_message(f"msg_{n}", self.reply(request))]
+        items = request.get("input")
+        last = items[-1] if isinstance(items, list) and items else {}
+        if not (isinstance(last, dict) and last.get("type") == "function_call_output"):
+            text = _user_text(items)
+            rule = next((r for r in self.rules if re.search(r.pattern, text, re.IGNORECASE)), None)
+            if rule is not None:
+                return "tool_call", [{
+                    "type": "function_call",
+                    "id": f"fc_{n}",
+                    "call_id": f"call_{n}",
+                    "name": "save_memory_note",
+                    "arguments": json.dumps({"text": rule.text, "keywords": list(rule.keywords)}),
+                    "status": "completed",
+                }]
+        return "agent", [_message(f"msg_{n}", self.agent_reply)]
+
+    def _token_time(self, output: Optional[List[Dict[str, Any]]], tokens: int = 0) -> float:
+        if not self.tokens_per_s:
+            return 0.0
+        for item in output or []:
+            if item["type"] == "message":
+                tokens += len(item["content"][0]["text"].split())
+            else:
+                tokens += len(item.get("arguments", "")) // 4
+        return tokens / self.tokens_per_s
+
+    @staticmethod
+    def _wait(seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+
+    # --- lifecycle ---
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": self.requests, "connections": self.connections, "kinds": dict(self.kinds)}
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.requests = self.connections = 0
+            self.kinds.clear()
+
+    def __enter__(self) -> "FakeResponsesServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local fake OpenAI Responses endpoint.")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=None, help="output rate (default: instant)")
+    args = parser.parse_args()
+    server = FakeResponsesServer(latency_s=args.latency, tokens_per_s=args.tokens_per_s, port=args.port)
+    print(f"listening {server.base_url}", flush=True)
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
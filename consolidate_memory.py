@@ -1,12 +1,35 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+import asyncio
 import json
+import logging
 from memory_state import TravelState
-from openai import OpenAI
-from dotenv import load_dotenv
-load_dotenv()
+from memory_merge import premerge_notes
+from metrics import metrics
+from consolidation_output import CONSOLIDATION_TEXT_FORMAT, ConsolidationOutputError, parse_consolidated_notes
+from note_store import note_json_default
+from state_concurrency import commit, snapshot
+from openai_clients import get_async_client, get_sync_client
 
-client = OpenAI()
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+CONSOLIDATION_MODEL = "gpt-5.2"
+
+## Async path defaults: per-call timeout (seconds), retries, and how many consolidations may be in flight at once
+CONSOLIDATION_TIMEOUT = 60.0
+CONSOLIDATION_MAX_RETRIES = 2
+CONSOLIDATION_CONCURRENCY = 8
+
+_consolidation_semaphore = asyncio.Semaphore(CONSOLIDATION_CONCURRENCY)
+
+
+def set_consolidation_concurrency(limit: int) -> None:
+    """Change the global cap on concurrent async consolidations (call before any are in flight)."""
+    global _consolidation_semaphore
+    _consolidation_semaphore = asyncio.Semaphore(max(1, limit))
 
 
 def consolidate_memory(state: TravelState)->None:
@@ -17,18 +40,96 @@ def consolidate_memory(state: TravelState)->None:
     - Resolves conflicts by keeping most recent (last_update_date)
     - Clears session notes after consolidation
     - Mutates `state` in place
+    - Output that holds no usable notes is logged and counted (`consolidation_parse_failures`);
+      global memory is left unchanged and the session notes are kept for the next consolidation
+
+    Exact/near duplicates and ephemeral notes are resolved locally first (see `memory_merge`);
+    the model only sees the unresolved remainder, and is not called at all if nothing is left.
+    Of the global notes, only those sharing a keyword with the remainder are sent; the result
+    is spliced back into the untouched rest.
     """
     
-    session_notes : List[Dict[str, Any]] = state.session_memory.get("notes", []) or []
+    snap = snapshot(state)
+    session_notes : List[Dict[str, Any]] = list(snap.session_notes)
     
     
     if not session_notes:
         return 
     
-    global_notes: List[Dict[str, Any]] = state.global_memory.get("notes", []) or []
+    global_notes: List[Dict[str, Any]] = list(snap.global_notes)
+    
+    merge = premerge_notes(global_notes, session_notes, signatures=state.global_signatures)
+    if not merge.unresolved:
+        _commit_consolidation(state, merge.global_notes, session_notes)
+        return
     
-    global_json = json.dumps(global_notes, ensure_ascii=False)
-    session_json = json.dumps(session_notes, ensure_ascii=False)
+    related, untouched = state.global_index.split(
+        merge.global_notes, (k for n in merge.unresolved for k in n.get("keywords") or [])
+    )
+    
+    resp = get_sync_client().responses.create(
+        model=CONSOLIDATION_MODEL,
+        input= _build_consolidation_prompt(related, merge.unresolved),
+        text=CONSOLIDATION_TEXT_FORMAT,
+    )
+    
+    try:
+        _apply_consolidation(state, related, untouched, merge.unresolved, session_notes, resp.output_text)
+    except ConsolidationOutputError as error:
+        ## this API has always returned None whatever the model said: keep the notes for next time
+        logger.warning("consolidation skipped, session notes kept: %s", error)
+
+
+async def consolidate_memory_async(
+    state: TravelState,
+    client: AsyncOpenAI | None = None,
+    timeout: float = CONSOLIDATION_TIMEOUT,
+    max_retries: int = CONSOLIDATION_MAX_RETRIES,
+) -> None:
+    """
+    Non-blocking `consolidate_memory` for asyncio services.
+
+    - Same merge rules and in-place mutation as `consolidate_memory`
+    - Runs under a process-wide semaphore, so a burst of ending sessions queues instead of stalling the loop
+    - Per-call `timeout` and `max_retries`; on failure (including unusable output) the error
+      propagates and session notes are kept
+    - Pass `client` (e.g. AsyncOpenAI(base_url=...)) to point at a local fake Responses endpoint
+    - At most one consolidation per user at a time (`state.guard.consolidation_lock`); runs of
+      the same user keep going meanwhile and see the result once it is committed
+    """
+    
+    async with state.guard.consolidation_lock:
+        snap = snapshot(state)
+        session_notes : List[Dict[str, Any]] = list(snap.session_notes)
+        
+        if not session_notes:
+            return 
+        
+        global_notes: List[Dict[str, Any]] = list(snap.global_notes)
+        
+        merge = premerge_notes(global_notes, session_notes, signatures=state.global_signatures)
+        if not merge.unresolved:
+            _commit_consolidation(state, merge.global_notes, session_notes)
+            return
+        
+        related, untouched = state.global_index.split(
+            merge.global_notes, (k for n in merge.unresolved for k in n.get("keywords") or [])
+        )
+        
+        prompt = _build_consolidation_prompt(related, merge.unresolved)
+        
+        api = (client or get_async_client()).with_options(timeout=timeout, max_retries=max_retries)
+        async with _consolidation_semaphore:
+            resp = await api.responses.create(model=CONSOLIDATION_MODEL, input=prompt, text=CONSOLIDATION_TEXT_FORMAT)
+        
+        _apply_consolidation(state, related, untouched, merge.unresolved, session_notes, resp.output_text)
+
+
+# ---Helpers---
+
+def _build_consolidation_prompt(global_notes: List[Dict[str, Any]], session_notes: List[Dict[str, Any]]) -> str:
+    global_json = json.dumps(global_notes, ensure_ascii=False, default=note_json_default)
+    session_json = json.dumps(session_notes, ensure_ascii=False, default=note_json_default)
     
     consolidation_prompt = f"""
     You are consolidating travel memory notes into LONG-TERM (GLOBAL) memory.
@@ -57,8 +158,8 @@ def consolidate_memory(state: TravelState)->None:
     6) Do NOT invent new facts. Only use what appears in the input notes.
 
     OUTPUT FORMAT (STRICT)
-    Return ONLY a valid JSON array.
-    Each element MUST be an object with EXACTLY these keys:
+    Return ONLY a valid JSON object: {{"notes": [...]}}.
+    Each element of "notes" MUST be an object with EXACTLY these keys:
     {{"text": string, "last_update_date": "YYYY-MM-DD", "keywords": [string]}}
 
     Do not include markdown, commentary, code fences, or extra keys.
@@ -74,24 +175,69 @@ def consolidate_memory(state: TravelState)->None:
     </SESSION_JSON>
     """.strip()
     
-    resp = client.responses.create(
-        model="gpt-5.2",
-        input= consolidation_prompt   
-    )
-    
-    consolidated_text = (resp.output_text or '').strip()
+    return consolidation_prompt
+
+
+def _apply_consolidation(
+    state: TravelState,
+    global_notes: List[Dict[str, Any]],
+    untouched: List[Dict[str, Any]],
+    session_notes: List[Dict[str, Any]],
+    consumed: List[Dict[str, Any]],
+    output_text: Optional[str],
+) -> None:
+    """Splice the model's consolidated list into global memory and drop the consumed session notes.
+
+    `global_notes` / `session_notes` are what was sent to the model, `untouched` the global notes
+    that were not; `consumed` is everything taken from session memory (including notes the local
+    merge already resolved).
+
+    Elements that do not fit the note shape are dropped one by one; if nothing usable is left,
+    nothing is committed and `ConsolidationOutputError` is raised."""
     
-    # print(f"Output from model : {consolidated_text}")
-    try:
-        consolidated_notes = json.loads(consolidated_text)
-        print(f"Output after json dumps: {consolidated_text}")
-        
-        if isinstance(consolidated_notes, list):
-            state.global_memory["notes"] = consolidated_notes
-        else :
-            state.global_memory["notes"] = global_notes + session_notes
-    except Exception as error:
-        state.global_memory["notes"] = global_notes + session_notes
+    ## notes whose date the model mangled get the newest date among the notes it was given
+    fallback_date = max((str(n.get("last_update_date") or "")[:10] for n in (*global_notes, *session_notes)), default="")
+    parsed = parse_consolidated_notes(output_text, fallback_date)
+    if not parsed.usable:
+        metrics.incr("consolidation_parse_failures")
+        raise ConsolidationOutputError(
+            f"no usable notes in consolidation output ({parsed.dropped} bad elements, {len(output_text or '')} chars)"
+        )
+    if parsed.dropped:
+        metrics.incr("consolidation_notes_dropped", parsed.dropped)
+    if parsed.repaired:
+        metrics.incr("consolidation_notes_repaired", parsed.repaired)
         
     ## Clear the session memory after consolidation 
-    state.session_memory["notes"] = []
\ No newline at end of file
+    _commit_consolidation(state, untouched + parsed.notes, consumed, matched=global_notes)
+
+
+def _commit_consolidation(
+    state: TravelState,
+    new_global: List[Dict[str, Any]],
+    consumed: List[Dict[str, Any]],
+    matched: List[Dict[str, Any]] = (),
+) -> None:
+    """Atomically swap in the new global notes and drop the consumed session notes,
+    keeping anything saved while the model call was in flight.
+
+    `matched` are the global notes that were sent to the model; their use is counted here,
+    once the output proved usable, so a failed or retried consolidation does not boost them.
+    Global memory is capped here (see `memory_budget`): past the cap, the lowest-value notes
+    are evicted, and handed to the configured archive if there is one."""
+    ## before `enforce`: this round's matches count toward eviction, and counters of notes the
+    ## model rewrote away are dropped along with them
+    state.global_usage.record(matched, "matched")
+    new_global, evicted = state.global_usage.enforce(new_global)
+    if evicted:
+        metrics.incr("global_notes_evicted", len(evicted))
+        archive = state.global_usage.config.archive
+        if archive is not None:
+            archive(str(state.profile.get("global_customer_id", "")), evicted)
+    consumed_ids = {id(n) for n in consumed}
+    commit(
+        state,
+        global_notes=new_global,
+        session_notes=lambda current: [n for n in current if id(n) not in consumed_ids],
+    )
+    state.global_index.sync(state.global_memory["notes"])
\ No newline at end of file
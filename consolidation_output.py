@@ -0,0 +1,165 @@
+from __future__ import annotations
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+## Structured output for the consolidation call: the Responses API wants an object at the top level
+NOTE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "text": {"type": "string"},
+        "last_update_date": {"type": "string", "description": "YYYY-MM-DD"},
+        "keywords": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["text", "last_update_date", "keywords"],
+    "additionalProperties": False,
+}
+CONSOLIDATION_TEXT_FORMAT: Dict[str, Any] = {
+    "format": {
+        "type": "json_schema",
+        "name": "consolidated_notes",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"notes": {"type": "array", "items": NOTE_SCHEMA}},
+            "required": ["notes"],
+            "additionalProperties": False,
+        },
+    }
+}
+
+_decoder = json.JSONDecoder()
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_WS = " \t\r\n"
+
+
+class ConsolidationOutputError(ValueError):
+    """The model's consolidation output held no usable notes (global memory is left as it was)."""
+
+
+@dataclass
+class ParsedNotes:
+    notes: List[Dict[str, Any]] = field(default_factory=list)
+    found: bool = False  ## a notes array was located (even if some elements were bad)
+    dropped: int = 0  ## elements that could not be salvaged
+    repaired: int = 0  ## elements kept after fixing their shape (bad date, stray keys, ...)
+
+    @property
+    def usable(self) -> bool:
+        ## an empty array is a valid answer (everything dropped as ephemeral); only-bad elements are not
+        return self.found and (bool(self.notes) or not self.dropped)
+
+
+def validate_note(obj: Any, fallback_date: str = "") -> Tuple[Optional[Dict[str, Any]], bool]:
+    """Coerce one element to the `MemoryNote` shape: (note or None if it has no usable text, repaired).
+
+    The note has exactly text / last_update_date / keywords. A missing or malformed date becomes
+    `fallback_date`; keywords may come as a string or a list (non-strings dropped).
+    """
+    if not isinstance(obj, dict):
+        return None, False
+    text = obj.get("text")
+    if not isinstance(text, str) or not text.strip():
+        return None, False
+    repaired = set(obj) != {"text", "last_update_date", "keywords"}
+
+    raw_date = obj.get("last_update_date")
+    match = _DATE.match(raw_date) if isinstance(raw_date, str) else None
+    try:
+        note_date = date.fromisoformat(match.group()).isoformat() if match else ""
+    except ValueError:
+        note_date = ""
+    if not note_date:
+        note_date, repaired = fallback_date, True
+    elif note_date != raw_date:
+        repaired = True
+
+    keywords = obj.get("keywords")
+    if isinstance(keywords, str):
+        keywords, repaired = [keywords], True
+    elif not isinstance(keywords, list):
+        keywords, repaired = [], True
+    clean = [k.strip() for k in keywords if isinstance(k, str) and k.strip()]
+    if len(clean) != len(keywords):
+        repaired = True
+
+    return {"text": text.strip(), "last_update_date": note_date, "keywords": clean}, repaired
+
+
+def _array_start(text: str) -> int:
+    """Index of the '[' opening the notes array (bare array or {"notes": [...]}), or -1."""
+    bracket = text.find("[")
+    brace = text.find("{")
+    if brace != -1 and (bracket == -1 or brace < bracket):
+        key = text.find('"notes"', brace)
+        if key != -1:
+            return text.find("[", key)
+    return bracket
+
+
+def _elements(obj: Any) -> Optional[List[Any]]:
+    if isinstance(obj, list):
+        return obj
+    if isinstance(obj, dict):
+        if isinstance(obj.get("notes"), list):
+            return obj["notes"]
+        if "text" in obj:
+            return [obj]  ## a lone note instead of a list
+    return None
+
+
+def _salvage(text: str, start: int) -> List[Any]:
+    """Decode the array's elements one at a time, skipping any that do not parse."""
+    items: List[Any] = []
+    i, n = start + 1, len(text)
+    while i < n:
+        while i < n and (text[i] in _WS or text[i] == ","):
+            i += 1
+        if i >= n or text[i] == "]":
+            break
+        try:
+            obj, i = _decoder.raw_decode(text, i)
+            items.append(obj)
+        except json.JSONDecodeError:
+            items.append(None)  ## counted as dropped
+            nxt = text.find("{", i + 1)  ## notes hold no nested objects: next '{' starts the next element
+            if nxt == -1:
+                break
+            i = nxt
+    return items
+
+
+def parse_consolidated_notes(output_text: Optional[str], fallback_date: str = "") -> ParsedNotes:
+    """Parse the consolidation output into validated notes, salvaging what it can.
+
+    Accepts a bare JSON array or the structured-output object {"notes": [...]}, wrapped in code
+    fences or followed by commentary. The whole array is decoded in one C-level pass when it is
+    valid; otherwise elements are decoded one by one and the broken ones skipped.
+    """
+    text = output_text or ""
+    result = ParsedNotes()
+    start = _array_start(text)
+    if start == -1:
+        return result
+
+    brace = text.find("{")
+    try:
+        ## the wrapping object if there is one, else the array; trailing text is ignored
+        first = brace if brace != -1 and brace < start else start
+        elements = _elements(_decoder.raw_decode(text, first)[0])
+    except json.JSONDecodeError:
+        elements = None
+    if elements is None:
+        elements = _salvage(text, start)
+    result.found = True
+
+    for obj in elements:
+        note, repaired = validate_note(obj, fallback_date)
+        if note is None:
+            result.dropped += 1
+            continue
+        result.repaired += repaired
+        result.notes.append(note)
+    return result
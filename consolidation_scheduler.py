@@ -0,0 +1,292 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from consolidate_memory import consolidate_memory_async
+from memory_state import TravelState
+from metrics import COUNT_BUCKETS, LATENCY_BUCKETS_MS, metrics
+
+## Defaults: consolidate once a user has this many session notes, or after this long without activity
+NOTE_THRESHOLD = 8
+IDLE_SECONDS = 300.0
+DEBOUNCE_SECONDS = 30.0  ## repeat triggers for a user within this window are dropped
+MAX_QUEUE = 1_000
+WORKERS = 4
+FINAL_ATTEMPTS = 3  ## a failed session-end consolidation is requeued (with backoff) up to this many times in all
+
+TRIGGER_THRESHOLD = "threshold"
+TRIGGER_IDLE = "idle"
+TRIGGER_SESSION_END = "session_end"
+
+
+@dataclass
+class _User:
+    state: TravelState
+    idle_deadline: float
+    last_enqueued: float = float("-inf")
+    queued: bool = False  ## in the queue or being consolidated
+    ending: bool = False  ## session ended: stop watching once consolidated
+    failures: int = 0  ## consecutive failed consolidations
+
+
+@dataclass
+class SchedulerStats:
+    enqueued: int = 0
+    debounced: int = 0
+    rejected: int = 0  ## refused by a full queue (backpressure)
+    completed: int = 0
+    failed: int = 0
+
+
+class ConsolidationScheduler:
+    """Consolidates session memory in the background, across every active user.
+
+    A user is queued when their session notes reach `note_threshold`, when they have been idle
+    for `idle_seconds`, or when their session ends. Triggers are debounced per user (and a user
+    is never queued twice), the queue is bounded (`max_queue`: threshold and idle triggers that
+    do not fit are deferred and retried, `end_session` waits for room), and `workers` tasks run
+    the jobs, so at most that many consolidations are in flight.
+
+    Idle deadlines live in a heap with lazy invalidation, so the monitor only looks at users
+    whose deadline passed, not at every watched user.
+
+    Queue depth, in-flight jobs and the age of the oldest queued job are exported as gauges,
+    and enqueue-to-start lag and job duration as histograms (see `metrics.py`).
+    """
+
+    def __init__(
+        self,
+        consolidate: Optional[Callable[[TravelState], Awaitable[None]]] = None,
+        note_threshold: int = NOTE_THRESHOLD,
+        idle_seconds: float = IDLE_SECONDS,
+        debounce_seconds: float = DEBOUNCE_SECONDS,
+        max_queue: int = MAX_QUEUE,
+        workers: int = WORKERS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.consolidate = consolidate or consolidate_memory_async
+        self.note_threshold = max(1, note_threshold)
+        self.idle_seconds = idle_seconds
+        self.debounce_seconds = debounce_seconds
+        self.workers = max(1, workers)
+        self.clock = clock
+        self._queue: asyncio.Queue[Tuple[str, str, float]] = asyncio.Queue(max(1, max_queue))
+        self._users: Dict[str, _User] = {}
+        self._idle_heap: List[Tuple[float, str]] = []  ## (idle deadline, customer_id); stale entries skipped
+        self._enqueue_times: Dict[str, float] = {}  ## customer_id -> when its queued job was enqueued
+        self._deferred: Dict[str, str] = {}  ## customer_id -> trigger refused by a full queue, retried by the monitor
+        self._in_flight = 0
+        self._workers: List[asyncio.Task] = []
+        self._tasks: List[asyncio.Task] = []  ## workers and the monitor
+        self.stats = SchedulerStats()
+
+    # --- triggers ---
+
+    def notify_activity(self, customer_id: str, state: TravelState) -> None:
+        """Call after each turn: watches the user, refreshes their idle deadline and checks the threshold."""
+        now = self.clock()
+        user = self._users.get(customer_id)
+        if user is None:
+            user = self._users[customer_id] = _User(state, now + self.idle_seconds)
+        else:
+            user.state = state
+        self._schedule_idle(customer_id, user, now + self.idle_seconds)
+
+        if len(state.session_memory.get("notes") or ()) >= self.note_threshold:
+            self._try_enqueue(customer_id, user, TRIGGER_THRESHOLD, now)
+
+    async def end_session(self, customer_id: str, state: Optional[TravelState] = None) -> None:
+        """Queue a final consolidation for the user (waits for queue room: backpressure on the caller)."""
+        now = self.clock()
+        user = self._users.get(customer_id)
+        if user is None:
+            if state is None:
+                return
+            user = self._users[customer_id] = _User(state, now + self.idle_seconds)
+        user.ending = True
+        if user.queued:
+            return
+        if not (user.state.session_memory.get("notes") or ()):
+            del self._users[customer_id]
+            return
+        user.queued = True
+        await self._queue.put((customer_id, TRIGGER_SESSION_END, now))
+        self._deferred.pop(customer_id, None)
+        self._enqueued(customer_id, user, TRIGGER_SESSION_END, now)
+
+    def _try_enqueue(self, customer_id: str, user: _User, trigger: str, now: float, debounce: bool = True) -> bool:
+        if user.queued:
+            return False
+        if debounce and now - user.last_enqueued < self.debounce_seconds:
+            self.stats.debounced += 1
+            metrics.incr("consolidation_debounced", labels={"trigger": trigger})
+            return False
+        try:
+            self._queue.put_nowait((customer_id, trigger, now))
+        except asyncio.QueueFull:
+            self._deferred[customer_id] = trigger
+            self.stats.rejected += 1
+            metrics.incr("consolidation_rejected", labels={"trigger": trigger})
+            return False
+        user.queued = True
+        self._deferred.pop(customer_id, None)
+        self._enqueued(customer_id, user, trigger, now)
+        return True
+
+    def _schedule_idle(self, customer_id: str, user: _User, deadline: float) -> None:
+        user.idle_deadline = deadline
+        heapq.heappush(self._idle_heap, (deadline, customer_id))
+
+    def _enqueued(self, customer_id: str, user: _User, trigger: str, now: float) -> None:
+        user.last_enqueued = now
+        self._enqueue_times[customer_id] = now
+        self.stats.enqueued += 1
+        metrics.incr("consolidation_enqueued", labels={"trigger": trigger})
+        self._report()
+
+    # --- background tasks ---
+
+    def start(self, poll_interval: float = 1.0) -> None:
+        """Start the worker pool and the idle monitor on the running loop."""
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks = self._workers + [loop.create_task(self._monitor(poll_interval))]
+
+    async def stop(self, drain: bool = True) -> None:
+        """Stop the background tasks, after finishing the queued jobs if `drain`."""
+        if drain:
+            await self.drain()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._workers = []
+        self._tasks = []
+
+    async def drain(self) -> None:
+        """Wait until every queued job has run (runs them here if no worker is running)."""
+        if not any(not task.done() for task in self._workers):
+            ## never started, or stopped: nobody else would ever take these
+            while not self._queue.empty():
+                await self._run_job(self._queue.get_nowait())
+        await self._queue.join()
+
+    async def _monitor(self, poll_interval: float) -> None:
+        while True:
+            await asyncio.sleep(poll_interval)
+            self.check_idle()
+
+    def check_idle(self) -> None:
+        """Queue users whose idle deadline passed (plus deferred ones, if there is room now)."""
+        now = self.clock()
+        heap = self._idle_heap
+        while heap and heap[0][0] <= now:
+            deadline, customer_id = heapq.heappop(heap)
+            user = self._users.get(customer_id)
+            if user is None or user.idle_deadline != deadline:
+                continue  ## stale: the user was active again (or is gone)
+            if user.queued:
+                continue  ## the worker schedules a fresh deadline when the job is done
+            if user.state.session_memory.get("notes"):
+                if not self._try_enqueue(customer_id, user, TRIGGER_IDLE, now) and customer_id not in self._deferred:
+                    ## debounced: look again once the window is over
+                    self._schedule_idle(customer_id, user, user.last_enqueued + self.debounce_seconds)
+            elif not user.ending:
+                del self._users[customer_id]  ## idle and nothing to consolidate: stop watching
+
+        ## deferred triggers already passed the debounce when they were refused
+        for customer_id, trigger in list(self._deferred.items()):
+            if self._queue.full():
+                break
+            user = self._users.get(customer_id)
+            if user is None or user.queued:
+                del self._deferred[customer_id]
+                continue
+            self._try_enqueue(customer_id, user, trigger, now, debounce=False)
+        self._report()
+
+    async def _worker(self) -> None:
+        while True:
+            await self._run_job(await self._queue.get())
+
+    async def _run_job(self, job: Tuple[str, str, float]) -> None:
+        """Consolidate one queued user; the caller took `job` off the queue."""
+        customer_id, trigger, enqueued_at = job
+        user = self._users.get(customer_id)
+        started = self.clock()
+        self._in_flight += 1
+        self._enqueue_times.pop(customer_id, None)
+        metrics.observe("consolidation_lag_ms", (started - enqueued_at) * 1e3, LATENCY_BUCKETS_MS)
+        self._report()
+        ok = False
+        before = {id(n) for n in user.state.session_memory.get("notes") or ()} if user is not None else set()
+        try:
+            if user is not None:
+                await self.consolidate(user.state)
+                user.failures = 0
+            ok = True
+            self.stats.completed += 1
+            metrics.incr("consolidation_completed", labels={"trigger": trigger})
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            ## notes are kept on failure; the next trigger retries
+            if user is not None:
+                user.failures += 1
+            self.stats.failed += 1
+            metrics.incr("consolidation_failed", labels={"trigger": trigger})
+        finally:
+            self._in_flight -= 1
+            metrics.observe("consolidation_duration_ms", (self.clock() - started) * 1e3, LATENCY_BUCKETS_MS)
+            if user is not None:
+                now = self.clock()
+                user.queued = False
+                user.last_enqueued = now  ## debounce from completion, too
+                if user.ending:
+                    arrived = [n for n in user.state.session_memory.get("notes") or () if id(n) not in before]
+                    if ok and arrived:
+                        ## notes saved while the final consolidation ran
+                        self._try_enqueue(customer_id, user, TRIGGER_SESSION_END, now, debounce=False)
+                    elif not ok and user.failures < FINAL_ATTEMPTS:
+                        ## requeued by the monitor once the backoff is over (notes are still there)
+                        self._schedule_idle(customer_id, user, now + self.debounce_seconds * 2 ** (user.failures - 1))
+                    elif self._users.get(customer_id) is user:
+                        del self._users[customer_id]
+                else:
+                    ## consolidated again later if notes pile up while idle, else dropped by the monitor
+                    self._schedule_idle(customer_id, user, now + self.idle_seconds)
+            self._queue.task_done()
+            self._report()
+
+    # --- introspection ---
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def watched(self) -> int:
+        return len(self._users)
+
+    def oldest_lag(self) -> float:
+        """Seconds the oldest queued (not yet started) job has been waiting."""
+        if not self._enqueue_times:
+            return 0.0
+        ## one queued job per user and a FIFO queue: insertion order is queue order
+        return self.clock() - next(iter(self._enqueue_times.values()))
+
+    def _report(self) -> None:
+        if not metrics.enabled:
+            return
+        metrics.set_gauge("consolidation_queue_depth", self._queue.qsize())
+        metrics.set_gauge("consolidation_in_flight", self._in_flight)
+        metrics.set_gauge("consolidation_oldest_lag_seconds", self.oldest_lag())
+        metrics.observe("consolidation_queue_depth_samples", self._queue.qsize(), COUNT_BUCKETS)
@@ -1,10 +1,15 @@
 from __future__ import annotations
 import asyncio
+import json
 from collections import deque
-from typing import Any, Deque, List, Dict, cast
+from itertools import islice
+from typing import Any, Awaitable, Callable, Deque, List, Dict, cast
 from agents.memory.session import SessionABC
 from agents.items import TResponseInputItem
 from memory_state import TravelState, user_state
+from item_compaction import ItemCompactor
+from metrics import COUNT_BUCKETS, metrics
+from session_summary import Summarizer, summary_item
 
 ROLE_USER = "user"
 
@@ -25,24 +30,92 @@ def _is_user_msg(item:TResponseInputItem) -> bool:
     return getattr(item, "role", None) == ROLE_USER
 
 
+def estimate_bytes(item: TResponseInputItem) -> int:
+    """Size of the item as compact UTF-8 JSON."""
+    return len(json.dumps(item, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+def estimate_tokens(item: TResponseInputItem) -> int:
+    """Cheap token estimate (~4 bytes per token); good enough for budgeting, no tokenizer needed."""
+    return (estimate_bytes(item) + 3) // 4
+
+
 class TrimmingSession(SessionABC):
     """Keep only the last N "User turn" in memory.
     
-    A Turn = a user message and all subsequent items (assistant/ tool call / results) up to (but not including) the next user message."""
+    A Turn = a user message and all subsequent items (assistant/ tool call / results) up to (but not including) the next user message.
+
+    The session keeps a running index of turn boundaries (absolute positions of user messages),
+    so trimming only pops whole turns off the left of the log instead of rescanning it.
+
+    Optionally `max_tokens` adds a budget: the newest whole turns that fit under it are kept
+    (the latest turn is always kept). Each item is estimated once, with `token_estimator`, when
+    it is added; pass `estimate_bytes` to budget in bytes instead of tokens.
+
+    Optionally a `summarizer` (see `session_summary`) turns eviction into compaction: evicted
+    items are folded into one running summary, served as the first item of `get_items`. The
+    summary is updated incrementally in a background task (only newly evicted items are sent),
+    and trimming never waits for it; a turn served before its summary update lands is simply
+    missing from the summary for that one read. The summary is not counted against `max_tokens`.
+
+    Optionally a `compactor` (see `item_compaction`) shrinks bulky tool outputs once their turn
+    is no longer the latest: each is replaced by a stub (size, preview, ref) and the full
+    payload moves to the compactor's store. The turn limit is unchanged; size and token
+    accounting (and so a token budget) count the stubs. Each item is looked at once.
+
+    For `session_registry`: with `track_bytes` the session keeps a running byte size (`nbytes`)
+    and reports every change to `on_resize(session, delta)`; `spill` hands the log to a store
+    and empties the session, and the next call that needs the log loads it back first."""
     
-    def __init__(self, session_id: str, state: TravelState, max_turns: int=8) -> None:
+    def __init__(
+        self,
+        session_id: str,
+        state: TravelState,
+        max_turns: int=8,
+        max_tokens: int | None = None,
+        token_estimator: Callable[[TResponseInputItem], int] = estimate_tokens,
+        summarizer: Summarizer | None = None,
+        track_bytes: bool = False,
+        compactor: ItemCompactor | None = None,
+    ) -> None:
         super().__init__()
         self.session_id = session_id
         self.state = state
         self.max_turns  = max(1,max_turns)
+        self.max_tokens = max_tokens
+        self.token_estimator = token_estimator
         self._items : Deque[TResponseInputItem] = deque()  ## Chronological log
+        self._item_tokens: Deque[int] = deque()  ## Token estimate per item, parallel to self._items
+        self._turn_starts: Deque[int] = deque()  ## Absolute positions of user messages in the log
+        self._turn_tokens: Deque[int] = deque()  ## Running token total per turn, parallel to self._turn_starts
+        self._head_tokens = 0  ## Tokens of items before the first user message
+        self._total_tokens = 0
+        self._offset = 0  ## Absolute position of self._items[0]
         self._lock = asyncio.Lock()
+        self.summarizer = summarizer
+        self._summary = ""  ## Running summary of everything evicted so far
+        self._to_summarize: List[TResponseInputItem] = []  ## Evicted, not yet folded into the summary
+        self._summary_task: asyncio.Task | None = None
+        self.track_bytes = track_bytes
+        self._item_bytes: Deque[int] = deque()  ## Byte size per item (0s unless track_bytes), parallel to self._items
+        self._bytes = 0
+        self.on_resize: Callable[["TrimmingSession", int], None] | None = None
+        self._spilled: Callable[[], Awaitable[Dict[str, Any]]] | None = None  ## Loads the log back while spilled
+        self.compactor = compactor
+        self._compact_from = 0  ## Absolute position of the first item not yet looked at by the compactor
         
     async def get_items(self, limit: int | None = None) -> List[TResponseInputItem]:
         """Return history trimmed to the last N user turns (Optionally limited to most-recent `limit` items)."""
         async with self._lock:
-            trimmed = self._trim_to_last_turns(list(self._items))
-            return trimmed[-limit:] if (limit is not None and limit>=0) else trimmed
+            await self._ensure_loaded()
+            # The log is trimmed on every write, so it can be served as-is.
+            if limit is None or limit <= 0 or limit >= len(self._items):
+                if self._summary:
+                    return [summary_item(self._summary), *self._items]
+                return list(self._items)
+            tail = list(islice(reversed(self._items), limit))
+            tail.reverse()
+            return tail
         
     async def add_items(self, items: List[TResponseInputItem]) -> None:
         """Append new items, then trim to last N user turns."""
@@ -50,67 +123,320 @@ class TrimmingSession(SessionABC):
         if not items:
             return 
         
+        sizes, costs = self._estimate(items)
+        
         async with self._lock:
-            self._items.extend(items)
-            
-            original_len = len(self._items)
-            trimmed = self._trim_to_last_turns(list(self._items))
+            await self._ensure_loaded()
+            before = self.nbytes
+            for item, cost, size in zip(items, costs, sizes):
+                self._append(item, cost, size)
             
-            if len(trimmed) < original_len:
+            evicted = self._trim()
+            if evicted:
                 # Flag for triggering session injection after context trimming
                 self.state.inject_session_memories_next_turn = True
-            self._items.clear()
-            self._items.extend(trimmed)
+                if metrics.enabled:
+                    metrics.incr("session_trim_events")
+                    metrics.observe("session_trimmed_items", evicted, COUNT_BUCKETS)
+                self._schedule_summary()
+            if self.compactor is not None:
+                self._compact_previous_turns()
+            self._resized(before)
             
     async def pop_item(self) -> TResponseInputItem | None:
         """Remove and return the most recent item (post-trim)."""
         
         async with self._lock:
-            return self._items.pop() if self._items else None
+            await self._ensure_loaded()
+            if not self._items:
+                return None
+            
+            before = self.nbytes
+            self._bytes -= self._item_bytes.pop()
+            cost = self._item_tokens.pop()
+            self._total_tokens -= cost
+            if self._turn_starts:
+                self._turn_tokens[-1] -= cost
+                if self._turn_starts[-1] == self._offset + len(self._items) - 1:
+                    self._turn_starts.pop()
+                    self._turn_tokens.pop()
+            else:
+                self._head_tokens -= cost
+            item = self._items.pop()
+            if self.compactor is not None:
+                self.compactor.release(item)
+            self._compact_from = min(self._compact_from, self._offset + len(self._items))
+            self._resized(before)
+            return item
         
     async def clear_session(self) -> None:
         """Remove all items for this session."""
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+            self._summary_task = None
+        async with self._lock:
+            await self._ensure_loaded()  ## lets the store drop its copy too
+            before = self.nbytes
+            if self.compactor is not None:
+                for item in self._items:
+                    self.compactor.release(item)
+            self._to_summarize.clear()
+            self._reset()
+            self._resized(before)
+            
+    async def spill(self, store: Callable[[Dict[str, Any]], Awaitable[Callable[[], Awaitable[Dict[str, Any]]]]]) -> int:
+        """Hand the log and summary to `store` and empty the session; returns the bytes freed (0 if not spilled).
+
+        `store(data)` persists `data` and returns the loader that the next read or write awaits to
+        get it back. A session with summary work in flight is not spilled (try again later).
+        """
         async with self._lock:
-            self._items.clear()
+            if self._spilled is not None:
+                return 0
+            if self._to_summarize or (self._summary_task is not None and not self._summary_task.done()):
+                return 0
+            data = {"items": list(self._items), "summary": self._summary}
+            self._spilled = await store(data)
+            before = self.nbytes
+            self._reset()
+            self._resized(before)
+            return before
+
+    def set_spilled(self, load: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        """Start out spilled (a fresh session for a log spilled earlier): the first call that needs the log awaits `load()`."""
+        self._spilled = load
+
+    @property
+    def spilled(self) -> bool:
+        return self._spilled is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate size of the retained log and summary (log items count only with `track_bytes`)."""
+        return self._bytes + len(self._summary)
             
             
     #### lets define the helper function
     # ---Helpers---
     
-    def _trim_to_last_turns(self, items: List[TResponseInputItem]) -> List[TResponseInputItem]:
-        """
-        Keep only the suffix containing the last 'max_turns' user messages and everything afetr the earliest of those user messages.
-        if there are fewer than 'max_tuns' user messages (or none), keep all itmes.
-        """
+    def _estimate(self, items: List[TResponseInputItem]) -> tuple[List[int], List[int]]:
+        """(byte sizes, token costs) of new items; each is only paid for when it is used."""
+        sizes = [estimate_bytes(item) for item in items] if self.track_bytes else [0] * len(items)
+        # Token estimates are only needed when a token budget is set.
+        if self.max_tokens is None:
+            costs = [0] * len(items)
+        elif self.track_bytes and self.token_estimator is estimate_tokens:
+            costs = [(size + 3) // 4 for size in sizes]
+        else:
+            costs = [self.token_estimator(item) for item in items]
+        return sizes, costs
+
+    def _reset(self) -> None:
+        self._summary = ""
+        self._items.clear()
+        self._item_tokens.clear()
+        self._item_bytes.clear()
+        self._turn_starts.clear()
+        self._turn_tokens.clear()
+        self._head_tokens = 0
+        self._total_tokens = 0
+        self._bytes = 0
+        self._offset = 0
+        self._compact_from = 0
+
+    def _resized(self, before: int) -> None:
+        if self.on_resize is not None:
+            self.on_resize(self, self.nbytes - before)
+
+    async def _ensure_loaded(self) -> None:
+        """Bring a spilled log back (caller holds the lock). A log that can't be read is lost: the session starts empty."""
+        load, self._spilled = self._spilled, None
+        if load is None:
+            return
+        try:
+            data = await load()
+        except Exception:
+            metrics.incr("session_restore_failures")
+            data = {}
+        items = data.get("items") or []
+        sizes, costs = self._estimate(items)
+        for item, cost, size in zip(items, costs, sizes):
+            self._append(item, cost, size)
+        self._summary = data.get("summary") or ""
+        self._resized(0)
+
+    def _compact_previous_turns(self) -> None:
+        """Compact the items before the latest turn that the compactor hasn't seen yet (after trimming, so evicted turns are skipped)."""
+        if not self._turn_starts:
+            return
+        start = max(self._compact_from, self._offset)
+        end = self._turn_starts[-1]
+        self._compact_from = max(self._compact_from, end)
+        turn = -1  ## index into self._turn_starts of the turn holding `pos` (-1: the items before the first user message)
+        for pos in range(start, end):
+            i = pos - self._offset
+            stub = self.compactor.compact(self._items[i])
+            if stub is None:
+                continue
+            self._items[i] = stub
+            metrics.incr("session_items_compacted")
+            if self.track_bytes:
+                size = estimate_bytes(stub)
+                self._bytes += size - self._item_bytes[i]
+                self._item_bytes[i] = size
+            if self.max_tokens is not None:
+                cost = self.token_estimator(stub)
+                delta = cost - self._item_tokens[i]
+                self._item_tokens[i] = cost
+                self._total_tokens += delta
+                while turn + 1 < len(self._turn_starts) and self._turn_starts[turn + 1] <= pos:
+                    turn += 1
+                if turn >= 0:
+                    self._turn_tokens[turn] += delta
+                else:
+                    self._head_tokens += delta
+
+    def _append(self, item: TResponseInputItem, cost: int, size: int = 0) -> None:
+        """Append one item to the log, recording it as a turn boundary if it is a user message."""
+        if _is_user_msg(item):
+            self._turn_starts.append(self._offset + len(self._items))
+            self._turn_tokens.append(cost)
+        elif self._turn_tokens:
+            self._turn_tokens[-1] += cost
+        else:
+            self._head_tokens += cost
+        self._items.append(item)
+        self._item_tokens.append(cost)
+        self._item_bytes.append(size)
+        self._total_tokens += cost
+        self._bytes += size
+    
+    def _schedule_summary(self) -> None:
+        """Start the background summary worker unless it is already running (it drains whatever is pending)."""
+        if not self._to_summarize:
+            return
+        if self._summary_task is None or self._summary_task.done():
+            self._summary_task = asyncio.get_running_loop().create_task(self._summarize_pending())
+
+    async def _summarize_pending(self) -> None:
+        while self._to_summarize:
+            batch, self._to_summarize = self._to_summarize, []
+            before = self.nbytes
+            try:
+                self._summary = await self.summarizer(self._summary, batch)
+            except Exception:
+                ## the batch is lost to the summary, but the session keeps working
+                metrics.incr("session_summary_failures")
+            self._resized(before)
+
+    def _estimate_retained(self) -> None:
+        """One-off estimate of the retained log, for when a token budget is switched on."""
+        self._item_tokens = deque(self.token_estimator(item) for item in self._items)
+        starts = set(self._turn_starts)
+        turn_tokens: List[int] = []
+        self._head_tokens = 0
+        for pos, cost in enumerate(self._item_tokens, start=self._offset):
+            if pos in starts:
+                turn_tokens.append(cost)
+            elif turn_tokens:
+                turn_tokens[-1] += cost
+            else:
+                self._head_tokens += cost
+        self._turn_tokens = deque(turn_tokens)
+        self._total_tokens = sum(self._item_tokens)
+    
+    def _evict_oldest(self) -> int:
+        """Drop the leftmost unit of the log: the items before the first user message if any, else the oldest turn."""
+        if self._turn_starts and self._offset == self._turn_starts[0]:
+            self._turn_starts.popleft()
+            self._total_tokens -= self._turn_tokens.popleft()
+        else:
+            self._total_tokens -= self._head_tokens
+            self._head_tokens = 0
         
-        if not items:
-            return items
+        end = self._turn_starts[0] if self._turn_starts else self._offset + len(self._items)
+        evicted = end - self._offset
+        for _ in range(evicted):
+            item = self._items.popleft()
+            if self.compactor is not None:
+                self.compactor.release(item)
+            self._item_tokens.popleft()
+            self._bytes -= self._item_bytes.popleft()
+            if self.summarizer is not None:
+                self._to_summarize.append(item)
+        self._offset = end
+        return evicted
+    
+    def _trim(self) -> int:
+        """Apply the turn limit, then the token budget. Returns the number of evicted items."""
+        evicted = self._trim_to_last_turns()
         
-        count = 0 
-        start_idx = 0 #### default : keep all if we never reach max_turns
+        if self.max_tokens is not None:
+            # Never evict the latest turn, even if it alone is over budget.
+            while self._total_tokens > self.max_tokens and self._turn_starts and self._offset < self._turn_starts[-1]:
+                evicted += self._evict_oldest()
+        return evicted
+    
+    def _trim_to_last_turns(self) -> int:
+        """
+        Drop whole turns from the left until only the last 'max_turns' user turns remain.
+        if there are fewer than 'max_turns' user messages (or none), keep all items.
+
+        Returns the number of evicted items.
+        """
         
-        # walk backward; when we hit the Nth user message, mark its index.
+        if len(self._turn_starts) < self.max_turns:
+            return 0
         
-        for i in range(len(items)-1, -1, -1):
-            if _is_user_msg(items[i]):
-                count += 1
-                if count == self.max_turns:
-                    start_idx = i
-                    break
-                
-        return items[start_idx:]
+        # The earliest user message we keep; everything before it goes.
+        start = self._turn_starts[-self.max_turns]
+        evicted = 0
+        while self._offset < start:
+            evicted += self._evict_oldest()
+        return evicted
     
     
     #### --- optional convenience api ---
     
     async def set_max_turns(self, max_turns:int)->None:
         async with self._lock:
+            await self._ensure_loaded()
+            before = self.nbytes
             self.max_turns = max(1, max_turns)
-            trimmed = self._trim_to_last_turns(list(self._items))
-            self._items.clear()
-            self._items.extend(trimmed)
+            if self._trim_to_last_turns():
+                self._schedule_summary()
+            self._resized(before)
+
+    async def set_max_tokens(self, max_tokens: int | None) -> None:
+        async with self._lock:
+            await self._ensure_loaded()
+            before = self.nbytes
+            if self.max_tokens is None and max_tokens is not None:
+                self._estimate_retained()
+            self.max_tokens = max_tokens
+            if self._trim():
+                self._schedule_summary()
+            self._resized(before)
+
+    async def total_tokens(self) -> int:
+        """Token estimate of the retained history."""
+        async with self._lock:
+            await self._ensure_loaded()
+            return self._total_tokens
+
+    @property
+    def summary(self) -> str:
+        """Running summary of the evicted turns ("" without a summarizer or before the first eviction)."""
+        return self._summary
+
+    async def wait_for_summary(self) -> str:
+        """Wait until every evicted item so far is in the summary (for tests and shutdown)."""
+        while self._summary_task is not None and not self._summary_task.done():
+            await asyncio.shield(self._summary_task)
+        return self._summary
 
     async def raw_items(self) -> List[TResponseInputItem]:
         """Return The untrimmed in-memory log(for debugging)."""
         async with self._lock:
+            await self._ensure_loaded()
             return list(self._items)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from agents import function_tool
+from agents.items import TResponseInputItem
+
+PAYLOAD_STORE_MAX_BYTES = 64 * 2**20
+COMPACT_MIN_BYTES = 2048  ## tool outputs smaller than this stay as they are
+PREVIEW_CHARS = 200
+STUB_PREFIX = "[compacted tool output: "
+_STUB_REF = re.compile(re.escape(STUB_PREFIX) + r"\d+ chars, ref ([0-9a-f]+)\]")
+
+
+@dataclass
+class PayloadStoreStats:
+    stored: int = 0
+    deduped: int = 0  ## puts of a payload that was already stored
+    released: int = 0  ## dropped when the last stub pointing at them left its session
+    evicted: int = 0  ## dropped by the size bound while still referenced
+    hits: int = 0
+    misses: int = 0
+
+
+class PayloadStore:
+    """Full tool payloads behind compacted stubs, keyed by content digest (identical payloads are stored once).
+
+    Payloads are reference counted: each `put` is one stub, and `release` (called when the stub
+    is trimmed off its session) drops the payload with its last stub. On top of that the store
+    is bounded by `max_bytes`: the least recently used payloads are dropped, and a fetch of one
+    of those finds nothing. Counts are kept apart from residency, so a payload put again after
+    such a drop is still released only with its last stub. Thread-safe (function tools run on
+    worker threads).
+    """
+
+    def __init__(self, max_bytes: int = PAYLOAD_STORE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._payloads: OrderedDict[str, str] = OrderedDict()
+        self._refs: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = PayloadStoreStats()
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    @staticmethod
+    def digest(payload: str) -> str:
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+    def put(self, payload: str) -> str:
+        ref = self.digest(payload)
+        with self._lock:
+            self._refs[ref] = self._refs.get(ref, 0) + 1
+            if ref in self._payloads:
+                self._payloads.move_to_end(ref)
+                self.stats.deduped += 1
+                return ref
+            self._payloads[ref] = payload
+            self._bytes += len(payload)
+            self.stats.stored += 1
+            while self._bytes > self.max_bytes and len(self._payloads) > 1:
+                ## evicted payloads keep their reference count: their stubs are still out there
+                _, dropped = self._payloads.popitem(last=False)
+                self._bytes -= len(dropped)
+                self.stats.evicted += 1
+        return ref
+
+    def release(self, ref: str) -> None:
+        with self._lock:
+            count = self._refs.get(ref)
+            if count is None:
+                return
+            if count > 1:
+                self._refs[ref] = count - 1
+                return
+            del self._refs[ref]
+            payload = self._payloads.pop(ref, None)
+            if payload is not None:
+                self._bytes -= len(payload)
+                self.stats.released += 1
+
+    def get(self, ref: str) -> Optional[str]:
+        with self._lock:
+            payload = self._payloads.get(ref)
+            if payload is None:
+                self.stats.misses += 1
+                return None
+            self._payloads.move_to_end(ref)
+            self.stats.hits += 1
+            return payload
+
+
+## Process-wide default store, shared by every ItemCompactor unless one is given
+payloads = PayloadStore()
+
+
+class ItemCompactor:
+    """Turns a bulky tool output item into a stub: same item (type, call_id, ...), with `output`
+    replaced by its size, a short preview and a ref into `store`.
+
+    Only `*_call_output` items whose output is at least `min_bytes` are compacted; a stub is
+    small, so compacting one again is a no-op; `release` hands back a stub's payload reference
+    when the session drops it. Give the agent `fetch_tool_output` so the model
+    can ask for the full output when the preview isn't enough (it reads the default store).
+    """
+
+    def __init__(
+        self,
+        store: Optional[PayloadStore] = None,
+        min_bytes: int = COMPACT_MIN_BYTES,
+        preview_chars: int = PREVIEW_CHARS,
+    ) -> None:
+        self.store = store if store is not None else payloads
+        self.min_bytes = min_bytes
+        self.preview_chars = preview_chars
+
+    def compact(self, item: TResponseInputItem) -> Optional[TResponseInputItem]:
+        """The stub for `item`, or None to keep it as is."""
+        if not isinstance(item, dict) or not str(item.get("type", "")).endswith("_call_output"):
+            return None
+        output = item.get("output")
+        if output is None:
+            return None
+        payload = output if isinstance(output, str) else json.dumps(output, ensure_ascii=False, default=str)
+        if len(payload) < self.min_bytes:
+            return None
+        ref = self.store.put(payload)
+        preview = " ".join(payload[: self.preview_chars].split())
+        stub: Dict[str, Any] = dict(item)
+        stub["output"] = (
+            f"{STUB_PREFIX}{len(payload)} chars, ref {ref}] {preview}...\n"
+            f"(call fetch_tool_output with ref {ref} for the full output)"
+        )
+        return stub
+
+    def release(self, item: TResponseInputItem) -> None:
+        """Call for every item leaving the session: drops the payload reference if it is a stub."""
+        if isinstance(item, dict):
+            output = item.get("output")
+            if isinstance(output, str) and output.startswith(STUB_PREFIX):
+                match = _STUB_REF.match(output)
+                if match:
+                    self.store.release(match.group(1))
+
+
+@function_tool
+def fetch_tool_output(ref: str) -> str:
+    """
+    Return the full text of an earlier tool output that was compacted in the conversation history.
+
+    Use this only when the preview shown in the history is not enough to answer.
+
+    Args:
+        ref: The ref shown in the compacted output (e.g. "3f9a0c1d2e4b5a67").
+    """
+    payload = payloads.get(ref.strip())
+    if payload is None:
+        return "That output is no longer available; run the original tool again if you need it."
+    return payload
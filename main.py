@@ -1,16 +1,11 @@
-import time 
 import asyncio 
-import nest_asyncio
 from agents import Agent, Runner, set_tracing_disabled
-from openai import OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
 set_tracing_disabled(True)
 
-client = OpenAI()
-
 async def main():
     agent = Agent(
         name= "Assistant",
@@ -0,0 +1,243 @@
+from __future__ import annotations
+import heapq
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from memory_merge import normalize_text
+
+Note = Dict[str, Any]
+## (customer_id, evicted notes) -> None; cold storage for notes pushed out of global memory
+Archive = Callable[[str, List[Note]], None]
+
+## Deployment defaults (overridable with GLOBAL_MEMORY_CAP / GLOBAL_MEMORY_HALF_LIFE_DAYS)
+GLOBAL_MEMORY_CAP = 500
+HALF_LIFE_DAYS = 90.0
+## value added by each kind of use; a write (note created or refreshed) counts most
+UPDATE_WEIGHT = 4.0
+MATCH_WEIGHT = 2.0  ## shared a keyword with notes being consolidated
+INJECT_WEIGHT = 1.0  ## rendered into the system prompt
+## the eviction heap is rebuilt once stale entries make up more than half of it (plus some slack)
+HEAP_SLACK = 64
+
+
+@dataclass
+class MemoryBudget:
+    cap: int = GLOBAL_MEMORY_CAP
+    half_life_days: float = HALF_LIFE_DAYS
+    update_weight: float = UPDATE_WEIGHT
+    match_weight: float = MATCH_WEIGHT
+    inject_weight: float = INJECT_WEIGHT
+    archive: Optional[Archive] = None  ## None: evicted notes are dropped
+
+    @classmethod
+    def from_env(cls) -> "MemoryBudget":
+        return cls(
+            cap=int(os.getenv("GLOBAL_MEMORY_CAP", GLOBAL_MEMORY_CAP)),
+            half_life_days=float(os.getenv("GLOBAL_MEMORY_HALF_LIFE_DAYS", HALF_LIFE_DAYS)),
+        )
+
+
+## Process-wide default, used by every TravelState's NoteUsage unless one is given
+budget = MemoryBudget.from_env()
+
+
+def configure_memory_budget(**changes: Any) -> MemoryBudget:
+    """e.g. configure_memory_budget(cap=200, archive=JsonLinesArchive("evicted.jsonl"))"""
+    for name, value in changes.items():
+        if not hasattr(budget, name):
+            raise TypeError(f"unknown memory budget setting: {name}")
+        setattr(budget, name, value)
+    return budget
+
+
+class JsonLinesArchive:
+    """Cold storage: appends evicted notes to a JSON-lines file, one line per note."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def __call__(self, customer_id: str, notes: List[Note]) -> None:
+        lines = "".join(
+            json.dumps({"customer_id": customer_id, **dict(n)}, ensure_ascii=False) + "\n" for n in notes
+        )
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def _day(value: Any) -> int:
+    try:
+        return date.fromisoformat(str(value or "")[:10]).toordinal()
+    except ValueError:
+        return 0
+
+
+def _logadd2(a: float, b: float) -> float:
+    """log2(2**a + 2**b) without overflow."""
+    if a < b:
+        a, b = b, a
+    return a + math.log2(1.0 + 2.0 ** (b - a)) if b != -math.inf else a
+
+
+class _Usage:
+    __slots__ = ("injected", "matched", "score", "last_update")
+
+    def __init__(self, injected: int = 0, matched: int = 0, score: float = -math.inf, last_update: int = 0) -> None:
+        self.injected = injected
+        self.matched = matched
+        self.score = score  ## log2 of the sum of weight * 2**(day / half_life) over all uses
+        self.last_update = last_update  ## ordinal of the newest last_update_date seen
+
+
+class NoteUsage:
+    """Usage counters and a recency-decayed value per global note, with a min-heap for eviction.
+
+    Every use (write, keyword match, prompt injection) adds `weight * 2**-(age / half_life)`
+    to a note's value. The value is stored as log2(sum of weight * 2**(day / half_life)), which
+    orders notes the same way at any later day, so the decay never has to be re-applied and a
+    use is one O(log n) heap push. Stale heap entries are skipped lazily, as in the scheduler,
+    and the heap is rebuilt once they outnumber the live ones.
+
+    Notes are keyed by normalized text, so the counters survive consolidation rewriting the
+    note dicts (and a reworded note starts over). `enforce` keeps global memory at `cap`.
+    """
+
+    def __init__(self, config: Optional[MemoryBudget] = None) -> None:
+        self._config = config
+        self._usage: Dict[str, _Usage] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._keys: Dict[int, Tuple[Note, str]] = {}  ## id(note) -> (note, key); holding the note keeps the id stable
+        self._lock = threading.Lock()  ## hooks record on the loop, consolidation may commit from a thread
+
+    @property
+    def config(self) -> MemoryBudget:
+        return self._config or budget
+
+    def __len__(self) -> int:
+        return len(self._usage)
+
+    def _key(self, note: Note) -> str:
+        cached = self._keys.get(id(note))
+        if cached is not None and cached[0] is note:
+            return cached[1]
+        key = normalize_text(note.get("text", ""))
+        self._keys[id(note)] = (note, key)
+        return key
+
+    def _bump(self, key: str, usage: _Usage, weight: float, day: int) -> None:
+        usage.score = _logadd2(usage.score, math.log2(weight) + day / self.config.half_life_days)
+        heapq.heappush(self._heap, (usage.score, key))
+
+    def _compact_heap(self) -> None:
+        """Drop stale heap entries once they are the majority (caller holds the lock); amortized O(1) per push."""
+        if len(self._heap) > 2 * len(self._usage) + HEAP_SLACK:
+            self._heap = [(u.score, k) for k, u in self._usage.items()]
+            heapq.heapify(self._heap)
+
+    def _track(self, note: Note, key: str) -> _Usage:
+        usage = self._usage.get(key)
+        updated = _day(note.get("last_update_date"))
+        if usage is None:
+            usage = self._usage[key] = _Usage()
+            if not updated:
+                ## undated: one write at day 0, so it is on the heap (and goes first)
+                self._bump(key, usage, self.config.update_weight, 0)
+        if updated > usage.last_update:
+            ## created or refreshed since we last looked: counts as a write on that day
+            usage.last_update = updated
+            self._bump(key, usage, self.config.update_weight, updated)
+        return usage
+
+    def record(self, notes: Iterable[Note], kind: str, today: Optional[date] = None) -> None:
+        """Count one use ("injected" or "matched") of each note."""
+        config = self.config
+        weight = config.inject_weight if kind == "injected" else config.match_weight
+        day = (today or date.today()).toordinal()
+        with self._lock:
+            for note in notes:
+                key = self._key(note)
+                usage = self._track(note, key)
+                if kind == "injected":
+                    usage.injected += 1
+                else:
+                    usage.matched += 1
+                self._bump(key, usage, weight, day)
+            self._compact_heap()
+
+    def value(self, note: Note, today: Optional[date] = None) -> float:
+        """Current decayed value of a note (0.0 if it was never seen)."""
+        usage = self._usage.get(self._key(note))
+        if usage is None or usage.score == -math.inf:
+            return 0.0
+        day = (today or date.today()).toordinal()
+        return 2.0 ** (usage.score - day / self.config.half_life_days)
+
+    def stats(self, note: Note) -> Dict[str, int]:
+        usage = self._usage.get(self._key(note))
+        return {"injected": usage.injected, "matched": usage.matched} if usage else {"injected": 0, "matched": 0}
+
+    def enforce(self, notes: List[Note], cap: Optional[int] = None) -> Tuple[List[Note], List[Note]]:
+        """Split `notes` into (kept, evicted) so at most `cap` remain, evicting the lowest-value first.
+
+        Also brings the counters in line with `notes`: new or refreshed notes are tracked,
+        counters of notes that are gone are dropped. Order of the kept notes is preserved.
+        """
+        cap = self.config.cap if cap is None else cap
+        with self._lock:
+            by_key: Dict[str, List[Note]] = {}
+            for note in notes:
+                key = self._key(note)
+                self._track(note, key)
+                by_key.setdefault(key, []).append(note)
+            for key in [k for k in self._usage if k not in by_key]:
+                del self._usage[key]
+            live = {id(n) for n in notes}
+            for nid in [i for i in self._keys if i not in live]:
+                del self._keys[nid]
+
+            evicted: List[Note] = []
+            excess = len(notes) - max(0, cap)
+            heap = self._heap
+            while excess > 0 and heap:
+                score, key = heapq.heappop(heap)
+                usage = self._usage.get(key)
+                if usage is None or usage.score != score or key not in by_key:
+                    continue  ## stale: used again since, or already gone
+                group = by_key.pop(key)
+                del self._usage[key]
+                evicted.extend(group)
+                excess -= len(group)
+
+            self._compact_heap()
+
+        if not evicted:
+            return notes, []
+        gone = {id(n) for n in evicted}
+        for nid in gone:
+            self._keys.pop(nid, None)
+        return [n for n in notes if id(n) not in gone], evicted
+
+    def to_dict(self) -> Dict[str, List[float]]:
+        with self._lock:
+            return {k: [u.injected, u.matched, u.score, u.last_update] for k, u in self._usage.items()}
+
+    def load(self, data: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for key, (injected, matched, score, last_update) in data.items():
+                self._usage[key] = _Usage(int(injected), int(matched), float(score), int(last_update))
+            self._heap = [(u.score, k) for k, u in self._usage.items()]
+            heapq.heapify(self._heap)
+
+    def __getstate__(self) -> dict:
+        ## the lock and the identity cache are process-local
+        return {"config": self._config, "usage": self.to_dict()}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state.get("config"))
+        self.load(state.get("usage") or {})
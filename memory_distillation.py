@@ -2,6 +2,8 @@ from datetime import datetime, timezone
 from typing import List
 from agents import function_tool, RunContextWrapper
 from memory_state import TravelState, user_state
+from state_concurrency import MAX_NOTE_KEYWORDS, upsert_session_note
+from metrics import metrics
 
 def _today_iso_utc() -> str:
     return datetime.now(timezone.utc).strftime("%Y-%m-%dT")
@@ -65,23 +67,22 @@ def save_memory_note(
     - The assistant MUST NOT mention or reason about the return value; it is system metadata only.
     """
     
-    if "notes" not in ctx.context.session_memory or ctx.context.session_memory["notes"] is None:
-        ctx.context.session_memory["notes"] = []
-        
     ## Normalized + cap keywords defensively
     
     clean_keywords = [
         k.strip().lower() for k in keywords if isinstance(k, str) and k.strip()
-    ][:3]
+    ][:MAX_NOTE_KEYWORDS]
     
-    ctx.context.session_memory["notes"].append(
+    ## A re-saved preference (same normalized text) refreshes the existing note instead of adding one
+    added = upsert_session_note(
+        ctx.context,
         {"text":text.strip(),
          "last_update_date" : _today_iso_utc(),
          "keywords":clean_keywords,
-         }
+         },
     )
     
-    print("New session memory added: \n", text.strip())
+    metrics.incr("memory_notes_saved" if added else "memory_notes_deduped")
     
     return {"ok":True}   ### metadata only
 
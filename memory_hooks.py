@@ -2,20 +2,48 @@ from agents import AgentHooks, Agent, RunContextWrapper, RunConfig
 from memory_distillation import TravelState, user_state
 from context_management import TrimmingSession
 from agents.items import TResponseInputItem
+from memory_retrieval import NoteRetriever
+from state_concurrency import snapshot
+from context_management import estimate_tokens
+from metrics import COUNT_BUCKETS, SIZE_BUCKETS, metrics
+from trip_store import render_trip_summary_md
+import json
+import time
 import yaml
-from typing import Optional
+from typing import Any, Dict, Optional
 
 def render_frontmatter(profile:dict) -> str:
     playload = {"profile": profile}
     y = yaml.safe_dump(playload, sort_keys=False).strip()
     return f"---\n{y}\n---"
 
-def render_global_memories_md(global_notes: list[dict], k:int = 6) -> str:
+def profile_key(profile: dict) -> str:
+    """Content key for the profile; far cheaper than re-running yaml.safe_dump to find out nothing changed."""
+    return json.dumps(profile, sort_keys=True, default=str)
+
+def select_global_notes(
+    global_notes: list[dict],
+    k:int = 6,
+    query: Optional[str] = None,
+    retriever: Optional[NoteRetriever] = None,
+) -> list[dict]:
+    """Top-k global notes: most relevant to `query` (recency-blended) when a retriever is given, else most recent."""
     if not global_notes:
-        return "- {None}"
-    
+        return []
+    if query and retriever is not None:
+        return retriever.top_k(global_notes, query, k=k)
     notes_sorted = sorted(global_notes, key=lambda n: n.get("last_update_date", ""), reverse=True)
-    top = notes_sorted[:k]
+    return notes_sorted[:k]
+
+def render_global_memories_md(
+    global_notes: list[dict],
+    k:int = 6,
+    query: Optional[str] = None,
+    retriever: Optional[NoteRetriever] = None,
+) -> str:
+    top = select_global_notes(global_notes, k, query, retriever)
+    if not top:
+        return "- {None}"
     return "\n".join([f"- {n["text"]}" for n in top])
 
 def render_session_memories_md(session_notes: list[dict], k:int = 8) -> str:
@@ -27,16 +55,66 @@ def render_session_memories_md(session_notes: list[dict], k:int = 8) -> str:
     return "\n".join(f"- {n['text']}" for n in top)
 
 
+def latest_user_text(items: list[TResponseInputItem] | None) -> str:
+    """Text of the most recent user message in `items` ("" if there is none)."""
+    for item in reversed(items or []):
+        if isinstance(item, dict) and item.get("role") == "user":
+            content = item.get("content")
+            if isinstance(content, str):
+                return content
+            if isinstance(content, list):
+                return " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+    return ""
+
+
 
 class MemoryHooks(AgentHooks[TravelState]):
+    """Renders memory into the state before each run, and records per-run metrics.
+
+    Metrics (see `metrics.py`) are only gathered for sampled runs, and only while metrics
+    are enabled; otherwise every hook returns after one attribute check.
+    """
+    
     # def __init__(self, client: client) -> None:
     #     self.client = client
     
+    def __init__(self) -> None:
+        ## start timestamps of sampled, in-flight runs / LLM calls / tool calls, keyed by id(TravelState)
+        ## (runs of one user are serialized by its run lock, so the state identifies the run)
+        self._runs: Dict[int, float] = {}
+        self._llm: Dict[int, float] = {}
+        self._tools: Dict[tuple, float] = {}
+    
     async def on_start(self, ctx: RunContextWrapper[TravelState], agent:Agent) -> None:
-        ctx.context.system_frontmatter = render_frontmatter(ctx.context.profile)
-        ctx.context.global_memories_md = render_global_memories_md((ctx.context.global_memory or {}).get("notes", []))
+        sampled = metrics.sample()
+        if sampled:
+            self._runs[id(ctx.context)] = time.perf_counter()
+        elif self._runs:
+            self._runs.pop(id(ctx.context), None)  ## left over from a run that raised
+        
+        ## Render from an immutable snapshot: a consolidation committing mid-render can't tear it
+        snap = snapshot(ctx.context)
+        profile = dict(snap.profile)
+        ctx.context.system_frontmatter = ctx.context.prompt_builder.section(
+            "frontmatter", profile_key(profile), lambda: render_frontmatter(profile)
+        )
+        top = select_global_notes(
+            snap.global_notes,
+            query=latest_user_text(getattr(ctx, "turn_input", None)),
+            retriever=ctx.context.global_retriever,
+        )
+        ctx.context.global_memories_md = "\n".join(f"- {n['text']}" for n in top) if top else "- {None}"
+        ## injected notes gain value; the lowest-value ones are evicted once global memory is full
+        ctx.context.global_usage.record(top, "injected")
+
+        ## aggregates are maintained incrementally; re-rendered only when a trip was added or removed
+        store = ctx.context.trip_store
+        store.sync(ctx.context.trip_history.get("trips") or [])
+        ctx.context.trip_summary_md = ctx.context.prompt_builder.section(
+            "trip_summary", store.version, lambda: render_trip_summary_md(store)
+        )
 
-        session_notes = (ctx.context.session_memory or {}).get("notes", [])
+        session_notes = snap.session_notes
         
         if session_notes:
             ctx.context.session_memories_md = render_session_memories_md(
@@ -45,6 +123,16 @@ class MemoryHooks(AgentHooks[TravelState]):
 
         if ctx.context.inject_session_memories_next_turn:
             ctx.context.inject_session_memories_next_turn = False
+        
+        if sampled:
+            ## mirrors the k defaults of the two renderers
+            metrics.observe("global_notes_injected", len(top), COUNT_BUCKETS)
+            metrics.observe("session_notes_injected", min(8, len(session_notes)), COUNT_BUCKETS)
+            
+    async def on_end(self, ctx: RunContextWrapper[TravelState], agent: Agent, output: Any) -> None:
+        started = self._runs.pop(id(ctx.context), None)
+        if started is not None:
+            metrics.observe("run_latency_ms", (time.perf_counter() - started) * 1e3)
             
     async def on_llm_start(
         self,
@@ -54,5 +142,35 @@ class MemoryHooks(AgentHooks[TravelState]):
         input_items: list[TResponseInputItem],
     ) -> None:
         """Called immediately before the agent issues an LLM call."""
-        print(f"\n\n System Prompt: \n {system_prompt}")
-        # pass
\ No newline at end of file
+        key = id(context.context)
+        if key not in self._runs:
+            return
+        prompt = system_prompt or ""
+        metrics.observe("system_prompt_chars", len(prompt), SIZE_BUCKETS)
+        metrics.observe("system_prompt_tokens_est", estimate_tokens(prompt), SIZE_BUCKETS)
+        metrics.observe("llm_input_items", len(input_items), COUNT_BUCKETS)
+        self._llm[key] = time.perf_counter()
+    
+    async def on_llm_end(self, context: RunContextWrapper, agent: Agent, response: Any) -> None:
+        started = self._llm.pop(id(context.context), None)
+        if started is None:
+            return
+        metrics.observe("llm_latency_ms", (time.perf_counter() - started) * 1e3)
+        usage = getattr(response, "usage", None)
+        if usage is not None and usage.input_tokens:
+            metrics.observe("llm_input_tokens", usage.input_tokens, SIZE_BUCKETS)
+            metrics.observe("llm_output_tokens", usage.output_tokens, SIZE_BUCKETS)
+    
+    async def on_tool_start(self, context: RunContextWrapper, agent: Agent, tool: Any) -> None:
+        if id(context.context) in self._runs:
+            self._tools[self._tool_key(context, tool)] = time.perf_counter()
+    
+    async def on_tool_end(self, context: RunContextWrapper, agent: Agent, tool: Any, result: Any) -> None:
+        started = self._tools.pop(self._tool_key(context, tool), None) if self._tools else None
+        if started is not None:
+            metrics.observe("tool_duration_ms", (time.perf_counter() - started) * 1e3, labels={"tool": tool.name})
+    
+    @staticmethod
+    def _tool_key(context: RunContextWrapper, tool: Any) -> tuple:
+        ## function tools get a ToolContext carrying the call id; parallel calls of one tool stay apart
+        return (id(context.context), getattr(context, "tool_call_id", None) or tool.name)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from memory_merge import band_keys, jaccard, normalize_text, signature
+
+Signature = Tuple[str, Set[str], Tuple[int, ...]]  ## see memory_merge.signature
+
+Note = Dict[str, Any]
+
+
+class KeywordIndex:
+    """Inverted index keyword -> global notes, kept in step with `global_memory["notes"]`.
+
+    Notes are plain dicts without ids, so they are tracked by identity. `sync` only indexes
+    notes it has not seen and drops the ones that disappeared; unchanged notes cost nothing
+    beyond an id lookup, and the common case (same list, same length) is O(1).
+    Keywords edited in place on an already indexed note are not picked up.
+    """
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        self._notes: Dict[int, Note] = {}  ## id(note) -> note (holding the ref keeps the id stable)
+        self._source: List[Note] | None = None
+        self._source_len = 0
+
+    def __len__(self) -> int:
+        return len(self._notes)
+
+    def add(self, note: Note) -> None:
+        key = id(note)
+        if key in self._notes:
+            return
+        self._notes[key] = note
+        for kw in _keywords(note):
+            self._postings[kw].add(key)
+
+    def remove(self, note: Note) -> None:
+        key = id(note)
+        if self._notes.pop(key, None) is None:
+            return
+        for kw in _keywords(note):
+            ids = self._postings.get(kw)
+            if ids is not None:
+                ids.discard(key)
+                if not ids:
+                    del self._postings[kw]
+
+    def sync(self, notes: List[Note]) -> None:
+        """Bring the index in line with `notes` (the current global notes list)."""
+        if notes is self._source and len(notes) == self._source_len:
+            return
+
+        if notes is self._source and len(notes) > self._source_len:
+            ## append-only growth: index the tail
+            for note in notes[self._source_len:]:
+                self.add(note)
+        else:
+            live = {id(n) for n in notes}
+            for key in [k for k in self._notes if k not in live]:
+                self.remove(self._notes[key])
+            for note in notes:
+                self.add(note)
+
+        self._source = notes
+        self._source_len = len(notes)
+
+    def related_ids(self, keywords: Iterable[str]) -> Set[int]:
+        """Ids of indexed notes sharing at least one keyword."""
+        out: Set[int] = set()
+        for kw in keywords:
+            ids = self._postings.get(_clean(kw))
+            if ids:
+                out |= ids
+        return out
+
+    def split(self, notes: List[Note], keywords: Iterable[str]) -> tuple[List[Note], List[Note]]:
+        """Partition `notes` into (related, untouched) by keyword overlap, keeping order."""
+        self.sync(notes)
+        wanted = self.related_ids(keywords)
+        if not wanted:
+            return [], list(notes)
+        related, untouched = [], []
+        for note in notes:
+            (related if id(note) in wanted else untouched).append(note)
+        return related, untouched
+
+
+class TextIndex:
+    """Normalized text -> note, for write-time dedup of session notes.
+
+    Same identity-based `sync` contract as `KeywordIndex`. Writers that replace the notes list
+    themselves (copy-on-write) call `adopt` with the new list and the notes they changed, so
+    the next `sync` stays O(1) instead of re-normalizing every note.
+    """
+
+    def __init__(self) -> None:
+        self._by_text: Dict[str, Note] = {}
+        self._source: List[Note] | None = None
+        self._source_len = 0
+
+    def __len__(self) -> int:
+        return len(self._by_text)
+
+    @staticmethod
+    def key(text: str) -> str:
+        return normalize_text(text or "")
+
+    def get(self, text: str) -> Optional[Note]:
+        return self._by_text.get(self.key(text))
+
+    def sync(self, notes: List[Note]) -> None:
+        if notes is self._source and len(notes) == self._source_len:
+            return
+        if notes is self._source and len(notes) > self._source_len:
+            changed = notes[self._source_len:]
+        else:
+            self._by_text.clear()
+            changed = notes
+        for note in changed:
+            ## a later note with the same text wins, like it would on render
+            self._by_text[self.key(note.get("text", ""))] = note
+        self._source = notes
+        self._source_len = len(notes)
+
+    def adopt(self, notes: List[Note], changed: Iterable[Note]) -> None:
+        """`notes` is the new list; only `changed` (added or replaced) notes differ from the indexed one."""
+        for note in changed:
+            self._by_text[self.key(note.get("text", ""))] = note
+        self._source = notes
+        self._source_len = len(notes)
+
+
+class SignatureIndex:
+    """MinHash signatures, exact-text map and LSH buckets over global notes, for `memory_merge.premerge_notes`.
+
+    Same identity-based `sync` contract as `KeywordIndex`, so a consolidation signs only the
+    notes that appeared since the last one instead of every global note. A note whose text
+    was edited in place is re-signed on the next full sync.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[int, tuple] = {}  ## id(note) -> (note, text, signature); holding the note keeps the id stable
+        self._exact: Dict[str, List[int]] = defaultdict(list)  ## normalized text -> ids, oldest first
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = defaultdict(set)
+        self._source: List[Note] | None = None
+        self._source_len = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, note: Note, sign: Optional[Signature] = None) -> None:
+        key = id(note)
+        text = note.get("text", "")
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] == text:
+                return
+            self.remove(note)
+        if sign is None:
+            sign = signature(text)
+        self._entries[key] = (note, text, sign)
+        self._exact[sign[0]].append(key)
+        for band in band_keys(sign[2]):
+            self._buckets[band].add(key)
+
+    def remove(self, note: Note) -> None:
+        entry = self._entries.pop(id(note), None)
+        if entry is None:
+            return
+        key, (norm, _, sig) = id(note), entry[2]
+        ids = self._exact[norm]
+        ids.remove(key)
+        if not ids:
+            del self._exact[norm]
+        for band in band_keys(sig):
+            ids = self._buckets.get(band)
+            if ids is not None:
+                ids.discard(key)
+                if not ids:
+                    del self._buckets[band]
+
+    def sync(self, notes: List[Note]) -> None:
+        """Bring the index in line with `notes` (the current global notes list)."""
+        if notes is self._source and len(notes) == self._source_len:
+            return
+        if notes is self._source and len(notes) > self._source_len:
+            for note in notes[self._source_len:]:
+                self.add(note)
+        else:
+            live = {id(n) for n in notes}
+            for key in [k for k in self._entries if k not in live]:
+                self.remove(self._entries[key][0])
+            for note in notes:
+                self.add(note)
+        self._source = notes
+        self._source_len = len(notes)
+
+    def find(self, sign: Signature, threshold: float) -> Optional[Note]:
+        """The indexed note with the same normalized text, else the most similar one at or above `threshold`."""
+        norm, sh, sig = sign
+        ids = self._exact.get(norm)
+        if ids:
+            return self._entries[ids[0]][0]
+        best, match = 0.0, None
+        seen: Set[int] = set()
+        for band in band_keys(sig):
+            for key in self._buckets.get(band, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                note, _, (_, other, _) = self._entries[key]
+                score = jaccard(sh, other)
+                if score >= threshold and score > best:
+                    best, match = score, note
+        return match
+
+
+def _clean(keyword: Any) -> str:
+    return keyword.strip().lower() if isinstance(keyword, str) else ""
+
+
+def _keywords(note: Note) -> Set[str]:
+    return {k for k in map(_clean, note.get("keywords") or []) if k}
@@ -0,0 +1,170 @@
+from __future__ import annotations
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from memory_index import SignatureIndex
+
+## Phrases that mark a note as trip/session scoped (mirrors rule 2 of the consolidation prompt)
+EPHEMERAL_PATTERNS = re.compile(
+    r"\b(this time|this trip|for this booking|right now|today|tonight|tomorrow)\b",
+    re.IGNORECASE,
+)
+
+## Filler words that do not change the meaning of a preference note
+_STOPWORDS = frozenset({
+    "a", "an", "the", "user", "users", "i", "my", "me", "is", "are", "to", "of", "for", "and",
+    "usually", "generally", "typically", "normally", "always", "likes", "like", "prefers", "prefer",
+})
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+NUM_PERM = 64
+BANDS = 16  ## 16 bands x 4 rows: candidates from ~0.5 Jaccard upwards
+NEAR_DUP_THRESHOLD = 0.8
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+
+
+def _perm_params(n: int) -> List[Tuple[int, int]]:
+    """Deterministic (a, b) pairs for the MinHash permutations."""
+    params = []
+    x = 0x9E3779B97F4A7C15
+    for _ in range(n):
+        x = (x * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+        a = (x >> 3) % (_PRIME - 1) + 1
+        x = (x * 6364136223846793005 + 1442695040888963407) & ((1 << 64) - 1)
+        b = (x >> 3) % _PRIME
+        params.append((a, b))
+    return params
+
+
+_PERMS = _perm_params(NUM_PERM)
+
+
+## Words ending in "s" that are not plurals (the suffix rule below would mangle them)
+_NOT_PLURAL = frozenset({
+    "does", "goes", "news", "series", "species", "perhaps", "whereas", "besides", "sometimes", "ours", "yours",
+})
+
+
+def _singular(word: str) -> str:
+    """Conservative plural -> singular ("seats" -> "seat", "aisles" -> "aisle"); leaves "status", "class", "does"."""
+    if len(word) <= 3 or not word.endswith("s") or word.endswith(("ss", "us", "is")) or word in _NOT_PLURAL:
+        return word
+    return word[:-1]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and filler words, and singularize plain plurals."""
+    return " ".join(_singular(w) for w in _WORD.findall(text.lower()) if w not in _STOPWORDS)
+
+
+def shingles(normalized: str) -> Set[str]:
+    """Word unigrams + bigrams of a normalized note."""
+    words = normalized.split()
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def minhash(shingle_set: Iterable[str]) -> Tuple[int, ...]:
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingle_set]
+    if not hashes:
+        return tuple([_MASK] * NUM_PERM)
+    return tuple(min(((a * h + b) % _PRIME) & _MASK for h in hashes) for a, b in _PERMS)
+
+
+def signature(text: str) -> Tuple[str, Set[str], Tuple[int, ...]]:
+    """(normalized text, shingles, MinHash signature) of a note text."""
+    norm = normalize_text(text)
+    sh = shingles(norm)
+    return norm, sh, minhash(sh)
+
+
+def band_keys(sig: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    """LSH bucket keys of a signature, one per band."""
+    rows = NUM_PERM // BANDS
+    return [(band, sig[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def is_ephemeral(note: Dict[str, Any]) -> bool:
+    return bool(EPHEMERAL_PATTERNS.search(note.get("text", "")))
+
+
+def _iso_date(date: str) -> str:
+    ## session notes carry "YYYY-MM-DDT"; global memory uses plain YYYY-MM-DD
+    return (date or "")[:10]
+
+
+@dataclass
+class MergeResult:
+    global_notes: List[Dict[str, Any]]  ## global notes with matched ones refreshed
+    unresolved: List[Dict[str, Any]] = field(default_factory=list)  ## session notes the LLM still has to place
+    matched: int = 0
+    dropped_ephemeral: int = 0
+
+
+def premerge_notes(
+    global_notes: List[Dict[str, Any]],
+    session_notes: List[Dict[str, Any]],
+    threshold: float = NEAR_DUP_THRESHOLD,
+    signatures: Optional[SignatureIndex] = None,
+) -> MergeResult:
+    """
+    Deterministic merge pass that runs before the consolidation LLM call.
+
+    - Drops ephemeral ("this trip / this time") session notes by rule
+    - Exact duplicates (after normalization) and near-duplicates (MinHash LSH candidates,
+      confirmed by shingle Jaccard >= threshold) refresh the matched global note's
+      last_update_date instead of being sent to the model
+    - Everything else is returned as `unresolved`
+    Input lists are not mutated; refreshed notes are copies.
+
+    Pass the user's `signatures` index (kept across calls) so only global notes that are new
+    since the last call get signed; without it every global note is signed here.
+    """
+    from memory_index import SignatureIndex  ## memory_index builds on this module
+
+    if signatures is None:
+        signatures = SignatureIndex()
+    signatures.sync(global_notes)
+    staged = SignatureIndex()  ## unresolved session notes: later ones can dedupe against them too
+    merged = list(global_notes)
+    positions: Dict[int, int] = {}
+
+    result = MergeResult(global_notes=merged)
+    for note in session_notes:
+        if is_ephemeral(note):
+            result.dropped_ephemeral += 1
+            continue
+
+        sign = signature(note.get("text", ""))
+        match = signatures.find(sign, threshold)
+        if match is None:
+            if staged.find(sign, threshold) is None:
+                result.unresolved.append(note)
+                staged.add(note, sign)
+            else:
+                ## duplicate of an earlier unresolved session note; that one already goes to the model
+                result.matched += 1
+            continue
+
+        result.matched += 1
+        if not positions:
+            positions = {id(n): i for i, n in enumerate(global_notes)}
+        i = positions[id(match)]
+        target = dict(merged[i])
+        date = _iso_date(note.get("last_update_date", ""))
+        if date > target.get("last_update_date", ""):
+            target["last_update_date"] = date
+        merged[i] = target
+
+    return result
@@ -0,0 +1,193 @@
+from __future__ import annotations
+import math
+import zlib
+from array import array
+from datetime import date
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from memory_merge import normalize_text
+from note_store import CompactNote
+
+Note = Dict[str, Any]
+
+HASH_BITS = 20  ## hashed vocabulary of 2^20 terms
+KEYWORD_WEIGHT = 2.0  ## a keyword hit counts more than a word hit
+RECENCY_WEIGHT = 0.3  ## share of the final score that comes from recency
+HALF_LIFE_DAYS = 180.0
+
+
+def _term_id(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8")) & ((1 << HASH_BITS) - 1)
+
+
+def _note_terms(text: str, keywords: Iterable[str]) -> Dict[int, float]:
+    """Hashed term -> weight for a note (or a query)."""
+    terms: Dict[int, float] = {}
+    for word in normalize_text(text).split():
+        terms[_term_id(word)] = 1.0
+    for kw in keywords:
+        if isinstance(kw, str) and kw.strip():
+            terms[_term_id("kw:" + kw.strip().lower())] = KEYWORD_WEIGHT
+            ## "seat_preference" should also hit a query that says "seat"
+            for part in kw.strip().lower().replace("-", "_").split("_"):
+                if part:
+                    terms.setdefault(_term_id(part), 1.0)
+    return terms
+
+
+def _date_ordinal(value: str) -> int:
+    try:
+        return date.fromisoformat((value or "")[:10]).toordinal()
+    except ValueError:
+        return 0
+
+
+class NoteRetriever:
+    """Query-relevant top-k over global notes.
+
+    Keeps a hashed term matrix in column form (term -> rows holding it, plus per-row weights)
+    next to NumPy columns for dates and liveness. Notes are appended incrementally and
+    removals are tombstoned (compacted once half the rows are dead), so a query is a handful
+    of vectorized gathers over the postings of its terms plus one recency blend and one
+    argpartition.
+    """
+
+    def __init__(self, recency_weight: float = RECENCY_WEIGHT, half_life_days: float = HALF_LIFE_DAYS) -> None:
+        self.recency_weight = recency_weight
+        self.half_life_days = half_life_days
+        self._reset()
+
+    def _reset(self) -> None:
+        self._n = 0
+        self._live = 0
+        self._notes: List[Note | None] = []
+        self._rows: Dict[int, int] = {}  ## id(note) -> row
+        self._postings: Dict[int, array] = {}  ## term -> rows (int32)
+        self._weights: Dict[int, array] = {}  ## term -> length-normalized weight per posting (float32)
+        self._date_ord = np.zeros(0, dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._recency_cache: tuple[int, int, np.ndarray] | None = None
+        self._source: List[Note] | None = None
+        self._source_len = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    # --- maintenance ---
+
+    def _grow(self, need: int) -> None:
+        cap = len(self._alive)
+        if need <= cap:
+            return
+        new_cap = max(need, cap * 2, 64)
+        for name in ("_date_ord", "_alive"):
+            old = getattr(self, name)
+            col = np.zeros(new_cap, dtype=old.dtype)
+            col[:cap] = old
+            setattr(self, name, col)
+
+    def add(self, note: Note) -> None:
+        key = id(note)
+        if key in self._rows:
+            return
+        row = self._n
+        self._grow(row + 1)
+        terms = _note_terms(note.get("text", ""), note.get("keywords") or [])
+        inv_norm = 1.0 / math.sqrt(sum(w * w for w in terms.values())) if terms else 0.0
+        for term, weight in terms.items():
+            if term not in self._postings:
+                self._postings[term] = array("i")
+                self._weights[term] = array("f")
+            self._postings[term].append(row)
+            self._weights[term].append(weight * inv_norm)
+        self._date_ord[row] = (
+            note.date_ordinal if isinstance(note, CompactNote) else _date_ordinal(note.get("last_update_date", ""))
+        )
+        self._alive[row] = True
+        self._notes.append(note)
+        self._rows[key] = row
+        self._n += 1
+        self._live += 1
+        self._recency_cache = None
+
+    def remove(self, note: Note) -> None:
+        row = self._rows.pop(id(note), None)
+        if row is None:
+            return
+        self._alive[row] = False
+        self._notes[row] = None
+        self._live -= 1
+        self._recency_cache = None
+        if self._n > 64 and self._live < self._n // 2:
+            live = [n for n in self._notes if n is not None]
+            source, source_len = self._source, self._source_len
+            self._reset()
+            for n in live:
+                self.add(n)
+            self._source, self._source_len = source, source_len
+
+    def sync(self, notes: List[Note]) -> None:
+        """Bring the matrix in line with `notes` (same identity-based contract as `KeywordIndex.sync`)."""
+        if notes is self._source and len(notes) == self._source_len:
+            return
+        if notes is self._source and len(notes) > self._source_len:
+            for note in notes[self._source_len:]:
+                self.add(note)
+        else:
+            live = {id(n) for n in notes}
+            for note in [n for n in self._notes if n is not None and id(n) not in live]:
+                self.remove(note)
+            for note in notes:
+                self.add(note)
+        self._source = notes
+        self._source_len = len(notes)
+
+    # --- query ---
+
+    def _recency(self, today: int) -> np.ndarray:
+        """Weighted recency per row (dead rows -inf); cached until the day or the rows change."""
+        cache = self._recency_cache
+        if cache is not None and cache[0] == today and cache[1] == self._n:
+            return cache[2]
+        age = np.maximum(today - self._date_ord[: self._n], 0).astype(np.float32)
+        rec = np.exp2(-age / np.float32(self.half_life_days)) * np.float32(self.recency_weight)
+        rec[~self._alive[: self._n]] = -np.inf
+        self._recency_cache = (today, self._n, rec)
+        return rec
+
+    def top_k(
+        self,
+        notes: List[Note],
+        query: str,
+        keywords: Iterable[str] = (),
+        k: int = 6,
+        today: date | None = None,
+    ) -> List[Note]:
+        """Return the `k` notes that best match `query` (+ `keywords`), blended with recency."""
+        self.sync(notes)
+        n = self._n
+        if not self._live or k <= 0:
+            return []
+
+        relevance = np.zeros(n, dtype=np.float32)
+        for term, q_weight in _note_terms(query, keywords).items():
+            rows = self._postings.get(term)
+            if not rows:
+                continue
+            idx = np.frombuffer(rows, dtype=np.int32)
+            idf = math.log(1.0 + self._live / len(rows))
+            relevance[idx] += np.frombuffer(self._weights[term], dtype=np.float32) * np.float32(q_weight * idf)
+
+        ## score = (1 - w) * relevance / max(relevance) + w * recency, built in place
+        peak = relevance.max()
+        if peak > 0:
+            relevance *= np.float32((1 - self.recency_weight) / peak)
+        score = relevance
+        score += self._recency((today or date.today()).toordinal())
+
+        k = min(k, self._live)
+        top = np.argpartition(score, n - k)[n - k:]
+        top = top[np.argsort(-score[top], kind="stable")]
+        return [self._notes[i] for i in top.tolist()]
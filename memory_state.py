@@ -1,5 +1,12 @@
 from dataclasses import dataclass, field
 from typing import Any, Dict, List 
+from memory_budget import NoteUsage
+from memory_index import KeywordIndex, SignatureIndex, TextIndex
+from memory_retrieval import NoteRetriever
+from prompt_builder import PromptBuilder
+from note_store import MemoryDict
+from state_concurrency import StateGuard
+from trip_store import TripStore
 
 @dataclass
 class MemoryNote:
@@ -12,10 +19,10 @@ class TravelState:
     profile: Dict[str, Any] = field(default_factory=dict)
     
     ## long-term memory
-    global_memory: Dict[str, Any] = field(default_factory=lambda: {"notes": []})
+    global_memory: Dict[str, Any] = field(default_factory=lambda: MemoryDict(notes=[]))
     
     ## short-term memory (staging for consolidation)
-    session_memory: Dict[str, Any] = field(default_factory=lambda: {"notes": []})
+    session_memory: Dict[str, Any] = field(default_factory=lambda: MemoryDict(notes=[]))
     
     # trip history (recent trips from db)
     trip_history: Dict[str, Any] = field(default_factory=lambda: {"trips": []})
@@ -24,9 +31,64 @@ class TravelState:
     system_frontmatter: str = ""
     global_memories_md: str = ""
     session_memories_md: str = ""
+    trip_summary_md: str = ""
 
     # Flag for triggering session injection after context trimming
     inject_session_memories_next_turn: bool = False
+
+    # keyword -> global note index, kept in step with global_memory["notes"]
+    global_index: KeywordIndex = field(default_factory=KeywordIndex, repr=False, compare=False)
+
+    # MinHash signatures of global notes, for the local merge before consolidation (see memory_merge)
+    global_signatures: SignatureIndex = field(default_factory=SignatureIndex, repr=False, compare=False)
+
+    # normalized text -> session note, for write-time dedup in save_memory_note
+    session_text_index: TextIndex = field(default_factory=TextIndex, repr=False, compare=False)
+
+    # per-note usage counters and decayed value; caps global memory at consolidation (see memory_budget)
+    global_usage: NoteUsage = field(default_factory=NoteUsage, repr=False, compare=False)
+
+    # hashed term matrix over global notes for query-relevant retrieval
+    global_retriever: NoteRetriever = field(default_factory=NoteRetriever, repr=False, compare=False)
+
+    # indexes + preference aggregates over trip_history["trips"]
+    trip_store: TripStore = field(default_factory=TripStore, repr=False, compare=False)
+
+    # memoized system prompt sections (see travel_agent.instructions)
+    prompt_builder: PromptBuilder = field(default_factory=PromptBuilder, repr=False, compare=False)
+
+    # per-user locks, version counter and copy-on-write snapshot (see state_concurrency)
+    guard: StateGuard = field(default_factory=StateGuard, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        ## notes are kept as compact slotted notes behind a dict-compatible view (see note_store)
+        if not isinstance(self.global_memory, MemoryDict):
+            self.global_memory = MemoryDict(self.global_memory)
+        if not isinstance(self.session_memory, MemoryDict):
+            self.session_memory = MemoryDict(self.session_memory)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Persistent part of the state as plain JSON-ready data (rendered strings and caches are rebuilt per run)."""
+        return {
+            "profile": self.profile,
+            "global_memory": {"notes": [dict(n) for n in self.global_memory.get("notes") or []]},
+            "session_memory": {"notes": [dict(n) for n in self.session_memory.get("notes") or []]},
+            "trip_history": self.trip_history,
+            "inject_session_memories_next_turn": self.inject_session_memories_next_turn,
+            "global_usage": self.global_usage.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TravelState":
+        state = cls(
+            profile=data.get("profile") or {},
+            global_memory=data.get("global_memory") or {"notes": []},
+            session_memory=data.get("session_memory") or {"notes": []},
+            trip_history=data.get("trip_history") or {"trips": []},
+            inject_session_memories_next_turn=bool(data.get("inject_session_memories_next_turn", False)),
+        )
+        state.global_usage.load(data.get("global_usage") or {})
+        return state
     
     
 user_state = TravelState(
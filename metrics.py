@@ -0,0 +1,239 @@
+from __future__ import annotations
+import json
+import os
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import IO, Dict, Iterable, Mapping, Optional, Protocol, Tuple
+
+## Upper bounds; the last bucket is +Inf
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 30_000)
+SIZE_BUCKETS = (10, 100, 500, 1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket histogram; cheap to observe, exportable as Prometheus cumulative buckets."""
+
+    __slots__ = ("bounds", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, bounds: Iterable[float]) -> None:
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation (max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts)),
+        }
+
+
+class Exporter(Protocol):
+    def export(self, metrics: "Metrics") -> None:
+        ...
+
+
+class Metrics:
+    """In-process counters, gauges and histograms.
+
+    Disabled by default: every recording call starts with an `enabled` check, and the hooks
+    check it before doing any work, so instrumentation costs next to nothing when off.
+    `sample_rate` is applied per run by the hooks (`sample()`); counters and histograms
+    recorded directly are not sampled. Updates take a short lock: tools record from worker threads.
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 1.0, exporter: Optional[Exporter] = None) -> None:
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def sample(self) -> bool:
+        """Whether to record the next run (always False while disabled)."""
+        return self.enabled and (self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+
+    def incr(self, name: str, value: float = 1, labels: Optional[Mapping[str, str]] = None) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Mapping[str, str]] = None) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Iterable[float] = LATENCY_BUCKETS_MS,
+        labels: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "ts": time.time(),
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.counters.items()],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.gauges.items()],
+                "histograms": [{"name": n, "labels": dict(l), **h.to_dict()} for (n, l), h in self.histograms.items()],
+            }
+
+    def export(self) -> None:
+        if self.enabled and self.exporter is not None:
+            self.exporter.export(self)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+
+class JsonLinesExporter:
+    """Appends one JSON snapshot per `export()` to a file (or stream)."""
+
+    def __init__(self, target: str | Path | IO[str] = sys.stdout) -> None:
+        self.target = target
+
+    def export(self, metrics: Metrics) -> None:
+        line = json.dumps(metrics.snapshot(), separators=(",", ":")) + "\n"
+        if isinstance(self.target, (str, Path)):
+            with open(self.target, "a", encoding="utf-8") as f:
+                f.write(line)
+        else:
+            self.target.write(line)
+
+
+class PrometheusTextExporter:
+    """Prometheus text exposition format; writes it to `path` (node_exporter textfile collector style) on export."""
+
+    def __init__(self, path: str | Path | None = None, prefix: str = "travel_agent_") -> None:
+        self.path = Path(path) if path is not None else None
+        self.prefix = prefix
+
+    @staticmethod
+    def _labels(labels: Labels, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self, metrics: Metrics) -> str:
+        with metrics._lock:
+            return self._render(metrics)
+
+    def _render(self, metrics: Metrics) -> str:
+        lines = []
+        typed = set()
+
+        def family(metric: str, kind: str) -> None:
+            ## one TYPE line per metric family, ahead of its first sample (series are sorted by name)
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+
+        for (name, labels), value in sorted(metrics.counters.items()):
+            metric = f"{self.prefix}{name}_total"
+            family(metric, "counter")
+            lines.append(f"{metric}{self._labels(labels)} {value}")
+        for (name, labels), value in sorted(metrics.gauges.items()):
+            metric = self.prefix + name
+            family(metric, "gauge")
+            lines.append(f"{metric}{self._labels(labels)} {value}")
+        for (name, labels), hist in sorted(metrics.histograms.items(), key=lambda kv: kv[0]):
+            metric = self.prefix + name
+            family(metric, "histogram")
+            cumulative = 0
+            for bound, n in zip([*map(str, hist.bounds), "+Inf"], hist.counts):
+                cumulative += n
+                le = 'le="' + bound + '"'
+                lines.append(f"{metric}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{metric}_sum{self._labels(labels)} {hist.sum}")
+            lines.append(f"{metric}_count{self._labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, metrics: Metrics) -> None:
+        text = self.render(metrics)
+        if self.path is None:
+            sys.stdout.write(text)
+            return
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+## Process-wide registry used by MemoryHooks, TrimmingSession and the tools
+metrics = Metrics()
+
+
+def configure_metrics(
+    enabled: bool = True, sample_rate: float = 1.0, exporter: Optional[Exporter] = None
+) -> Metrics:
+    metrics.enabled = enabled
+    metrics.sample_rate = sample_rate
+    metrics.exporter = exporter
+    return metrics
+
+
+def configure_metrics_from_env() -> Metrics:
+    """METRICS=jsonl[:path] | prometheus[:path] turns metrics on; METRICS_SAMPLE_RATE (default 1.0)."""
+    spec = os.getenv("METRICS", "")
+    if not spec:
+        return metrics
+    kind, _, path = spec.partition(":")
+    if kind == "prometheus":
+        exporter: Exporter = PrometheusTextExporter(path or None)
+    else:
+        exporter = JsonLinesExporter(path or sys.stdout)
+    return configure_metrics(True, float(os.getenv("METRICS_SAMPLE_RATE", "1.0")), exporter)
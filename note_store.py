@@ -0,0 +1,165 @@
+from __future__ import annotations
+from collections.abc import Mapping
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+## Process-wide intern tables, shared by every user/tenant in the process
+_KEYWORD_IDS: Dict[str, int] = {}
+_KEYWORD_NAMES: List[str] = []
+_KEYWORD_TUPLES: Dict[Tuple[int, ...], Tuple[int, ...]] = {}  ## notes with the same keyword set share one tuple
+_ORDINALS: Dict[int, int] = {}  ## one int object per distinct date
+_DATE_STRINGS: Dict[int, str] = {}
+
+_FIELDS = ("text", "last_update_date", "keywords")
+
+
+def keyword_id(keyword: str) -> int:
+    kid = _KEYWORD_IDS.get(keyword)
+    if kid is None:
+        kid = _KEYWORD_IDS[keyword] = len(_KEYWORD_NAMES)
+        _KEYWORD_NAMES.append(keyword)
+    return kid
+
+
+def _intern_keywords(keywords: Iterable[str] | None) -> Tuple[int, ...]:
+    ids = tuple(keyword_id(k) for k in (keywords or []) if isinstance(k, str))
+    return _KEYWORD_TUPLES.setdefault(ids, ids)
+
+
+def _encode_date(value: Any) -> int | str:
+    """YYYY-MM-DD[...] -> shared ordinal int; anything unparsable is kept verbatim."""
+    try:
+        ordinal = date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return str(value or "")
+    return _ORDINALS.setdefault(ordinal, ordinal)
+
+
+def _decode_date(value: int | str) -> str:
+    if isinstance(value, str):
+        return value
+    text = _DATE_STRINGS.get(value)
+    if text is None:
+        text = _DATE_STRINGS[value] = date.fromordinal(value).isoformat()
+    return text
+
+
+class CompactNote(Mapping):
+    """Slotted memory note: date as an ordinal, keywords as a shared tuple of interned ids.
+
+    Reads like the `{"text", "last_update_date", "keywords"}` dicts the rest of the code
+    expects (`note["text"]`, `note.get(...)`, `dict(note)`), and supports item assignment
+    on those three keys.
+    """
+
+    __slots__ = ("text", "_date", "_kw")
+
+    def __init__(self, text: str, last_update_date: Any = "", keywords: Iterable[str] | None = None) -> None:
+        self.text = text
+        self._date = _encode_date(last_update_date)
+        self._kw = _intern_keywords(keywords)
+
+    @classmethod
+    def from_any(cls, note: Any) -> "CompactNote":
+        if isinstance(note, CompactNote):
+            return note
+        return cls(note.get("text", ""), note.get("last_update_date", ""), note.get("keywords") or [])
+
+    @property
+    def date_ordinal(self) -> int:
+        return self._date if isinstance(self._date, int) else 0
+
+    @property
+    def keywords(self) -> List[str]:
+        return [_KEYWORD_NAMES[i] for i in self._kw]
+
+    # --- dict-compatible view ---
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "text":
+            return self.text
+        if key == "last_update_date":
+            return _decode_date(self._date)
+        if key == "keywords":
+            return self.keywords
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "text":
+            self.text = value
+        elif key == "last_update_date":
+            self._date = _encode_date(value)
+        elif key == "keywords":
+            self._kw = _intern_keywords(value)
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_FIELDS)
+
+    def __len__(self) -> int:
+        return len(_FIELDS)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"text": self.text, "last_update_date": _decode_date(self._date), "keywords": self.keywords}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        ## ids are process-local, so persist the readable form
+        return self.to_dict()
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["text"], state["last_update_date"], state["keywords"])
+
+
+class NoteList(list):
+    """A list of `CompactNote`s that converts plain note dicts on the way in."""
+
+    def __init__(self, notes: Iterable[Any] = ()) -> None:
+        super().__init__(CompactNote.from_any(n) for n in notes)
+
+    def append(self, note: Any) -> None:
+        super().append(CompactNote.from_any(note))
+
+    def extend(self, notes: Iterable[Any]) -> None:
+        super().extend(CompactNote.from_any(n) for n in notes)
+
+    def insert(self, index: int, note: Any) -> None:
+        super().insert(index, CompactNote.from_any(note))
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            super().__setitem__(index, [CompactNote.from_any(n) for n in value])
+        else:
+            super().__setitem__(index, CompactNote.from_any(value))
+
+    def __iadd__(self, notes: Iterable[Any]) -> "NoteList":
+        self.extend(notes)
+        return self
+
+
+class MemoryDict(dict):
+    """`global_memory` / `session_memory` container: whatever is stored under "notes" becomes a `NoteList`."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        if super().get("notes") is not None:
+            super().__setitem__("notes", _as_note_list(super().__getitem__("notes")))
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "notes" and value is not None:
+            value = _as_note_list(value)
+        super().__setitem__(key, value)
+
+
+def _as_note_list(notes: Iterable[Any]) -> NoteList:
+    return notes if isinstance(notes, NoteList) else NoteList(notes)
+
+
+def note_json_default(obj: Any) -> Any:
+    """`json.dumps(..., default=note_json_default)` for lists that contain `CompactNote`s."""
+    if isinstance(obj, CompactNote):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,102 @@
+from __future__ import annotations
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from agents import RunConfig
+    from openai import AsyncOpenAI, OpenAI
+
+## One pool for the agent runtime, consolidation and summaries. Keep-alive is much longer than
+## the client default (5 s) so connections survive the gap between a user's turns.
+POOL_MAX_CONNECTIONS = 100
+POOL_MAX_KEEPALIVE = 100
+KEEPALIVE_EXPIRY_S = 60.0
+CONNECT_TIMEOUT_S = 5.0
+READ_TIMEOUT_S = 120.0
+
+_lock = threading.Lock()
+_env_loaded = False
+_async_client: Optional["AsyncOpenAI"] = None
+_sync_client: Optional["OpenAI"] = None
+_run_config: Optional["RunConfig"] = None
+
+
+def _load_env() -> None:
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+
+
+def _http_options() -> dict:
+    try:
+        import httpx2 as httpx  ## what recent openai releases are built on
+    except ImportError:
+        import httpx
+    return {
+        "limits": httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY_S,
+        ),
+        "timeout": httpx.Timeout(READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S),
+    }
+
+
+def get_async_client() -> "AsyncOpenAI":
+    """The shared AsyncOpenAI client, built on first use (honours OPENAI_API_KEY / OPENAI_BASE_URL, .env included).
+
+    Its connections belong to the event loop that first uses them: one loop per process.
+    """
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+                _load_env()
+                _async_client = AsyncOpenAI(http_client=DefaultAsyncHttpxClient(**_http_options()))
+    return _async_client
+
+
+def get_sync_client() -> "OpenAI":
+    """The shared blocking client, for sync call sites (a separate pool: httpx pools are sync or async)."""
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                from openai import DefaultHttpxClient, OpenAI
+
+                _load_env()
+                _sync_client = OpenAI(http_client=DefaultHttpxClient(**_http_options()))
+    return _sync_client
+
+
+def set_clients(async_client: Optional["AsyncOpenAI"] = None, sync_client: Optional["OpenAI"] = None) -> None:
+    """Swap in other clients (e.g. pointed at a local fake endpoint); None resets to lazy defaults."""
+    global _async_client, _sync_client, _run_config
+    with _lock:
+        _async_client, _sync_client, _run_config = async_client, sync_client, None
+
+
+def shared_run_config() -> "RunConfig":
+    """RunConfig whose model provider uses the shared async client (instead of the SDK's own)."""
+    global _run_config
+    if _run_config is None:
+        from agents import RunConfig
+        from agents.models.openai_provider import OpenAIProvider
+
+        _run_config = RunConfig(model_provider=OpenAIProvider(openai_client=get_async_client()))
+    return _run_config
+
+
+async def aclose_clients() -> None:
+    """Close the shared pools (end of process)."""
+    async_client, sync_client = _async_client, _sync_client
+    set_clients()
+    if async_client is not None:
+        await async_client.close()
+    if sync_client is not None:
+        sync_client.close()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+## (name, cache key, renderer); the renderer only runs when the key changed
+Section = Tuple[str, Hashable, Callable[[], str]]
+
+
+@dataclass
+class SectionStats:
+    hits: int = 0
+    misses: int = 0
+
+
+class PromptBuilder:
+    """Assemble a system prompt from named sections, memoizing each one by a version/content key.
+
+    Callers pass sections static-first, so the prompt prefix stays byte-identical across
+    turns and the provider's prompt cache can reuse it. If no key changed since the last
+    build, the previous prompt string is returned as-is.
+    """
+
+    def __init__(self, separator: str = "\n\n") -> None:
+        self.separator = separator
+        self._cache: Dict[str, Tuple[Hashable, str]] = {}
+        self._last: Optional[Tuple[Tuple[Tuple[str, Hashable], ...], str]] = None
+        self.stats: Dict[str, SectionStats] = defaultdict(SectionStats)
+
+    def section(self, name: str, key: Hashable, render: Callable[[], str]) -> str:
+        """Return the text for `name`, re-rendering only when `key` differs from the cached one."""
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == key:
+            self.stats[name].hits += 1
+            return cached[1]
+        self.stats[name].misses += 1
+        text = render()
+        self._cache[name] = (key, text)
+        return text
+
+    def build(self, sections: Sequence[Section]) -> str:
+        keys = tuple((name, key) for name, key, _ in sections)
+        if self._last is not None and self._last[0] == keys:
+            for name, _ in keys:
+                self.stats[name].hits += 1
+            return self._last[1]
+
+        parts: List[str] = [self.section(name, key, render) for name, key, render in sections]
+        prompt = self.separator.join(p for p in parts if p)
+        self._last = (keys, prompt)
+        return prompt
+
+    def report(self) -> Dict[str, Dict[str, int]]:
+        """Per-section cache hits and misses."""
+        return {name: {"hits": s.hits, "misses": s.misses} for name, s in self.stats.items()}
@@ -0,0 +1,326 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from context_management import TrimmingSession
+from memory_state import TravelState
+from metrics import metrics
+
+SESSION_MEMORY_MAX_BYTES = 256 * 2**20
+SESSION_IDLE_TTL_S = 30 * 60.0
+LOW_WATERMARK = 0.9  ## once over the ceiling, spill down to this fraction of it
+SPILL_CONCURRENCY = 32  ## spill writes in flight at once
+SPILL_SUFFIX = ".session.json"
+
+
+@dataclass
+class SessionRegistryStats:
+    created: int = 0
+    spilled: int = 0
+    restored: int = 0
+    bytes_spilled: int = 0
+    spill_failures: int = 0
+    restore_failures: int = 0
+    expired: int = 0  ## spilled sessions dropped after idle_ttl_s on disk
+    over_budget: int = 0  ## shrink rounds that ended above the ceiling (every session busy)
+
+
+def _write_file(path: str, data: Dict[str, Any]) -> None:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def _take_file(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        data = json.loads(f.read())
+    os.unlink(path)
+    return data
+
+
+class SessionRegistry:
+    """Owns the process's `TrimmingSession`s (one per session id) and bounds their memory.
+
+    - `get(session_id, state)` returns the session, created on first use. Callers may keep the
+      object across turns: a spilled session loads its log back on its next read or write
+    - sessions report their approximate byte size; once the live total passes `max_bytes`, the
+      least recently used ones are spilled to `spill_dir` (a JSON file each) in the background
+      until the total is under LOW_WATERMARK of the ceiling
+    - `sweep` spills sessions idle for `idle_ttl_s`, and drops spilled sessions that stayed on
+      disk that long again (the conversation starts over); `start` runs it periodically
+    - a session whose user has a run in flight, or whose summary update is pending, is skipped
+
+    The ceiling is soft: a write can pass it until the background spill catches up. It counts
+    the logs' JSON size; as Python objects they take a few times that in the heap.
+    Spill files are scratch space, removed on restore, on expiry and on `close`; a given
+    `spill_dir` is cleared of leftovers when the registry is created. Dropping one releases the
+    payload references of its compacted items, as trimming does in a live session.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = SESSION_MEMORY_MAX_BYTES,
+        idle_ttl_s: float = SESSION_IDLE_TTL_S,
+        spill_dir: str | Path | None = None,
+        **session_options: Any,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.idle_ttl_s = idle_ttl_s
+        self.session_options = session_options
+        self._spill_dir = str(spill_dir) if spill_dir is not None else None
+        if self._spill_dir is not None and os.path.isdir(self._spill_dir):
+            for name in os.listdir(self._spill_dir):
+                if name.endswith(SPILL_SUFFIX) or name.endswith(SPILL_SUFFIX + ".tmp"):
+                    os.unlink(os.path.join(self._spill_dir, name))
+        self._live: OrderedDict[str, TrimmingSession] = OrderedDict()  ## in memory, least recently used first
+        self._touched: Dict[str, float] = {}  ## session id -> monotonic time of last use, for live sessions
+        self._spilled: weakref.WeakValueDictionary[str, TrimmingSession] = weakref.WeakValueDictionary()
+        self._files: Dict[str, str] = {}  ## session id -> spill file
+        self._spilled_at: Dict[str, float] = {}  ## session id -> monotonic time of the spill, oldest first
+        self._bytes = 0
+        self._shrinking: Optional[asyncio.Task] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = SessionRegistryStats()
+
+    @classmethod
+    def from_env(cls, **session_options: Any) -> "SessionRegistry":
+        return cls(
+            max_bytes=int(os.getenv("SESSION_MEMORY_MAX_BYTES", SESSION_MEMORY_MAX_BYTES)),
+            idle_ttl_s=float(os.getenv("SESSION_IDLE_TTL_S", SESSION_IDLE_TTL_S)),
+            spill_dir=os.getenv("SESSION_SPILL_DIR"),
+            **session_options,
+        )
+
+    # --- counts ---
+
+    @property
+    def live(self) -> int:
+        return len(self._live)
+
+    @property
+    def spilled(self) -> int:
+        return len(self._files)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes held by live sessions."""
+        return self._bytes
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "live": self.live,
+            "spilled": self.spilled,
+            "restored": self.stats.restored,
+            "bytes": self._bytes,
+        }
+
+    # --- sessions ---
+
+    def get(self, session_id: str, state: TravelState) -> TrimmingSession:
+        session = self._live.get(session_id)
+        if session is not None:
+            self._touch(session_id)
+        else:
+            session = self._spilled.get(session_id)
+            if session is None:
+                session = TrimmingSession(session_id, state, track_bytes=True, **self.session_options)
+                session.on_resize = self._on_resize
+                self.stats.created += 1
+                if session_id in self._files:
+                    session.set_spilled(self._loader(session_id))
+                    self._spilled[session_id] = session
+                else:
+                    self._live[session_id] = session
+                    self._touch(session_id)
+        if session.state is not state:
+            session.state = state  ## the user's state was reloaded: keep the conversation
+        return session
+
+    def _touch(self, session_id: str) -> None:
+        self._live.move_to_end(session_id)
+        self._touched[session_id] = time.monotonic()
+
+    def _on_resize(self, session: TrimmingSession, delta: int) -> None:
+        self._bytes += delta
+        if not session.spilled:
+            ## a write, or a spilled session coming back
+            session_id = session.session_id
+            if self._live.get(session_id) is not session:
+                self._spilled.pop(session_id, None)
+                self._live[session_id] = session
+            self._touch(session_id)
+        if self._bytes > self.max_bytes:
+            self._schedule_shrink()
+        if metrics.enabled:
+            metrics.set_gauge("sessions_live", len(self._live))
+            metrics.set_gauge("sessions_spilled", len(self._files))
+            metrics.set_gauge("sessions_bytes", self._bytes)
+
+    # --- spilling ---
+
+    def _path(self, session_id: str) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="travel-sessions-")
+        os.makedirs(self._spill_dir, exist_ok=True)
+        name = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self._spill_dir, name + SPILL_SUFFIX)
+
+    def _store(self, session_id: str) -> Callable[[Dict[str, Any]], Awaitable[Callable[[], Awaitable[Dict[str, Any]]]]]:
+        async def store(data: Dict[str, Any]) -> Callable[[], Awaitable[Dict[str, Any]]]:
+            path = self._path(session_id)
+            write = asyncio.ensure_future(asyncio.to_thread(_write_file, path, data))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                ## the thread can't be stopped: let it finish, then drop the orphaned file
+                await asyncio.wait([write])
+                if not write.cancelled() and write.exception() is None:
+                    os.unlink(path)
+                raise
+            self._files[session_id] = path
+            self._spilled_at[session_id] = time.monotonic()
+            return self._loader(session_id)
+
+        return store
+
+    def _loader(self, session_id: str) -> Callable[[], Awaitable[Dict[str, Any]]]:
+        async def load() -> Dict[str, Any]:
+            path = self._files.pop(session_id, None)
+            self._spilled_at.pop(session_id, None)
+            if path is None:
+                return {}
+            try:
+                data = await asyncio.to_thread(_take_file, path)
+            except Exception:
+                self.stats.restore_failures += 1
+                raise
+            self.stats.restored += 1
+            metrics.incr("sessions_restored")
+            return data
+
+        return load
+
+    async def _spill(self, session_id: str, session: TrimmingSession) -> int:
+        if session.state.guard.run_lock.locked():
+            return 0
+        try:
+            freed = await session.spill(self._store(session_id))
+        except Exception:
+            self.stats.spill_failures += 1
+            metrics.incr("session_spill_failures")
+            return 0
+        if session.spilled:
+            if self._live.get(session_id) is session:
+                del self._live[session_id]
+                self._touched.pop(session_id, None)
+            self._spilled[session_id] = session
+            self.stats.spilled += 1
+            self.stats.bytes_spilled += freed
+            metrics.incr("sessions_spilled_total")
+        return freed
+
+    def _schedule_shrink(self) -> None:
+        if self._shrinking is None or self._shrinking.done():
+            self._shrinking = asyncio.get_running_loop().create_task(self.shrink())
+
+    async def _spill_all(self, victims: List[Tuple[str, TrimmingSession]]) -> int:
+        """Spill `victims`, SPILL_CONCURRENCY at a time (each write is a thread hop); returns how many went."""
+        spilled = 0
+        for i in range(0, len(victims), SPILL_CONCURRENCY):
+            chunk = victims[i : i + SPILL_CONCURRENCY]
+            await asyncio.gather(*(self._spill(session_id, session) for session_id, session in chunk))
+            spilled += sum(session.spilled for _, session in chunk)
+        return spilled
+
+    async def shrink(self) -> None:
+        """Spill least recently used sessions until the live total is under LOW_WATERMARK of `max_bytes`."""
+        while self._bytes > self.max_bytes * LOW_WATERMARK:
+            excess = self._bytes - self.max_bytes * LOW_WATERMARK
+            victims: List[Tuple[str, TrimmingSession]] = []
+            for session_id, session in self._live.items():
+                if excess <= 0:
+                    break
+                if not session.state.guard.run_lock.locked():
+                    victims.append((session_id, session))
+                    excess -= session.nbytes
+            if not victims or not await self._spill_all(victims):
+                break
+        if self._bytes > self.max_bytes:
+            self.stats.over_budget += 1
+
+    async def _drop_spilled(self, session_id: str) -> None:
+        """Delete a spill file, releasing the payload references of the items in it."""
+        path = self._files.pop(session_id, None)
+        self._spilled_at.pop(session_id, None)
+        if path is None:
+            return
+        compactor = self.session_options.get("compactor")
+        try:
+            if compactor is None:
+                await asyncio.to_thread(os.unlink, path)
+                return
+            data = await asyncio.to_thread(_take_file, path)
+        except (OSError, ValueError):
+            return
+        for item in data.get("items") or ():
+            compactor.release(item)
+
+    async def _drop_all(self, session_ids: List[str]) -> None:
+        for i in range(0, len(session_ids), SPILL_CONCURRENCY):
+            await asyncio.gather(*(self._drop_spilled(session_id) for session_id in session_ids[i : i + SPILL_CONCURRENCY]))
+
+    async def sweep(self) -> int:
+        """Spill every session idle for `idle_ttl_s` and drop those spilled that long ago; returns how many were spilled."""
+        cutoff = time.monotonic() - self.idle_ttl_s
+        expired: List[str] = []
+        for session_id, spilled_at in self._spilled_at.items():
+            if spilled_at > cutoff:
+                break  ## oldest spill first
+            expired.append(session_id)
+        if expired:
+            await self._drop_all(expired)
+            self.stats.expired += len(expired)
+            metrics.incr("sessions_expired", len(expired))
+        victims: List[Tuple[str, TrimmingSession]] = []
+        for session_id, session in self._live.items():
+            touched = self._touched.get(session_id)
+            if touched is not None and touched > cutoff:
+                break  ## least recently used first: the rest are newer
+            victims.append((session_id, session))
+        return await self._spill_all(victims)
+
+    def start(self, interval_s: Optional[float] = None) -> None:
+        """Run `sweep` every `interval_s` (default: a quarter of the idle TTL, at most a minute)."""
+        if self._sweeper is not None:
+            return
+        interval = interval_s if interval_s is not None else min(self.idle_ttl_s / 4, 60.0)
+
+        async def run() -> None:
+            while True:
+                await asyncio.sleep(interval)
+                await self.sweep()
+
+        self._sweeper = asyncio.get_running_loop().create_task(run())
+
+    async def close(self) -> None:
+        """Stop background work and remove the spill files (spilled conversations are dropped, with their payload references)."""
+        for task in (self._sweeper, self._shrinking):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._sweeper = self._shrinking = None
+        await self._drop_all(list(self._files))
@@ -0,0 +1,115 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional
+
+from agents.items import TResponseInputItem
+from openai_clients import get_async_client
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+## (previous summary, newly evicted items) -> updated summary
+Summarizer = Callable[[str, List[TResponseInputItem]], Awaitable[str]]
+
+SUMMARY_MODEL = "gpt-5-mini"
+SUMMARY_MAX_CHARS = 2_000
+SUMMARY_HEADER = "Summary of earlier turns in this conversation (older than the messages below):"
+
+
+def summary_item(summary: str) -> TResponseInputItem:
+    """The item `TrimmingSession` puts at the head of the history while it holds a summary."""
+    return {"role": "developer", "content": f"{SUMMARY_HEADER}\n{summary}"}
+
+
+def item_line(item: TResponseInputItem, max_chars: int = 300) -> str:
+    """One readable line per item ("" for items that carry nothing worth keeping)."""
+    if not isinstance(item, dict):
+        return ""
+    role = item.get("role")
+    if role in ("user", "assistant"):
+        content = item.get("content")
+        if isinstance(content, list):
+            content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+        text = " ".join(str(content or "").split())
+        return f"{role}: {text[:max_chars]}" if text else ""
+    if item.get("type") == "function_call":
+        return f"tool call: {item.get('name')}({str(item.get('arguments', ''))[:max_chars]})"
+    return ""
+
+
+def _clip(summary: str, max_chars: int) -> str:
+    """Keep the newest whole lines that fit in `max_chars`."""
+    if len(summary) <= max_chars:
+        return summary
+    lines = summary.splitlines()
+    kept: List[str] = []
+    size = 0
+    for line in reversed(lines):
+        size += len(line) + 1
+        if size > max_chars:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+class ExtractiveSummarizer:
+    """Local, model-free summarizer: one line per evicted message, newest lines kept under `max_chars`.
+
+    Deterministic and instant, so it doubles as the stub for tests and benchmarks.
+    """
+
+    def __init__(self, max_chars: int = SUMMARY_MAX_CHARS) -> None:
+        self.max_chars = max_chars
+
+    async def __call__(self, previous: str, evicted: List[TResponseInputItem]) -> str:
+        lines = [line for line in (item_line(i) for i in evicted) if line]
+        if not lines:
+            return previous
+        return _clip("\n".join([previous, *lines]) if previous else "\n".join(lines), self.max_chars)
+
+
+class LLMSummarizer:
+    """Folds evicted turns into the running summary with one small model call.
+
+    Only the new turns and the previous summary are sent, never the whole history. If the call
+    fails, the turns are appended extractively so nothing is lost.
+    """
+
+    def __init__(
+        self,
+        model: str = SUMMARY_MODEL,
+        client: Optional[AsyncOpenAI] = None,
+        max_chars: int = SUMMARY_MAX_CHARS,
+    ) -> None:
+        self.model = model
+        self._client = client
+        self.max_chars = max_chars
+        self._fallback = ExtractiveSummarizer(max_chars)
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        return self._client or get_async_client()
+
+    async def __call__(self, previous: str, evicted: List[TResponseInputItem]) -> str:
+        new_turns = "\n".join(line for line in (item_line(i) for i in evicted) if line)
+        if not new_turns:
+            return previous
+        prompt = f"""
+You maintain a running summary of a travel-planning conversation whose oldest turns are being dropped.
+
+Update the summary with the new turns below. Keep trip facts (destinations, dates, travellers,
+budgets, options shortlisted or rejected, decisions made, open questions). Drop chit-chat.
+Write short bullet points, at most {self.max_chars} characters in total. Output only the summary.
+
+<previous_summary>
+{previous or "(empty)"}
+</previous_summary>
+
+<new_turns>
+{new_turns}
+</new_turns>
+"""
+        try:
+            resp = await self.client.responses.create(model=self.model, input=prompt)
+        except Exception:
+            return await self._fallback(previous, evicted)
+        return _clip(resp.output_text.strip() or previous, self.max_chars)
@@ -0,0 +1,260 @@
+from __future__ import annotations
+import asyncio
+import json
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from pathlib import Path
+from typing import Deque, List, Tuple
+
+from agents.memory.session import SessionABC
+from agents.items import TResponseInputItem
+from context_management import _is_user_msg
+from memory_state import TravelState
+from metrics import COUNT_BUCKETS, metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_items (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    is_user INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_session_items_user
+    ON session_items (session_id, is_user, seq);
+"""
+
+
+def _tail(rows: Deque[Tuple[int, TResponseInputItem]], limit: int | None) -> List[TResponseInputItem]:
+    if limit is None or limit <= 0 or limit >= len(rows):
+        return [item for _, item in rows]
+    tail = [item for _, item in islice(reversed(rows), limit)]
+    tail.reverse()
+    return tail
+
+
+class SQLiteSessionStore:
+    """One SQLite file (WAL mode) holding the history of many sessions.
+
+    - All writes of an `add_items` call go into a single transaction.
+    - Trimming is one indexed range delete on (session_id, seq).
+    - A small LRU of hot sessions serves `get_items` without touching disk.
+    """
+
+    def __init__(self, db_path: str | Path = "sessions.db", cache_size: int = 256) -> None:
+        self.db_path = str(db_path)
+        self.cache_size = max(0, cache_size)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+
+        ## session_id -> chronological (seq, item) pairs, always trimmed
+        self._cache: OrderedDict[str, Deque[Tuple[int, TResponseInputItem]]] = OrderedDict()
+        ## session_id -> next seq to assign, bounded like the cache (a miss costs one indexed MAX(seq))
+        self._next_seq: OrderedDict[str, int] = OrderedDict()
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._conn.close()
+
+    # --- cache helpers (caller holds self._db_lock) ---
+
+    def _cache_put(self, session_id: str, rows: Deque[Tuple[int, TResponseInputItem]]) -> None:
+        if not self.cache_size:
+            return
+        self._cache[session_id] = rows
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, session_id: str) -> Deque[Tuple[int, TResponseInputItem]]:
+        cached = self._cache.get(session_id)
+        if cached is not None:
+            self._cache.move_to_end(session_id)
+            self.cache_hits += 1
+            return cached
+
+        self.cache_misses += 1
+        cur = self._conn.execute(
+            "SELECT seq, payload FROM session_items WHERE session_id = ? ORDER BY seq",
+            (session_id,),
+        )
+        rows = deque((seq, json.loads(payload)) for seq, payload in cur)
+        self._cache_put(session_id, rows)
+        return rows
+
+    def _seq_after(self, session_id: str) -> int:
+        nxt = self._next_seq.get(session_id)
+        if nxt is None:
+            (last,) = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM session_items WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            nxt = last + 1
+        else:
+            self._next_seq.move_to_end(session_id)
+        return nxt
+
+    def _remember_seq(self, session_id: str, nxt: int) -> None:
+        if not self.cache_size:
+            return
+        self._next_seq[session_id] = nxt
+        self._next_seq.move_to_end(session_id)
+        while len(self._next_seq) > self.cache_size:
+            self._next_seq.popitem(last=False)
+
+    # --- sync operations (run off the event loop) ---
+
+    def get_cached(self, session_id: str, limit: int | None) -> List[TResponseInputItem] | None:
+        """Serve a hot session straight from the cache; None if it is not cached or a write is in flight."""
+        if not self._db_lock.acquire(blocking=False):
+            return None
+        try:
+            rows = self._cache.get(session_id)
+            if rows is None:
+                return None
+            self._cache.move_to_end(session_id)
+            self.cache_hits += 1
+            return _tail(rows, limit)
+        finally:
+            self._db_lock.release()
+
+    def get_items_sync(self, session_id: str, limit: int | None) -> List[TResponseInputItem]:
+        with self._db_lock:
+            return _tail(self._load(session_id), limit)
+
+    def add_items_sync(self, session_id: str, items: List[TResponseInputItem], max_turns: int) -> int:
+        """Insert `items` and trim to the last `max_turns` user turns. Returns the number of evicted items."""
+        with self._db_lock:
+            seq = self._seq_after(session_id)
+            new_rows = []
+            params = []
+            for item in items:
+                is_user = _is_user_msg(item)
+                new_rows.append((seq, item))
+                params.append((session_id, seq, int(is_user), json.dumps(item, ensure_ascii=False)))
+                seq += 1
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO session_items (session_id, seq, is_user, payload) VALUES (?, ?, ?, ?)",
+                    params,
+                )
+                cut = self._cut_seq(session_id, max_turns)
+                evicted = 0
+                if cut is not None:
+                    evicted = self._conn.execute(
+                        "DELETE FROM session_items WHERE session_id = ? AND seq < ?",
+                        (session_id, cut),
+                    ).rowcount
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._next_seq.pop(session_id, None)
+                self._cache.pop(session_id, None)
+                raise
+
+            self._remember_seq(session_id, seq)
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                cached.extend(new_rows)
+                if cut is not None:
+                    while cached and cached[0][0] < cut:
+                        cached.popleft()
+            return evicted
+
+    def pop_item_sync(self, session_id: str) -> TResponseInputItem | None:
+        with self._db_lock:
+            rows = self._conn.execute(
+                "DELETE FROM session_items WHERE session_id = ? AND seq = "
+                "(SELECT MAX(seq) FROM session_items WHERE session_id = ?) RETURNING payload",
+                (session_id, session_id),
+            ).fetchall()
+            if not rows:
+                return None
+            cached = self._cache.get(session_id)
+            if cached:
+                cached.pop()
+            return json.loads(rows[0][0])
+
+    def clear_session_sync(self, session_id: str) -> None:
+        with self._db_lock:
+            self._conn.execute("DELETE FROM session_items WHERE session_id = ?", (session_id,))
+            self._cache.pop(session_id, None)
+            self._next_seq.pop(session_id, None)
+
+    def trim_sync(self, session_id: str, max_turns: int) -> int:
+        with self._db_lock:
+            cut = self._cut_seq(session_id, max_turns)
+            if cut is None:
+                return 0
+            evicted = self._conn.execute(
+                "DELETE FROM session_items WHERE session_id = ? AND seq < ?",
+                (session_id, cut),
+            ).rowcount
+            cached = self._cache.get(session_id)
+            while cached and cached[0][0] < cut:
+                cached.popleft()
+            return evicted
+
+    def _cut_seq(self, session_id: str, max_turns: int) -> int | None:
+        """Seq of the earliest user message to keep, or None if there are fewer than `max_turns` user turns."""
+        row = self._conn.execute(
+            "SELECT seq FROM session_items WHERE session_id = ? AND is_user = 1 "
+            "ORDER BY seq DESC LIMIT 1 OFFSET ?",
+            (session_id, max_turns - 1),
+        ).fetchone()
+        return row[0] if row else None
+
+
+class SQLiteTrimmingSession(SessionABC):
+    """Durable counterpart of `TrimmingSession`: keeps only the last N user turns, persisted in SQLite.
+
+    Many sessions can share one `SQLiteSessionStore` (and therefore one database file)."""
+
+    def __init__(self, session_id: str, state: TravelState, store: SQLiteSessionStore, max_turns: int = 8) -> None:
+        super().__init__()
+        self.session_id = session_id
+        self.state = state
+        self.store = store
+        self.max_turns = max(1, max_turns)
+
+    async def get_items(self, limit: int | None = None) -> List[TResponseInputItem]:
+        """Return history trimmed to the last N user turns (Optionally limited to most-recent `limit` items)."""
+        cached = self.store.get_cached(self.session_id, limit)
+        if cached is not None:
+            return cached
+        return await asyncio.to_thread(self.store.get_items_sync, self.session_id, limit)
+
+    async def add_items(self, items: List[TResponseInputItem]) -> None:
+        """Append new items in one transaction, then trim to last N user turns."""
+        if not items:
+            return
+
+        evicted = await asyncio.to_thread(self.store.add_items_sync, self.session_id, items, self.max_turns)
+        if evicted:
+            # Flag for triggering session injection after context trimming
+            self.state.inject_session_memories_next_turn = True
+            if metrics.enabled:
+                metrics.incr("session_trim_events")
+                metrics.observe("session_trimmed_items", evicted, COUNT_BUCKETS)
+
+    async def pop_item(self) -> TResponseInputItem | None:
+        """Remove and return the most recent item (post-trim)."""
+        return await asyncio.to_thread(self.store.pop_item_sync, self.session_id)
+
+    async def clear_session(self) -> None:
+        """Remove all items for this session."""
+        await asyncio.to_thread(self.store.clear_session_sync, self.session_id)
+
+    async def set_max_turns(self, max_turns: int) -> None:
+        self.max_turns = max(1, max_turns)
+        await asyncio.to_thread(self.store.trim_sync, self.session_id, self.max_turns)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterable, List, Mapping, Optional, Tuple
+
+if TYPE_CHECKING:
+    from memory_state import TravelState
+
+MAX_NOTE_KEYWORDS = 3  ## a note keeps at most this many keywords, however often it is re-saved
+
+
+@dataclass(frozen=True, slots=True)
+class MemorySnapshot:
+    """Immutable view of a user's memory at one version; safe to read without any lock."""
+
+    version: int
+    profile: Mapping[str, Any]
+    global_notes: Tuple[Any, ...]
+    session_notes: Tuple[Any, ...]
+
+
+@dataclass(eq=False)
+class StateGuard:
+    """Per-user coordination for one `TravelState`.
+
+    - `run_lock` serializes runs of the same user (different users never contend)
+    - `consolidation_lock` keeps at most one consolidation per user in flight
+    - note mutations go through `commit*` under a short `threading.Lock` and bump `version`:
+      `commit` swaps in new lists (copy-on-write), session note saves append in place;
+      readers take `snapshot()` (immutable tuples) instead
+    - `on_commit(state)`, if set (e.g. by `StateRepository`), runs after every commit, outside
+      the lock and possibly on a tool's worker thread
+    """
+
+    run_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    consolidation_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    version: int = 0
+    _commit_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _snapshot: Optional[MemorySnapshot] = field(default=None, repr=False)
+    _sources: Tuple[Any, ...] = field(default=(), repr=False)  ## (global list, len, session list, len) behind _snapshot
+    on_commit: Optional[Callable[["TravelState"], None]] = field(default=None, repr=False)
+
+    def __getstate__(self) -> dict:
+        ## locks and cached snapshots are process-local
+        return {"version": self.version}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(version=state.get("version", 0))
+
+
+def snapshot(state: "TravelState") -> MemorySnapshot:
+    """Current immutable snapshot.
+
+    Rebuilt only after a commit, or when a notes list was replaced or resized behind the
+    guard's back (direct writes still show up; in-place item or profile edits do not, so
+    route those through `commit`). A rebuild keeps the previous global tuple while the global
+    list is the same, so a session note save does not re-copy (and re-index) global memory.
+    """
+    guard = state.guard
+    global_notes = state.global_memory.get("notes")
+    session_notes = state.session_memory.get("notes")
+    sources = (global_notes, len(global_notes or ()), session_notes, len(session_notes or ()))
+    snap = guard._snapshot
+    if snap is not None and snap.version == guard.version and _same_sources(guard._sources, sources):
+        return snap
+    with guard._commit_lock:
+        prev, prev_sources = guard._snapshot, guard._sources
+        same_global = prev is not None and prev_sources[0] is global_notes and prev_sources[1] == sources[1]
+        snap = MemorySnapshot(
+            version=guard.version,
+            profile=MappingProxyType(dict(state.profile)),
+            global_notes=prev.global_notes if same_global else tuple(global_notes or ()),
+            session_notes=tuple(session_notes or ()),
+        )
+        guard._snapshot = snap
+        guard._sources = sources
+    return snap
+
+
+def _same_sources(a: Tuple[Any, ...], b: Tuple[Any, ...]) -> bool:
+    return len(a) == 4 and a[0] is b[0] and a[1] == b[1] and a[2] is b[2] and a[3] == b[3]
+
+
+def commit(
+    state: "TravelState",
+    *,
+    global_notes: Optional[Iterable[Any]] = None,
+    session_notes: Optional[Iterable[Any] | Callable[[List[Any]], Iterable[Any]]] = None,
+    profile: Optional[Mapping[str, Any]] = None,
+    expected_version: Optional[int] = None,
+) -> bool:
+    """Atomically replace global notes, session notes and/or the profile.
+
+    `session_notes` may also be a function of the current session notes, applied under the
+    lock (e.g. "drop what was consolidated, keep what arrived meanwhile").
+
+    Returns False (and changes nothing) if `expected_version` is given and another
+    commit got in first.
+    """
+    guard = state.guard
+    with guard._commit_lock:
+        if expected_version is not None and guard.version != expected_version:
+            return False
+        if global_notes is not None:
+            state.global_memory["notes"] = list(global_notes)
+        if callable(session_notes):
+            session_notes = session_notes(list(state.session_memory.get("notes") or []))
+        if session_notes is not None:
+            state.session_memory["notes"] = list(session_notes)
+        if profile is not None:
+            state.profile = dict(profile)
+        guard.version += 1
+    _notify(state)
+    return True
+
+
+def commit_session_note(state: "TravelState", note: Any) -> None:
+    """Append a session note under the commit lock.
+
+    Session notes only grow between consolidations, so saves append in place (O(1)) instead of
+    copying the list: snapshot readers hold their own tuples and never see the change, and the
+    next `snapshot` picks it up from the new length.
+    """
+    guard = state.guard
+    with guard._commit_lock:
+        current = state.session_memory.get("notes")
+        if current is None:
+            state.session_memory["notes"] = [note]
+        else:
+            current.append(note)
+        guard.version += 1
+    _notify(state)
+
+
+def upsert_session_note(state: "TravelState", note: Mapping[str, Any]) -> bool:
+    """Save a session note unless one with the same normalized text exists (see `memory_merge.normalize_text`).
+
+    On a match the existing note is replaced (in its slot) by a copy with the newer date and
+    the union of both keyword lists (existing ones first, capped at `MAX_NOTE_KEYWORDS`);
+    nothing is appended. In place like `commit_session_note`:
+    a new note is an O(1) append, a refresh one identity scan for its slot (no list copy).
+    Returns True if a new note was added.
+    """
+    guard = state.guard
+    index = state.session_text_index
+    with guard._commit_lock:
+        if state.session_memory.get("notes") is None:
+            state.session_memory["notes"] = []
+        current = state.session_memory["notes"]
+        index.sync(current)
+        existing = index.get(note.get("text", ""))
+        if existing is None:
+            current.append(note)
+            index.adopt(current, current[-1:])
+        else:
+            keywords = list(existing.get("keywords") or [])
+            keywords += [k for k in note.get("keywords") or [] if k not in keywords]
+            keywords = keywords[:MAX_NOTE_KEYWORDS]
+            merged = {
+                "text": existing["text"],
+                "last_update_date": max(existing.get("last_update_date") or "", note.get("last_update_date") or ""),
+                "keywords": keywords,
+            }
+            pos = next(i for i, n in enumerate(current) if n is existing)
+            current[pos] = merged
+            index.adopt(current, [current[pos]])
+        guard.version += 1
+    _notify(state)
+    return existing is None
+
+
+def _notify(state: "TravelState") -> None:
+    callback = state.guard.on_commit
+    if callback is not None:
+        callback(state)
+
+
+@asynccontextmanager
+async def user_run(state: "TravelState") -> AsyncIterator["TravelState"]:
+    """Hold the user's run lock for one `Runner.run` (hooks and `instructions` share rendered fields)."""
+    async with state.guard.run_lock:
+        yield state
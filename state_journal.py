@@ -0,0 +1,356 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import pickle
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from memory_state import TravelState
+from state_repository import StateBackend
+
+JOURNAL_MAX_BYTES = 64 * 2**20  ## compact once the journal segments hold this much
+SNAPSHOT_VERSION = 1
+
+Record = Dict[str, Any]
+
+
+@dataclass
+class _Written:
+    """What the journal last recorded for a customer, to turn the next save into a delta."""
+
+    global_notes: Any
+    global_len: int
+    session_notes: Tuple[Any, ...]  ## the notes themselves: holding them keeps their ids unique
+    session_ids: Tuple[int, ...]
+    profile_key: str
+    trips: Any
+    trips_len: int
+    flag: bool
+
+
+@dataclass
+class JournalStats:
+    records: int = 0
+    bytes_appended: int = 0
+    fsyncs: int = 0
+    snapshots: int = 0
+    compactions: int = 0
+    replayed: int = 0  ## journal records applied on top of snapshots by `load`
+    torn: int = 0  ## incomplete or unreadable records skipped (crash mid-write)
+
+
+def _safe_name(customer_id: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in customer_id)
+
+
+def _notes(notes: Any) -> List[Dict[str, Any]]:
+    return [dict(n) for n in notes or []]
+
+
+def _profile_key(profile: Dict[str, Any]) -> str:
+    return json.dumps(profile, sort_keys=True, default=str)
+
+
+def apply_record(data: Dict[str, Any], record: Record) -> Dict[str, Any]:
+    """Apply one journal record to a state in `TravelState.to_dict()` form (returns the new dict)."""
+    op = record["op"]
+    if op == "state":
+        return record["state"]
+    if op == "session_add":
+        data.setdefault("session_memory", {}).setdefault("notes", []).extend(record["notes"])
+    elif op == "session":
+        data["session_memory"] = {"notes": record["notes"]}
+    elif op == "global":
+        data["global_memory"] = {"notes": record["notes"]}
+        data["global_usage"] = record.get("usage") or {}
+    elif op == "profile":
+        data["profile"] = record["profile"]
+    elif op == "trips":
+        data["trip_history"] = record["trip_history"]
+    elif op == "flag":
+        data["inject_session_memories_next_turn"] = record["value"]
+    return data
+
+
+class JournalStateBackend(StateBackend):
+    """Append-only journal of memory mutations plus per-customer binary snapshots.
+
+    - `save` records only what changed since the last save of that customer (appended session
+      notes, a replaced note list, a profile edit, ...), as one line in a shared journal;
+      `save_many` (write-behind batches) appends the whole batch and fsyncs once; what was
+      last written is kept per customer until `forget` (the repository evicted them), after
+      which their next save is a full state record
+    - `load` reads the customer's snapshot (pickled `to_dict()` data) and replays their
+      journal tail; an in-memory index of record offsets per customer, built by one scan at
+      startup, avoids reading anyone else's records
+    - once the journal passes `max_journal_bytes`, it rolls over to a new segment and every
+      customer with records in the old ones gets a fresh snapshot, then the old segments go;
+      this runs on a background thread, one customer at a time, so saves and loads go on
+
+    Usage counters of global notes are journaled with global note replacements only.
+    Snapshots are pickles: keep `directory` private to the service.
+    """
+
+    def __init__(self, directory: str | Path, max_journal_bytes: int = JOURNAL_MAX_BYTES, fsync: bool = True) -> None:
+        self.directory = Path(directory)
+        self.snapshot_dir = self.directory / "snapshots"
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self._snapshot_prefix = os.path.join(self.snapshot_dir, "")  ## plain string paths: cheaper per load than Path joins
+        self.max_journal_bytes = max_journal_bytes
+        self.fsync = fsync
+        self.stats = JournalStats()
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()  ## one compaction at a time
+        self._compactor: Optional[threading.Thread] = None
+        self._written: Dict[str, _Written] = {}  ## touched on the event loop only; bounded by the repository's `forget`
+        self._index: Dict[str, List[Tuple[int, int]]] = {}  ## customer_id -> (segment, offset) of each record
+        self._journal_bytes = 0
+        self._segment = 0
+        self._file: Any = None
+        self._scan()
+
+    # --- journal files ---
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"journal-{segment:06d}.log"
+
+    def _segments(self) -> List[int]:
+        return sorted(int(p.stem.split("-")[1]) for p in self.directory.glob("journal-*.log"))
+
+    def _scan(self) -> None:
+        """Index every record of the existing segments (customer id only; records are parsed on load)."""
+        ids: Dict[bytes, str] = {}
+        segments = self._segments()
+        for segment in segments:
+            path = self._segment_path(segment)
+            offset = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        ## torn tail from a crash mid-append: drop it
+                        self.stats.torn += 1
+                        break
+                    raw_id = line[: line.find(b"\t")]
+                    customer_id = ids.get(raw_id)
+                    if customer_id is None:
+                        customer_id = ids[raw_id] = json.loads(raw_id)
+                    self._index.setdefault(customer_id, []).append((segment, offset))
+                    offset += len(line)
+            if offset != path.stat().st_size:
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+            self._journal_bytes += offset
+        self._segment = segments[-1] if segments else 1
+        self._file = open(self._segment_path(self._segment), "ab")
+
+    def _append(self, lines: List[Tuple[str, bytes]]) -> None:
+        with self._lock:
+            f = self._file
+            offset = f.tell()
+            for customer_id, line in lines:
+                self._index.setdefault(customer_id, []).append((self._segment, offset))
+                offset += len(line)
+            data = b"".join(line for _, line in lines)
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+                self.stats.fsyncs += 1
+            self.stats.records += len(lines)
+            self.stats.bytes_appended += len(data)
+            self._journal_bytes += len(data)
+            if self._journal_bytes >= self.max_journal_bytes:
+                self._compact_in_background()
+
+    def _read_records(self, refs: List[Tuple[int, int]]) -> Iterator[Record]:
+        handles: Dict[int, Any] = {}
+        try:
+            for segment, offset in refs:
+                f = handles.get(segment)
+                if f is None:
+                    f = handles[segment] = open(self._segment_path(segment), "rb")
+                f.seek(offset)
+                line = f.readline()
+                try:
+                    yield json.loads(line[line.find(b"\t") + 1:])
+                except ValueError:
+                    self.stats.torn += 1
+        finally:
+            for f in handles.values():
+                f.close()
+
+    # --- snapshots ---
+
+    def _snapshot_path(self, customer_id: str) -> str:
+        return f"{self._snapshot_prefix}{_safe_name(customer_id)}.snap"
+
+    def _read_snapshot(self, customer_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        """(state data, first journal segment not folded into it) or (None, 0)."""
+        try:
+            with open(self._snapshot_path(customer_id), "rb") as f:
+                snap = pickle.load(f)
+        except FileNotFoundError:
+            return None, 0
+        if snap.get("customer_id") != customer_id:
+            return None, 0  ## two ids mapped to the same file name: fall back to the journal
+        return snap["state"], snap["segment"]
+
+    def _write_snapshot(self, customer_id: str, data: Dict[str, Any], segment: int) -> None:
+        path = self._snapshot_path(customer_id)
+        tmp = path + ".tmp"
+        payload = {"version": SNAPSHOT_VERSION, "customer_id": customer_id, "segment": segment, "state": data}
+        with open(tmp, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self.stats.snapshots += 1
+
+    def _materialize(self, customer_id: str, refs: List[Tuple[int, int]]) -> Optional[Dict[str, Any]]:
+        data, since = self._read_snapshot(customer_id)
+        for record in self._read_records([r for r in refs if r[0] >= since]):
+            data = apply_record(data if data is not None else {}, record)
+            self.stats.replayed += 1
+        return data
+
+    def _compact(self) -> None:
+        """Roll the journal over, snapshot every customer with records in the old segments, drop those.
+
+        Only the rollover and each customer's replay take the lock (appends and loads wait for
+        one customer at a time, not the whole pass); snapshot writes happen outside it.
+        """
+        with self._lock:
+            ## roll over first: the snapshots below fold in everything before the new segment
+            self._file.close()
+            old = self._segments()
+            self._segment += 1
+            segment = self._segment
+            self._file = open(self._segment_path(segment), "ab")
+            self._journal_bytes = 0
+            customers = list(self._index)
+        for customer_id in customers:
+            with self._lock:
+                refs = [r for r in self._index.get(customer_id, ()) if r[0] < segment]
+                data = self._materialize(customer_id, refs) if refs else None
+            if data is None:
+                continue
+            self._write_snapshot(customer_id, data, segment)
+            with self._lock:
+                ## a load from here on reads the new snapshot, which supersedes the old records
+                self._index[customer_id] = [r for r in self._index.get(customer_id, ()) if r[0] >= segment]
+        with self._lock:
+            for path_segment in old:
+                self._segment_path(path_segment).unlink(missing_ok=True)
+        self.stats.compactions += 1
+
+    def _compact_in_background(self) -> None:
+        ## caller holds self._lock
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, name="journal-compaction")
+        self._compactor.start()
+
+    def compact(self) -> None:
+        """Snapshot every customer with journal records and drop the old journal (blocking; see `acompact`)."""
+        with self._compact_lock:
+            self._compact()
+
+    async def acompact(self) -> None:
+        await asyncio.to_thread(self.compact)
+
+    # --- StateBackend ---
+
+    def _load_sync(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            refs = list(self._index.get(customer_id, ()))
+            return self._materialize(customer_id, refs)
+
+    async def load(self, customer_id: str) -> Optional[TravelState]:
+        data = await asyncio.to_thread(self._load_sync, customer_id)
+        if data is None:
+            return None
+        state = TravelState.from_dict(data)
+        self._remember(customer_id, state)
+        return state
+
+    def _remember(self, customer_id: str, state: TravelState) -> None:
+        session = state.session_memory.get("notes") or []
+        trips = state.trip_history.get("trips")
+        self._written[customer_id] = _Written(
+            global_notes=state.global_memory.get("notes"),
+            global_len=len(state.global_memory.get("notes") or ()),
+            session_notes=tuple(session),
+            session_ids=tuple(map(id, session)),
+            profile_key=_profile_key(state.profile),
+            trips=trips,
+            trips_len=len(trips or ()),
+            flag=state.inject_session_memories_next_turn,
+        )
+
+    def _diff(self, customer_id: str, state: TravelState) -> List[Record]:
+        """Records that bring the journal's copy of the customer up to `state` (runs on the loop)."""
+        prev = self._written.get(customer_id)
+        self._remember(customer_id, state)
+        if prev is None:
+            return [{"op": "state", "state": state.to_dict()}]
+        now = self._written[customer_id]
+        records: List[Record] = []
+        if now.global_notes is not prev.global_notes or now.global_len != prev.global_len:
+            records.append({"op": "global", "notes": _notes(now.global_notes), "usage": state.global_usage.to_dict()})
+        if now.session_ids != prev.session_ids:
+            ## session notes are edited in place (a refreshed note replaces its slot), so only
+            ## journal an append if every note recorded last time is still there, unchanged
+            done = len(prev.session_ids)
+            if len(now.session_ids) > done and now.session_ids[:done] == prev.session_ids:
+                records.append({"op": "session_add", "notes": _notes(now.session_notes[done:])})
+            else:
+                records.append({"op": "session", "notes": _notes(now.session_notes)})
+        if now.profile_key != prev.profile_key:
+            records.append({"op": "profile", "profile": state.profile})
+        if now.trips is not prev.trips or now.trips_len != prev.trips_len:
+            records.append({"op": "trips", "trip_history": state.trip_history})
+        if now.flag != prev.flag:
+            records.append({"op": "flag", "value": now.flag})
+        return records
+
+    def forget(self, customer_id: str) -> None:
+        ## the next save of this customer (if any) writes their full state
+        self._written.pop(customer_id, None)
+
+    def _lines(self, customer_id: str, records: List[Record]) -> List[Tuple[str, bytes]]:
+        prefix = json.dumps(customer_id).encode() + b"\t"
+        return [
+            (customer_id, prefix + json.dumps(r, ensure_ascii=False, separators=(",", ":"), default=str).encode() + b"\n")
+            for r in records
+        ]
+
+    async def save(self, customer_id: str, state: TravelState) -> None:
+        await self.save_many([(customer_id, state)])
+
+    async def save_many(self, items: List[Tuple[str, TravelState]]) -> None:
+        lines: List[Tuple[str, bytes]] = []
+        for customer_id, state in items:
+            lines.extend(self._lines(customer_id, self._diff(customer_id, state)))
+        if not lines:
+            return
+        try:
+            await asyncio.to_thread(self._append, lines)
+        except BaseException:
+            ## unknown what made it to disk: the next save of these customers writes the full state
+            for customer_id, _ in items:
+                self._written.pop(customer_id, None)
+            raise
+
+    def close(self) -> None:
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                self._file.close()
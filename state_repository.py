@@ -0,0 +1,359 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from memory_state import TravelState
+
+
+class StateBackend(ABC):
+    """Where `TravelState`s live when they are not in the repository's cache."""
+
+    @abstractmethod
+    async def load(self, customer_id: str) -> Optional[TravelState]:
+        """Return the stored state, or None for an unknown customer."""
+        ...
+
+    @abstractmethod
+    async def save(self, customer_id: str, state: TravelState) -> None:
+        ...
+
+    async def save_many(self, items: List[Tuple[str, TravelState]]) -> None:
+        """Save a batch (write-behind flushes); override when the backend can do better than one by one."""
+        for customer_id, state in items:
+            await self.save(customer_id, state)
+
+    def forget(self, customer_id: str) -> None:
+        """The repository evicted `customer_id` and their last write is saved: drop anything kept for them."""
+
+
+class InMemoryStateBackend(StateBackend):
+    """Keeps serialized states in a dict; handy for tests and demos."""
+
+    def __init__(self, seed: Optional[Dict[str, TravelState]] = None) -> None:
+        self._data: Dict[str, Dict[str, Any]] = {cid: s.to_dict() for cid, s in (seed or {}).items()}
+
+    async def load(self, customer_id: str) -> Optional[TravelState]:
+        data = self._data.get(customer_id)
+        return TravelState.from_dict(data) if data is not None else None
+
+    async def save(self, customer_id: str, state: TravelState) -> None:
+        self._data[customer_id] = state.to_dict()
+
+
+class JsonFileStateBackend(StateBackend):
+    """One JSON file per customer under `directory`; file I/O runs off the event loop."""
+
+    def __init__(self, directory: str | Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, customer_id: str) -> Path:
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in customer_id)
+        return self.directory / f"{safe}.json"
+
+    def _load_sync(self, customer_id: str) -> Optional[TravelState]:
+        try:
+            with open(self._path(customer_id), encoding="utf-8") as f:
+                return TravelState.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def _save_sync(self, customer_id: str, data: Dict[str, Any]) -> None:
+        path = self._path(customer_id)
+        tmp = path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    async def load(self, customer_id: str) -> Optional[TravelState]:
+        return await asyncio.to_thread(self._load_sync, customer_id)
+
+    async def save(self, customer_id: str, state: TravelState) -> None:
+        ## snapshot on the loop so the state is not read while another task mutates it
+        await asyncio.to_thread(self._save_sync, customer_id, state.to_dict())
+
+    async def save_many(self, items: List[Tuple[str, TravelState]]) -> None:
+        ## one thread hop for the whole batch
+        payload = [(customer_id, state.to_dict()) for customer_id, state in items]
+        await asyncio.to_thread(lambda: [self._save_sync(cid, data) for cid, data in payload])
+
+
+@dataclass
+class WriteBehindStats:
+    enqueued: int = 0
+    coalesced: int = 0  ## writes absorbed by a pending write of the same customer
+    batches: int = 0
+    saved: int = 0
+    failures: int = 0
+
+
+class WriteBehindBuffer:
+    """Coalesces state writes per customer and saves them in batches from a background task.
+
+    `enqueue` is cheap and thread-safe (tools may run on worker threads), so the request path
+    never waits on the backend. A batch goes out when `max_batch` customers are pending or
+    `flush_interval` seconds have passed. A failed batch is put back (unless a newer write for
+    that customer arrived meanwhile) and retried on the next round.
+    """
+
+    def __init__(self, backend: StateBackend, max_batch: int = 64, flush_interval: float = 0.5) -> None:
+        self.backend = backend
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, TravelState] = {}
+        self._inflight: Dict[str, TravelState] = {}  ## taken for the batch being saved
+        self._forget: set[str] = set()  ## evicted customers to `backend.forget` once their write is saved
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushing = asyncio.Lock()
+        self.stats = WriteBehindStats()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, customer_id: str, state: TravelState) -> None:
+        with self._lock:
+            if customer_id in self._pending:
+                self.stats.coalesced += 1
+            self._pending[customer_id] = state
+            self.stats.enqueued += 1
+            full = len(self._pending) >= self.max_batch
+        if self._task is None:
+            self.start()
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def get_unsaved(self, customer_id: str) -> Optional[TravelState]:
+        """The queued (or being saved) state for `customer_id`, which is newer than the backend's copy."""
+        with self._lock:
+            return self._pending.get(customer_id) or self._inflight.get(customer_id)
+
+    def forget_when_saved(self, customer_id: str) -> None:
+        """`backend.forget(customer_id)` now, or after the save of their queued write."""
+        with self._lock:
+            if customer_id in self._pending or customer_id in self._inflight:
+                self._forget.add(customer_id)
+                return
+        self.backend.forget(customer_id)
+
+    def start(self) -> None:
+        """Start the background flusher on the running loop (no-op if started or called off-loop)."""
+        if self._task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  ## worker thread: the repository starts it from the loop, and flush() drains regardless
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush_round()
+
+    def _take(self) -> List[Tuple[str, TravelState]]:
+        with self._lock:
+            batch = list(self._pending.items())[: self.max_batch]
+            for customer_id, state in batch:
+                del self._pending[customer_id]
+                self._inflight[customer_id] = state
+        return batch
+
+    async def _flush_round(self, raise_errors: bool = False) -> None:
+        async with self._flushing:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return
+                try:
+                    await self.backend.save_many(batch)
+                except BaseException as error:
+                    ## put the batch back (a newer pending write for a customer wins) and retry later
+                    with self._lock:
+                        self._inflight.clear()
+                        for customer_id, state in batch:
+                            self._pending.setdefault(customer_id, state)
+                    if isinstance(error, Exception):
+                        self.stats.failures += 1
+                        if not raise_errors:
+                            return
+                    raise
+                with self._lock:
+                    self._inflight.clear()
+                    ## a customer written again meanwhile waits for that write too
+                    saved = [cid for cid, _ in batch if cid in self._forget and cid not in self._pending]
+                    self._forget.difference_update(saved)
+                for customer_id in saved:
+                    self.backend.forget(customer_id)
+                self.stats.batches += 1
+                self.stats.saved += len(batch)
+
+    async def flush(self) -> None:
+        """Save everything pending now (raises if the backend fails; the writes stay queued)."""
+        await self._flush_round(raise_errors=True)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+@dataclass
+class RepositoryStats:
+    hits: int = 0
+    misses: int = 0
+    loads: int = 0
+    coalesced_loads: int = 0
+    evictions: int = 0
+    writebacks: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class StateRepository:
+    """`TravelState` per `global_customer_id`, loaded lazily and kept in a size-bounded LRU.
+
+    - Concurrent `get`s for a user that is not cached share a single backend load
+    - Callers `mark_dirty` after mutating a state; dirty states are written back when
+      evicted and on `flush`
+    - Unknown users get `default_factory(customer_id)` (an empty profile by default)
+    - Memory commits (`state_concurrency.commit*`) mark the state dirty on their own
+    - With a `write_behind` buffer, dirty states are queued there instead and saved in
+      batches off the request path; eviction then costs no backend write
+    - An evicted customer is `backend.forget`-ten once their last write is saved, so backends
+      that keep per-customer state between saves (e.g. the journal's deltas) stay bounded too
+
+    Keep `capacity` well above the number of users with runs in flight: without write-behind,
+    `mark_dirty` on a state that was already evicted is a no-op.
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        capacity: int = 10_000,
+        default_factory: Optional[Callable[[str], TravelState]] = None,
+        write_behind: Optional[WriteBehindBuffer] = None,
+    ) -> None:
+        self.backend = backend
+        self.capacity = max(1, capacity)
+        self.default_factory = default_factory or (lambda cid: TravelState(profile={"global_customer_id": cid}))
+        self._cache: OrderedDict[str, TravelState] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._loading: Dict[str, asyncio.Future[TravelState]] = {}
+        self.write_behind = write_behind
+        self.stats = RepositoryStats()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, customer_id: str) -> bool:
+        return customer_id in self._cache
+
+    async def get(self, customer_id: str) -> TravelState:
+        if self.write_behind is not None:
+            self.write_behind.start()
+        state = self._cache.get(customer_id)
+        if state is not None:
+            self._cache.move_to_end(customer_id)
+            self.stats.hits += 1
+            return state
+
+        self.stats.misses += 1
+        pending = self._loading.get(customer_id)
+        if pending is not None:
+            self.stats.coalesced_loads += 1
+            return await asyncio.shield(pending)
+
+        future: asyncio.Future[TravelState] = asyncio.get_running_loop().create_future()
+        self._loading[customer_id] = future
+        try:
+            self.stats.loads += 1
+            ## an evicted state whose write is still queued is newer than the backend's copy
+            state = self.write_behind.get_unsaved(customer_id) if self.write_behind is not None else None
+            if state is None:
+                state = await self.backend.load(customer_id)
+            if state is None:
+                state = self.default_factory(customer_id)
+            self._track(customer_id, state)
+            self._cache[customer_id] = state
+            future.set_result(state)
+        except BaseException as error:
+            future.set_exception(error)
+            ## the error is re-raised here; don't warn about waiters that never came
+            future.exception()
+            raise
+        finally:
+            del self._loading[customer_id]
+
+        await self._evict_overflow()
+        return state
+
+    def mark_dirty(self, customer_id: str) -> None:
+        state = self._cache.get(customer_id)
+        if state is not None:
+            self._mark(customer_id, state)
+
+    def _mark(self, customer_id: str, state: TravelState) -> None:
+        if self.write_behind is not None:
+            self.write_behind.enqueue(customer_id, state)
+        else:
+            self._dirty.add(customer_id)
+
+    def _track(self, customer_id: str, state: TravelState) -> None:
+        ## may run on a tool's worker thread: only thread-safe work in here
+        state.guard.on_commit = lambda s: self._mark(customer_id, s)
+
+    async def put(self, customer_id: str, state: TravelState) -> None:
+        """Insert or replace a state (marked dirty)."""
+        self._track(customer_id, state)
+        self._cache[customer_id] = state
+        self._cache.move_to_end(customer_id)
+        self._mark(customer_id, state)
+        await self._evict_overflow()
+
+    async def flush(self) -> None:
+        """Write back every dirty cached state (and drain the write-behind buffer)."""
+        if self.write_behind is not None:
+            await self.write_behind.flush()
+        for customer_id in list(self._dirty):
+            state = self._cache.get(customer_id)
+            self._dirty.discard(customer_id)
+            if state is not None:
+                await self.backend.save(customer_id, state)
+                self.stats.writebacks += 1
+
+    async def _evict_overflow(self) -> None:
+        while len(self._cache) > self.capacity:
+            customer_id, state = self._cache.popitem(last=False)
+            self.stats.evictions += 1
+            if self.write_behind is not None:
+                self.write_behind.forget_when_saved(customer_id)
+                continue
+            if customer_id in self._dirty:
+                self._dirty.discard(customer_id)
+                await self.backend.save(customer_id, state)
+                self.stats.writebacks += 1
+            self.backend.forget(customer_id)
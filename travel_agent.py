@@ -1,18 +1,88 @@
 import os
 import sys
+import time
 import asyncio
+from dataclasses import dataclass
+from typing import Callable, Optional
 from agents import Agent, Runner, RunConfig, ModelSettings, set_tracing_disabled, RunContextWrapper
-from context_management import TrimmingSession
+from agents.result import RunResultStreaming
+from openai.types.responses import ResponseTextDeltaEvent
 from memory_hooks import render_frontmatter, render_global_memories_md, render_session_memories_md, MemoryHooks
 from memory_distillation import save_memory_note
 from context_management import TrimmingSession
 from memory_state import MemoryNote, TravelState, user_state
 from dotenv import load_dotenv
-from consolidate_memory import consolidate_memory
+from openai_clients import aclose_clients, shared_run_config
+from state_repository import InMemoryStateBackend, StateRepository, WriteBehindBuffer
+from state_journal import JournalStateBackend
+from state_concurrency import user_run
+from metrics import LATENCY_BUCKETS_MS, configure_metrics_from_env, metrics
+from session_summary import LLMSummarizer
+from consolidation_scheduler import ConsolidationScheduler
+from session_registry import SessionRegistry
+from item_compaction import ItemCompactor, fetch_tool_output
 
 load_dotenv()
+configure_metrics_from_env()
+
+## Process-wide services, each built on first use (importing this module constructs none of them,
+## opens no journal and touches no spill directory); use them from the event loop only.
+_states: Optional[StateRepository] = None
+_summarizer: Optional[LLMSummarizer] = None
+_sessions: Optional[SessionRegistry] = None
+_scheduler: Optional[ConsolidationScheduler] = None
+
+
+def _new_state(customer_id: str) -> TravelState:
+    if customer_id == user_state.profile["global_customer_id"]:
+        return TravelState.from_dict(user_state.to_dict())  ## demo customer, first run on an empty STATE_DIR
+    return TravelState(profile={"global_customer_id": customer_id})
+
+
+def get_states() -> StateRepository:
+    """One TravelState per customer, loaded lazily and LRU-cached (seeded with the demo customer).
+
+    Memory writes are persisted in batches by a write-behind buffer, off the request path.
+    STATE_DIR=path keeps them on disk: a journal of memory mutations plus per-customer snapshots.
+    """
+    global _states
+    if _states is None:
+        if os.getenv("STATE_DIR"):
+            backend = JournalStateBackend(os.environ["STATE_DIR"])
+        else:
+            backend = InMemoryStateBackend({user_state.profile["global_customer_id"]: user_state})
+        _states = StateRepository(backend, default_factory=_new_state, write_behind=WriteBehindBuffer(backend))
+    return _states
+
+
+def get_summarizer() -> LLMSummarizer:
+    """Compacts turns trimmed off the (1-turn) sessions into a running summary, in the background."""
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = LLMSummarizer()
+    return _summarizer
+
 
-session = TrimmingSession("first_session", user_state, max_turns=1)
+def get_sessions() -> SessionRegistry:
+    """Live sessions, byte-bounded: idle or least recently used ones spill to disk and come back on use
+    (SESSION_MEMORY_MAX_BYTES, SESSION_IDLE_TTL_S, SESSION_SPILL_DIR). Bulky tool outputs of
+    earlier turns are compacted to stubs; the agent gets them back with `fetch_tool_output`."""
+    global _sessions
+    if _sessions is None:
+        _sessions = SessionRegistry.from_env(max_turns=1, summarizer=get_summarizer(), compactor=ItemCompactor())
+    return _sessions
+
+
+def get_scheduler() -> ConsolidationScheduler:
+    """Folds session notes into global memory in the background (note threshold, idle, session end)."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ConsolidationScheduler()
+    return _scheduler
+
+
+def get_session(customer_id: str, state: TravelState) -> TrimmingSession:
+    return get_sessions().get(customer_id, state)
 
 set_tracing_disabled(True)
 
@@ -21,6 +91,8 @@ MEMORY_INSTRUCTIONS = """
 You may receive two memory lists:
 - GLOBAL memory = long-term defaults (“usually / in general”).
 - SESSION memory = trip-specific overrides (“this trip / this time”).
+You may also receive a TRIP HISTORY summary: statistics over the user’s past bookings. Treat it as
+weaker evidence than memory (a habit, not a stated preference).
 
 How to use memory:
 - Use memory only when it is relevant to the user’s current decision (flight/hotel/insurance choices).
@@ -56,6 +128,9 @@ Safety:
 """
 
 
+## Bump when BASE_INSTRUCTIONS / MEMORY_INSTRUCTIONS change (invalidates the memoized sections)
+STATIC_PROMPT_VERSION = 2
+
 BASE_INSTRUCTIONS = f"""
 You are a concise, reliable travel concierge. 
 Help users plan and book flights, hotels, and car/travel insurance.\n\n
@@ -108,87 +183,159 @@ async def instructions(ctx: RunContextWrapper[TravelState], agent:Agent) -> str:
     
     # print(f"session block: {session_block}")
     
-    return (
-        BASE_INSTRUCTIONS 
-        + "\n\n<user_profile>\n" + (s.system_frontmatter or "") +"\n</user_profile>"
-        + "\n\n<memories>\n"
-        + "GLOBAL memory: \n" + (s.global_memories_md or "- (none)")
-        + session_block
-        + "\n</memories>"
-        + "\n\n" + MEMORY_INSTRUCTIONS
-    )
-    
+    ## Static sections first so the prefix stays byte-identical across turns (provider prompt cache);
+    ## each section is only re-rendered when its key changes.
+    frontmatter = s.system_frontmatter or ""
+    global_md = s.global_memories_md or "- (none)"
+    trips_md = s.trip_summary_md
+    return s.prompt_builder.build([
+        ("base", STATIC_PROMPT_VERSION, lambda: BASE_INSTRUCTIONS),
+        ("memory_policy", STATIC_PROMPT_VERSION, lambda: MEMORY_INSTRUCTIONS),
+        ("profile", frontmatter, lambda: "<user_profile>\n" + frontmatter + "\n</user_profile>"),
+        ## changes only when a trip is booked, so it sits before the per-turn memories
+        ("trip_history", trips_md, lambda: (
+            "<trip_history>\nTRIP HISTORY summary: \n" + trips_md + "\n</trip_history>" if trips_md else ""
+        )),
+        ("memories", (global_md, session_block), lambda: (
+            "<memories>\n"
+            + "GLOBAL memory: \n" + global_md
+            + session_block
+            + "\n</memories>"
+        )),
+    ])
     
-async def main():
     
-    travel_concierge_agent = Agent(
+def build_agent(model: str = "gpt-5.2") -> Agent:
+    return Agent(
         name = "Travel Concierge",
-        model = "gpt-5.2",
+        model = model,
         instructions=instructions,
         hooks=MemoryHooks(),
-        tools= [save_memory_note]
+        tools= [save_memory_note, fetch_tool_output]
     )
+
+
+async def run_turn(agent: Agent, text: str, state: TravelState, session: TrimmingSession):
+    """One Runner.run under the user's run lock (other users run concurrently)."""
+    async with user_run(state):
+        result = await Runner.run(agent, input=text, session=session, context=state, run_config=shared_run_config())
+    get_scheduler().notify_activity(state.profile["global_customer_id"], state)
+    return result
+
+
+@dataclass
+class StreamedTurn:
+    result: RunResultStreaming
+    ttft_ms: Optional[float]  ## time to the first text delta (None if the turn streamed no text)
+    total_ms: float
+
+
+def _write_delta(delta: str) -> None:
+    sys.stdout.write(delta)
+    sys.stdout.flush()
+
+
+async def stream_turn(
+    agent: Agent,
+    text: str,
+    state: TravelState,
+    session: TrimmingSession,
+    on_delta: Callable[[str], None] = _write_delta,
+) -> StreamedTurn:
+    """Like `run_turn`, but through Runner.run_streamed: text deltas go to `on_delta` as they arrive.
+
+    Same hooks, session and tools as `run_turn`. The SDK runs the agent loop in a background
+    task, so sync tools (save_memory_note runs in a worker thread) and session writes happen
+    off this consumer loop; memory persistence is already write-behind.
+    """
+    async with user_run(state):
+        t0 = time.perf_counter()
+        first: Optional[float] = None
+        result = Runner.run_streamed(agent, input=text, session=session, context=state, run_config=shared_run_config())
+        async for event in result.stream_events():
+            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                if first is None:
+                    first = time.perf_counter()
+                on_delta(event.data.delta)
+        done = time.perf_counter()
+    get_scheduler().notify_activity(state.profile["global_customer_id"], state)
+
+    ttft_ms = (first - t0) * 1e3 if first is not None else None
+    total_ms = (done - t0) * 1e3
+    if ttft_ms is not None:
+        metrics.observe("stream_ttft_ms", ttft_ms, LATENCY_BUCKETS_MS)
+    metrics.observe("stream_total_ms", total_ms, LATENCY_BUCKETS_MS)
+    return StreamedTurn(result, ttft_ms, total_ms)
+
+
+async def main(customer_id: str = user_state.profile["global_customer_id"], stream: bool = False):
     
-    r1 = await Runner.run(
-        travel_concierge_agent,
-        input = "Book me a flight to paris next month.",
-        session=session,
-        context= user_state,
-    )
+    states, sessions, scheduler = get_states(), get_sessions(), get_scheduler()
+    scheduler.start()
+    sessions.start()
+    state = await states.get(customer_id)
+    session = get_session(customer_id, state)
+    
+    travel_concierge_agent = build_agent()
+    
+    take_turn = run_turn
+    if stream:
+        ## streamed replies, with time to first token and total stream time per turn
+        async def take_turn(agent, text, state, session):
+            turn = await stream_turn(agent, text, state, session)
+            ttft = f"{turn.ttft_ms:.0f} ms" if turn.ttft_ms is not None else "n/a"
+            print(f"\n[ttft {ttft}, total {turn.total_ms:.0f} ms]", file=sys.stderr)
+            return turn.result
+    
+    r1 = await take_turn(travel_concierge_agent, "Book me a flight to paris next month.", state, session)
     
     # print("Turn 1:", r1.final_output)
     
-    r2 = await Runner.run(
-        travel_concierge_agent,
-        input = "Do you know my preferences??",
-        session=session,
-        context= user_state,
-    )
+    r2 = await take_turn(travel_concierge_agent, "Do you know my preferences??", state, session)
     # print("Turn 2:", r2.final_output)
     
     
-    r3 = await Runner.run(
-        travel_concierge_agent,
-        input = "Remember that i am vegetarian.",
-        session=session,
-        context= user_state,
-    )
+    r3 = await take_turn(travel_concierge_agent, "Remember that i am vegetarian.", state, session)
     # print("Turn 3:", r3.final_output)
     
     
-    # print(f"Session memory: {user_state.session_memory}")
+    # print(f"Session memory: {state.session_memory}")
     
-    r4 = await Runner.run(
-        travel_concierge_agent,
-        input = "This time, I like to have a window seat. i really want to sleep",
-        session=session,
-        context= user_state,
-    )
+    r4 = await take_turn(travel_concierge_agent, "This time, I like to have a window seat. i really want to sleep", state, session)
     
     # print("\nTurn 4: ", r4.final_output)
     
-    # print(f"lets see session memory again: {user_state.session_memory}")
+    # print(f"lets see session memory again: {state.session_memory}")
     
     # ### 
     # print("\nUser session memory \n\n")
-    # print(user_state.session_memory)
+    # print(state.session_memory)
     
     # ## 
     # print("\nGlobal memory\n\n")
-    # print(user_state.global_memory)
+    # print(state.global_memory)
     
-    # consolidate_memory(user_state)
+    # consolidate_memory(state)
     
     # print("\n\n After updating the global memory.")
     
     # print("\nUser session memory \n\n")
-    # print(user_state.session_memory)
+    # print(state.session_memory)
     
     # ## 
     # print("\nGlobal memory\n\n")
-    # print(user_state.global_memory)
+    # print(state.global_memory)
+    
+    await scheduler.end_session(customer_id)
+    await scheduler.stop()
+    await sessions.close()
+    
+    states.mark_dirty(customer_id)
+    await states.flush()
+    await aclose_clients()
+    metrics.export()
     
     
     
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(stream="--stream" in sys.argv))
\ No newline at end of file
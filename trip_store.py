@@ -0,0 +1,294 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+Trip = Dict[str, Any]
+
+## (label, min nights, max nights) for the checked-bags-by-trip-length aggregate
+LENGTH_BUCKETS: Tuple[Tuple[str, int, int], ...] = (
+    ("1-3 nights", 0, 3),
+    ("4-6 nights", 4, 6),
+    ("7-13 nights", 7, 13),
+    ("14+ nights", 14, 10**6),
+)
+
+
+def _ordinal(value: Any) -> int:
+    try:
+        return date.fromisoformat(str(value or "")[:10]).toordinal()
+    except ValueError:
+        return 0
+
+
+def _clean(value: Any) -> str:
+    return value.strip().lower() if isinstance(value, str) else ""
+
+
+def _nights(trip: Trip) -> Optional[int]:
+    start, end = _ordinal(trip.get("check_in_date")), _ordinal(trip.get("check_out_date"))
+    return end - start if start and end and end >= start else None
+
+
+def _length_bucket(nights: int) -> str:
+    for label, lo, hi in LENGTH_BUCKETS:
+        if lo <= nights <= hi:
+            return label
+    return LENGTH_BUCKETS[-1][0]
+
+
+class TripAggregates:
+    """Preference aggregates over trips, updated in O(1) per added or removed trip."""
+
+    def __init__(self) -> None:
+        self.trips = 0
+        self.purposes: Counter[str] = Counter()
+        self.destinations: Counter[str] = Counter()
+        self.seats: Counter[str] = Counter()
+        self.cabins: Counter[str] = Counter()
+        self.airlines: Counter[str] = Counter()
+        self.hotel_brands: Counter[str] = Counter()
+        self.neighborhoods: Counter[str] = Counter()
+        self.special_requests: Counter[str] = Counter()
+        self.checked_bags: Dict[str, List[int]] = defaultdict(lambda: [0, 0])  ## length bucket -> [bags, trips]
+
+    def _apply(self, trip: Trip, sign: int) -> None:
+        flight = trip.get("flight") or {}
+        hotel = trip.get("hotel") or {}
+        self.trips += sign
+        for counter, value in (
+            (self.purposes, trip.get("trip_purpose")),
+            (self.destinations, trip.get("to_city")),
+            (self.seats, flight.get("seat_selected")),
+            (self.cabins, flight.get("cabin_class")),
+            (self.airlines, flight.get("airline")),
+            (self.hotel_brands, hotel.get("brand")),
+            (self.neighborhoods, hotel.get("neighborhood")),
+        ):
+            if value:
+                counter[value] += sign
+                if counter[value] <= 0:
+                    del counter[value]
+        for request in flight.get("special_requests") or []:
+            self.special_requests[request] += sign
+            if self.special_requests[request] <= 0:
+                del self.special_requests[request]
+
+        nights = _nights(trip)
+        bags = (flight.get("baggage") or {}).get("checked_bags")
+        if nights is not None and isinstance(bags, (int, float)):
+            cell = self.checked_bags[_length_bucket(nights)]
+            cell[0] += sign * bags
+            cell[1] += sign
+
+    def add(self, trip: Trip) -> None:
+        self._apply(trip, 1)
+
+    def remove(self, trip: Trip) -> None:
+        self._apply(trip, -1)
+
+    def avg_checked_bags(self) -> Dict[str, float]:
+        """Average checked bags per length bucket (buckets without trips are left out)."""
+        return {
+            label: self.checked_bags[label][0] / self.checked_bags[label][1]
+            for label, _, _ in LENGTH_BUCKETS
+            if label in self.checked_bags and self.checked_bags[label][1] > 0
+        }
+
+
+class TripStore:
+    """Trip history with secondary indexes and incrementally maintained aggregates.
+
+    Indexes destination (city and country), purpose and brand (hotel brand and airline) map a
+    lowercased value to the rows holding it; check-in dates are kept as a sorted
+    (ordinal, row) list for range queries. Trips are tracked by identity, with the same
+    `sync` contract as `KeywordIndex`: append-only growth of the same list is O(new trips).
+    """
+
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self) -> None:
+        self._trips: List[Optional[Trip]] = []
+        self._ord: List[int] = []  ## check-in ordinal per row
+        self._rows: Dict[int, int] = {}  ## id(trip) -> row
+        self._index: Dict[str, Dict[str, Set[int]]] = {
+            "destination": defaultdict(set),
+            "purpose": defaultdict(set),
+            "brand": defaultdict(set),
+        }
+        self._dates: List[Tuple[int, int]] = []  ## sorted (check-in ordinal, row)
+        self.aggregates = TripAggregates()
+        self.version = 0  ## bumped on every change; a cheap cache key for rendered summaries
+        self._source: List[Trip] | None = None
+        self._source_len = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @staticmethod
+    def _keys(trip: Trip) -> Iterable[Tuple[str, str]]:
+        flight = trip.get("flight") or {}
+        hotel = trip.get("hotel") or {}
+        for field, value in (
+            ("destination", trip.get("to_city")),
+            ("destination", trip.get("to_country")),
+            ("purpose", trip.get("trip_purpose")),
+            ("brand", hotel.get("brand")),
+            ("brand", flight.get("airline")),
+        ):
+            value = _clean(value)
+            if value:
+                yield field, value
+
+    def add(self, trip: Trip) -> None:
+        key = id(trip)
+        if key in self._rows:
+            return
+        row = len(self._trips)
+        ordinal = _ordinal(trip.get("check_in_date"))
+        self._trips.append(trip)
+        self._ord.append(ordinal)
+        self._rows[key] = row
+        for field, value in self._keys(trip):
+            self._index[field][value].add(row)
+        insort(self._dates, (ordinal, row))
+        self.aggregates.add(trip)
+        self.version += 1
+
+    def remove(self, trip: Trip) -> None:
+        row = self._rows.pop(id(trip), None)
+        if row is None:
+            return
+        for field, value in self._keys(trip):
+            rows = self._index[field].get(value)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._index[field][value]
+        entry = (self._ord[row], row)
+        i = bisect_left(self._dates, entry)
+        if i < len(self._dates) and self._dates[i] == entry:
+            del self._dates[i]
+        self._trips[row] = None
+        self.aggregates.remove(trip)
+        self.version += 1
+        if len(self._trips) > 64 and len(self._rows) < len(self._trips) // 2:
+            ## compact the tombstoned rows away
+            live = [t for t in self._trips if t is not None]
+            source, source_len, version = self._source, self._source_len, self.version
+            self._reset()
+            for t in live:
+                self.add(t)
+            self._source, self._source_len, self.version = source, source_len, version
+
+    def sync(self, trips: List[Trip]) -> None:
+        """Bring the store in line with `trips` (the current `trip_history["trips"]` list)."""
+        if trips is self._source and len(trips) == self._source_len:
+            return
+        if trips is self._source and len(trips) > self._source_len:
+            for trip in trips[self._source_len:]:
+                self.add(trip)
+        else:
+            live = {id(t) for t in trips}
+            for trip in [t for t in self._trips if t is not None and id(t) not in live]:
+                self.remove(trip)
+            for trip in trips:
+                self.add(trip)
+        self._source = trips
+        self._source_len = len(trips)
+
+    def query(
+        self,
+        destination: Optional[str] = None,
+        purpose: Optional[str] = None,
+        brand: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Trip]:
+        """Trips matching every given filter, newest check-in first.
+
+        `destination` matches city or country, `brand` matches hotel brand or airline (both
+        case-insensitive); `start`/`end` bound the check-in date (ISO, inclusive).
+        """
+        filters = [
+            self._index[field].get(_clean(value), set())
+            for field, value in (("destination", destination), ("purpose", purpose), ("brand", brand))
+            if value is not None
+        ]
+        candidates: Optional[Set[int]] = None
+        if filters:
+            filters.sort(key=len)  ## intersect smallest-first
+            candidates = filters[0]  ## read-only below, so the index set itself is fine
+            for hits in filters[1:]:
+                candidates = candidates & hits
+            if not candidates:
+                return []
+
+        lo_ord = _ordinal(start) if start else None
+        hi_ord = _ordinal(end) if end else None
+        lo = bisect_left(self._dates, (lo_ord, -1)) if lo_ord is not None else 0
+        hi = bisect_right(self._dates, (hi_ord, len(self._trips))) if hi_ord is not None else len(self._dates)
+
+        span = hi - lo
+        if candidates is None:
+            walk = True
+        elif limit is not None:
+            ## walking newest-first stops after about limit * span / hits entries
+            walk = limit * span < len(candidates) * len(candidates)
+        else:
+            walk = span < len(candidates)
+
+        if walk:
+            rows: List[int] = []
+            for i in range(hi - 1, lo - 1, -1):
+                row = self._dates[i][1]
+                if candidates is None or row in candidates:
+                    rows.append(row)
+                    if limit is not None and len(rows) >= limit:
+                        break
+        else:
+            ## few index hits for the date range: sort the hits instead of walking it
+            ords = self._ord
+            rows = sorted(
+                (r for r in candidates
+                 if (lo_ord is None or ords[r] >= lo_ord) and (hi_ord is None or ords[r] <= hi_ord)),
+                key=ords.__getitem__,
+                reverse=True,
+            )
+        if limit is not None:
+            rows = rows[:limit]
+        return [self._trips[r] for r in rows]
+
+
+def _share(counter: Counter, total: int, top: int) -> str:
+    return ", ".join(f"{value} {n / total:.0%}" for value, n in counter.most_common(top))
+
+
+def render_trip_summary_md(store: TripStore, top: int = 3) -> str:
+    """Compact markdown digest of the trip aggregates (a few lines, whatever the number of trips)."""
+    agg = store.aggregates
+    if agg.trips <= 0:
+        return "- (no past trips)"
+    lines = [f"- {agg.trips} past trip{'s' if agg.trips != 1 else ''}"
+             + (f" ({_share(agg.purposes, agg.trips, top)})" if agg.purposes else "")]
+    if agg.destinations:
+        lines.append("- Frequent destinations: " + ", ".join(f"{d} ({n})" for d, n in agg.destinations.most_common(top)))
+    if agg.seats:
+        lines.append("- Seats chosen: " + _share(agg.seats, sum(agg.seats.values()), top))
+    if agg.cabins:
+        lines.append("- Cabins: " + _share(agg.cabins, sum(agg.cabins.values()), top))
+    if agg.airlines:
+        lines.append("- Airlines: " + _share(agg.airlines, sum(agg.airlines.values()), top))
+    bags = agg.avg_checked_bags()
+    if bags:
+        lines.append("- Avg checked bags by trip length: " + ", ".join(f"{avg:.1f} ({label})" for label, avg in bags.items()))
+    if agg.hotel_brands:
+        lines.append("- Hotel brands: " + _share(agg.hotel_brands, sum(agg.hotel_brands.values()), top))
+    if agg.neighborhoods:
+        lines.append("- Neighborhoods: " + _share(agg.neighborhoods, sum(agg.neighborhoods.values()), top))
+    if agg.special_requests:
+        lines.append("- Special requests: " + ", ".join(f"{r} ({n})" for r, n in agg.special_requests.most_common(top)))
+    return "\n".join(lines)